@@ -1,9 +1,19 @@
 from . import (
     alphafold_db_parser,
+    archive_index,
     batcher,
+    chimerax_pool,
+    combine,
     exceptions,
+    fetcher,
+    glb,
+    multifraction,
     overview_util,
     pointcloud2map_8bit,
+    recolor,
+    sample_atoms,
+    sample_cartoon,
     sample_pointcloud,
+    surface,
     util,
 )
@@ -1,16 +1,17 @@
 #! python3
-import gzip
+import atexit
+import functools
 import os
 import shutil
-import tarfile
 import traceback
 from argparse import Namespace
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 
-from . import classes, exceptions
+from . import archive_index, batcher, chimerax_pool, classes, exceptions, fetcher
+from . import combine, multifraction, recolor, sample_atoms, surface
 from . import overview_util as ov_util
 from . import util
-from .classes import AlphaFoldVersion, ColoringModes
+from .classes import AlphaFoldVersion, ColoringModes, Engine, FetchStatus
 from .classes import FileTypes as FT
 from .classes import Logger, ProteinStructure
 from .overview_util import DEFAULT_OVERVIEW_FILE
@@ -21,6 +22,26 @@ import multiprocessing as mp
 from logging import _nameToLevel, INFO
 import time
 import threading
+import queue
+
+# Seconds after which a consumer of chimerax_process checks whether its thread is still alive
+COMPLETED_POLL = 5
+
+
+def closes_chimerax_pool(method):
+    """Closes the pool of ChimeraX workers once the outermost decorated entry point returns, so the same workers process all batches of a run."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._entry_depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._entry_depth -= 1
+            if self._entry_depth == 0:
+                self.close_chimerax_pool()
+
+    return wrapper
 
 
 @dataclass
@@ -35,9 +56,22 @@ class AlphafoldDBParser:
         alphafold_ver (str): Defines the version of the AlphaFoldDB to be used. Options are "v1,v2,v3,v4".
         batch_size (int): Defines the size of each batch which is to be processed.
         processing (str): Defines the processing mode which is used to color the protein structures in ChimeraX. Defaults to "cartoons_ss_coloring".
+        additional_modes (list[str]): Further processing modes. ChimeraX opens each structure only once and exports one GLB file per mode. The GLB, PLY, ASCII and output files of these modes are stored in subdirectories named after the mode and their scales in the column of the mode in the overview file. Defaults to [].
         overview_file (str): Path to where to store the overview file in which the scale of each protein strucure and the color mode is stored. Defaults to "./static/csv/overview.csv".
         structures (dict[str,ProteinStructure]): Dictionary that maps strings of structures to the ProteinStructure object. Defaults to {}.
         not_fetched set[str]: Set of protein structures which could no be fetched. Deafults to [].
+        use_missing_cache (bool): If True, structures which were not available on the server within the last missing_ttl seconds are not requested again. These structures are stored next to the overview file. Defaults to True.
+        missing_ttl (float): Seconds until a structure which was not available is requested again. Defaults to one week.
+        mirrors (list[str]): Base URLs of mirrors, which are tried in the given order before the public server of the database. Defaults to [].
+        rate_limit (float): Maximal number of requests per second sent to each host. 0 disables the limit. Defaults to 10.
+        archive (str): Path to a local AlphaFold DB proteome archive (uncompressed tar). Structures contained in the archive are read from it instead of being fetched from the server. Defaults to None.
+        extract_bulk (bool): If True, all PDB files of a bulk archive are extracted to the PDB directory. Otherwise, the structures are processed directly from the archive and each PDB file only exists while ChimeraX processes it. Defaults to True.
+        prefetch (int): Number of batches which are fetched in the background while the current batch is processed. If num_cached is set, the number of prefetched batches is limited so that all fetched structures fit into the cache. 0 disables prefetching. Defaults to 1.
+        chimerax_workers (int or str): Number of long-lived ChimeraX processes, which process the structures concurrently. "auto" (chimerax_pool.AUTO) starts one per CPU core minus one, limited by the available memory, see chimerax_pool.auto_workers. 0 starts a single new ChimeraX process for each batch instead. Defaults to 1.
+        chimerax_timeout (float): Seconds ChimeraX may spend on a single structure before it is killed. Structures on which ChimeraX times out or crashes are quarantined and skipped in later runs of the same processing mode. None or 0 disables the timeout. Defaults to 600.
+        chimerax_memory (float): Maximal address space of each ChimeraX process in GB, see util.limit_memory. ChimeraX reserves far more address space than it uses, so the limit has to be generous, e.g. 16. Only supported on Linux. Defaults to None, i.e. no limit.
+        residue_index (bool): If True, the residue of each vertex is stored next to the PLY file and the residue of each sampled point next to the color maps, so the structure can be recolored without ChimeraX, see execute_recolor. The PDB files are then removed after the conversion to PLY instead of after ChimeraX. Defaults to False.
+        engine (str): Engine which processes the PDB files. "native" computes the surface modes supported by surface.supports and samples the sphere, ball, stick and cartoon modes supported by sample_atoms.supports without ChimeraX, see run_native. Defaults to "chimerax".
         keep_tmp dict[FT, bool]: Configuration to keep or remove processing files like PDB or GLB files after each processing step. Defaults to:
             {
                 FT.pdb_file: True,
@@ -53,6 +87,7 @@ class AlphafoldDBParser:
     alphafold_ver: str = AlphaFoldVersion.v1.value
     batch_size: int = 50
     processing: str = ColoringModes.cartoons_ss_coloring.value
+    additional_modes: list[str] = field(default_factory=lambda: [])
     overview_file: str = DEFAULT_OVERVIEW_FILE
     structures: dict[str, ProteinStructure] = field(default_factory=lambda: {})
     not_fetched: list[str] = field(default_factory=lambda: set())
@@ -81,6 +116,20 @@ class AlphafoldDBParser:
     pool_initialized: bool = False
     only_singletons: bool = True
     scan_for_multifractions: bool = False
+    max_connections: int = fetcher.MAX_CONNECTIONS
+    compress_pdb: bool = False
+    use_missing_cache: bool = True
+    missing_ttl: float = ov_util.NOT_FETCHED_TTL
+    prefetch: int = 1
+    mirrors: list[str] = field(default_factory=lambda: [])
+    rate_limit: float = fetcher.RATE_LIMIT
+    archive: str = None
+    extract_bulk: bool = True
+    chimerax_workers: int or str = 1
+    chimerax_timeout: float = chimerax_pool.TIMEOUT
+    chimerax_memory: float = None
+    residue_index: bool = False
+    engine: str = Engine.chimerax.value
 
     def update_output_dir(self, output_dir):
         """Updates the output directory of resulting images.
@@ -106,8 +155,18 @@ class AlphafoldDBParser:
             self.WD, "processing_files", self.processing, "MAPS"
         )
         self.IMAGES_DIR = os.path.join(self.OUTPUT_DIR, "thumbnails")
-        self.combine_thread = None
         self.chimeraX_thread = None
+        # Guards the overview file and not_fetched, which are also used by the prefetcher
+        self.thread_lock = threading.RLock()
+        self.in_flight = set()
+        self._mirror_set = None
+        self._archive_source = None
+        self._chimerax_pool = None
+        # Number of running entry points, see closes_chimerax_pool
+        self._entry_depth = 0
+        self._mode_parsers = None
+        # PDB files, which are removed once their residue indices are written, see remove_pending_pdbs
+        self.pending_pdbs = []
 
     def init_dirs(self, subs=True) -> None:
         """
@@ -141,9 +200,111 @@ class AlphafoldDBParser:
             FT.xyz_high_file: self.OUTPUT_XYZ_HIGH_DIR,
             FT.thumbnail_file: self.IMAGES_DIR,
         }
+        # The directories of the additional modes depend on these directories
+        self._mode_parsers = None
         proteins = set(self.structures.keys())
         self.init_structures_dict(proteins)
 
+    @property
+    def pdb_ext(self) -> str:
+        """Extension of the PDB files. Fetched PDB files are stored gzip compressed, if self.compress_pdb is True."""
+        return ".pdb.gz" if self.compress_pdb else ".pdb"
+
+    @property
+    def source(self) -> str:
+        """Key of the database (and version) from which structures are fetched, e.g. "alphafold_v4"."""
+        if self.db == classes.Database.AlphaFold.value:
+            return f"{self.db}_{self.alphafold_ver}"
+        return self.db
+
+    def get_mirror_set(self) -> fetcher.MirrorSet:
+        """Returns the mirrors from which the structures are fetched. The mirror set is kept between batches, so the health of the mirrors and the rate limits persist."""
+        urls = list(self.mirrors) + [fetcher.default_url(self.db)]
+        if self._mirror_set is None or self._mirror_set_key != (urls, self.rate_limit):
+            self._mirror_set = fetcher.MirrorSet(urls, self.rate_limit)
+            self._mirror_set_key = (urls, self.rate_limit)
+        return self._mirror_set
+
+    def get_archive_source(self) -> archive_index.ArchiveSource or None:
+        """Returns the structure source of self.archive. The archive is indexed on first use. Returns None if no archive is set or it does not match the database or version."""
+        if self.archive is None or self.db != classes.Database.AlphaFold.value:
+            return None
+        if self._archive_source is None or self._archive_source.archive != self.archive:
+            self._archive_source = archive_index.ArchiveSource(self.archive)
+            version = self._archive_source.version
+            if version is not None and version != self.alphafold_ver:
+                self.log.warning(
+                    f"{self.archive} contains structures of AlphaFold DB {version}, but {self.alphafold_ver} is used. The archive will be ignored."
+                )
+        if self._archive_source.version not in (None, self.alphafold_ver):
+            return None
+        return self._archive_source
+
+    def fetch_from_archive(self, proteins: list[str]) -> list[str]:
+        """
+        Reads the structures which are contained in self.archive from it.
+
+        Args:
+            proteins (list[str]): List of proteins to fetch.
+
+        Returns:
+            list[str]: Proteins which could not be read from the archive and have to be fetched from the server.
+        """
+        source = self.get_archive_source()
+        if source is None:
+            return proteins
+        remaining = []
+        for protein in proteins:
+            if protein not in source:
+                remaining.append(protein)
+                continue
+            status = source.extract(
+                protein,
+                self.PDB_DIR,
+                self.get_filename(protein) + ".pdb",
+                compress=self.compress_pdb,
+            )
+            if status.success:
+                with self.thread_lock:
+                    self.not_fetched.discard(protein)
+            else:
+                remaining.append(protein)
+        return remaining
+
+    def known_missing(self) -> set[str]:
+        """Returns the structures which were not available on the server within the last self.missing_ttl seconds. Is empty if self.use_missing_cache is False."""
+        if not self.use_missing_cache:
+            return set()
+        return ov_util.get_not_fetched(
+            self.source, self.overview_file, self.missing_ttl
+        )
+
+    def filter_known_missing(self, proteins: list[str]) -> list[str]:
+        """
+        Filter out the proteins that were not available on the server recently and are not stored locally. These proteins are added to self.not_fetched.
+        """
+        with self.thread_lock:
+            known_missing = self.known_missing()
+        archive = self.get_archive_source()
+        if archive is not None:
+            known_missing = {p for p in known_missing if p not in archive}
+        to_fetch, skipped = [], []
+        for protein in proteins:
+            pdb_file = os.path.join(
+                self.PDB_DIR, self.get_filename(protein) + self.pdb_ext
+            )
+            if protein in known_missing and not os.path.isfile(pdb_file):
+                skipped.append(protein)
+            else:
+                to_fetch.append(protein)
+        if len(skipped) > 0:
+            self.log.info(
+                f"Structures {skipped} were not available on {self.db} during the last run. Skipping them."
+            )
+            with self.thread_lock:
+                self.not_fetched.update(skipped)
+        return to_fetch
+
     def get_filename(self, protein: str) -> str:
         """
         Get the filename of the protein.
@@ -157,35 +318,94 @@ class AlphafoldDBParser:
             proteins = [protein for protein in proteins if protein not in ignore]
         proteins = set(proteins)
         for protein in proteins:
-            # Catch cases in which the filename is already given
-            file_name = self.get_filename(protein)
-            pdb_file = os.path.join(self.PDB_DIR, file_name + ".pdb")
-            glb_file = os.path.join(self.GLB_DIR, file_name + ".glb")
-            ply_file = os.path.join(self.PLY_DIR, file_name + ".ply")
-            ASCII_file = os.path.join(self.ASCII_DIR, file_name + ".xyzrgb")
-            output_rgb = os.path.join(self.OUTPUT_RGB_DIR, file_name + ".png")
-            output_xyz = file_name + ".bmp"
-            output_xyz_low = os.path.join(self.OUTPUT_XYZ_LOW_DIR, output_xyz)
-            output_xyz_high = os.path.join(self.OUTPUT_XYZ_HIGH_DIR, output_xyz)
-            output_thumbnail = os.path.join(self.IMAGES_DIR, file_name + ".png")
-            files = (
-                pdb_file,
-                glb_file,
-                ply_file,
-                ASCII_file,
-                output_rgb,
-                output_xyz_low,
-                output_xyz_high,
-                output_thumbnail,
-            )
-            structure = ProteinStructure(protein, file_name, *files)
-            self.structures[protein] = structure
+            self.structures[protein] = self.create_structure(protein)
         self.write_mf_property(proteins)
         return self.structures
 
+    def create_structure(self, protein: str) -> ProteinStructure:
+        """Creates the ProteinStructure of the protein with the paths of its files in the directories of this parser."""
+        # Catch cases in which the filename is already given
+        file_name = self.get_filename(protein)
+        pdb_file = os.path.join(self.PDB_DIR, file_name + self.pdb_ext)
+        glb_file = os.path.join(self.GLB_DIR, file_name + ".glb")
+        ply_file = os.path.join(self.PLY_DIR, file_name + ".ply")
+        ASCII_file = os.path.join(self.ASCII_DIR, file_name + ".xyzrgb")
+        output_rgb = os.path.join(self.OUTPUT_RGB_DIR, file_name + ".png")
+        output_xyz = file_name + ".bmp"
+        output_xyz_low = os.path.join(self.OUTPUT_XYZ_LOW_DIR, output_xyz)
+        output_xyz_high = os.path.join(self.OUTPUT_XYZ_HIGH_DIR, output_xyz)
+        output_thumbnail = os.path.join(self.IMAGES_DIR, file_name + ".png")
+        files = (
+            pdb_file,
+            glb_file,
+            ply_file,
+            ASCII_file,
+            output_rgb,
+            output_xyz_low,
+            output_xyz_high,
+            output_thumbnail,
+        )
+        return ProteinStructure(protein, file_name, *files)
+
+    def mode_parsers(self, proteins: list[str] = None) -> list["AlphafoldDBParser"]:
+        """
+        Returns one parser for each of the additional modes. These parsers have the configuration of this parser, but use the subdirectories of their mode. They post-process the GLB files, which ChimeraX exports for their mode in chimerax_process. Only the lock of the overview file is shared, the mutable containers are copied.
+
+        Args:
+            proteins (list[str]): Proteins for which the parsers need structures. Defaults to None.
+
+        Returns:
+            list[AlphafoldDBParser]: The parsers of the additional modes.
+        """
+        if self._mode_parsers is None:
+            self._mode_parsers = []
+            for mode in self.additional_modes:
+                if mode == self.processing:
+                    continue
+                parser = replace(
+                    self,
+                    processing=mode,
+                    additional_modes=[],
+                    structures={},
+                    not_fetched=set(self.not_fetched),
+                    already_processed=set(self.already_processed),
+                    keep_tmp=dict(self.keep_tmp),
+                    colors=list(self.colors),
+                    mirrors=list(self.mirrors),
+                )
+                parser.multi_fraction = list(self.multi_fraction)
+                # All parsers write the same overview file
+                parser.thread_lock = self.thread_lock
+                # The pool of ChimeraX workers and the pending PDB files stay with this parser, as it exports the GLB files of all modes, see chimerax_process
+                parser.PDB_DIR = self.PDB_DIR
+                for directory in ["GLB_DIR", "PLY_DIR", "ASCII_DIR", "OUTPUT_DIR"]:
+                    setattr(
+                        parser, directory, os.path.join(getattr(self, directory), mode)
+                    )
+                parser.init_dirs()
+                self._mode_parsers.append(parser)
+        for parser in self._mode_parsers:
+            for protein in proteins or []:
+                if protein not in parser.structures:
+                    structure = parser.create_structure(protein)
+                    if protein in self.structures and self.structures[protein].mf:
+                        structure = parser.mark_multifraction(structure)
+                    parser.structures[protein] = structure
+        return self._mode_parsers
+
+    def needs_glb(self, protein: str) -> bool:
+        """Returns True if ChimeraX has to export the GLB file of the protein, i.e. none of its GLB, PLY and ASCII files exist or overwrite is set."""
+        structure = self.structures[protein]
+        structure.update_file_existence([FT.glb_file, FT.ply_file, FT.ascii_file])
+        return self.overwrite or not (
+            structure.existing_files[FT.glb_file]
+            or structure.existing_files[FT.ply_file]
+            or structure.existing_files[FT.ascii_file]
+        )
+
     def fetch_pdb(self, proteins: list[str], on_demand: bool = True) -> None:
         """
-        Fetches .pdb File from the AlphaFold Server. This function uses the request module from python standard library to directly download pdb files from the AlphaFold server. PDB files which are already stored locally wont be downloaded again. To enforce refetching of the PDB files, the self.force_fetch flag can be set to True.
+        Fetches .pdb File from the AlphaFold Server. Structures contained in self.archive are read from the local archive instead. The downloads are executed concurrently by the fetcher module, at most self.max_connections requests are in flight at the same time. PDB files which are already stored locally wont be downloaded again. To refetch the PDB files, the self.force_refetch flag can be set to True. In this case, already fetched files are revalidated with conditional requests and only downloaded again if they changed on the server.
 
         Args:
             proteins (list[str]): List of proteins to fetch.
@@ -194,127 +414,471 @@ class AlphafoldDBParser:
         Returns:
             None
         """
+        proteins = self.prepare_batch(proteins)
+        if len(proteins) == 0:
+            self.log.info(
+                f"All structures of this batch: {proteins} are already fetched. wont download them again."
+            )
+            return
+        for protein in self.download_pdbs(proteins, on_demand):
+            self.structures[protein].existing_files[FT.pdb_file] = True
+
+    def prepare_batch(self, proteins: list[str], **kwargs) -> list[str]:
+        """
+        Creates the structures of a batch and filters out the structures, whose results already exist. This changes the structures of this parser and of its mode parsers, so it has to be called from the main thread. The PDB files of the structures are detected, if they were already downloaded by download_pdbs.
+
+        Returns:
+            list[str]: The proteins which still have to be processed.
+        """
         if isinstance(proteins, str):
             proteins = set([proteins])
         if isinstance(proteins, list):
             proteins = set(proteins)
         self.init_structures_dict(proteins)
         # Check whether the result of the pipeline does already exist and if so, skip the download for these structures.
-        proteins = self.filter_already_processed(proteins)
-        if len(proteins) == 0:
-            self.log.info(
-                f"All structures of this batch: {proteins} are already fetched. wont download them again."
-            )
-            return
+        return self.filter_already_processed(proteins)
+
+    def download_pdbs(self, proteins: list[str], on_demand: bool = True) -> set[str]:
+        """
+        Downloads the PDB files of the proteins into self.PDB_DIR, see fetch_pdb. Apart from the sets and the overview file guarded by self.thread_lock, no state of the parser is changed, so this can run in the background while other batches are processed.
 
+        Args:
+            proteins (list[str]): List of proteins to fetch.
+            on_demand (bool): If True, the function will check if there is enough space on the disk to store the files. If not, it will delete the oldest files.
+
+        Returns:
+            set[str]: Proteins whose PDB files were written.
+        """
         # Check if there is enough space on the disk and collect all file that are not needed anymore until enough space is available
         if on_demand:
+            with self.thread_lock:
+                protected = set(proteins) | self.in_flight
             tmp = util.free_space(
                 self.DIRS,
                 len(proteins),
                 self.num_cached,
-                proteins=proteins,
+                proteins=protected,
                 version=self.alphafold_ver,
             )
 
         # Check which pdb files have to be fetched and which are already fetched.
-        self.not_fetched = set()
-        for protein in proteins:
-            structure = self.structures[protein]
-            self.log.debug(f"Checking if {protein} is already processed.")
-            if not structure.existing_files[FT.pdb_file] or self.force_refetch:
-                self.log.debug(f"Fetching {protein} from {self.db}.")
-                if self.db == classes.Database.AlphaFold.value:
-                    if util.fetch_pdb_from_alphafold(
-                        protein,
-                        self.PDB_DIR,
-                        self.alphafold_ver,
-                    ):
-                        structure.existing_files[FT.pdb_file] = True
-                    else:
-                        self.not_fetched.add(protein)
-                elif self.db == classes.Database.RCSB.value:
-                    if util.fetch_pdb_from_rcsb(protein, self.PDB_DIR):
-                        structure.existing_files[FT.pdb_file] = True
-                    else:
-                        self.not_fetched.add(protein)
+        to_fetch = []
+        for protein in self.filter_known_missing(proteins):
+            pdb_file = os.path.join(
+                self.PDB_DIR, self.get_filename(protein) + self.pdb_ext
+            )
+            if not os.path.isfile(pdb_file) or self.force_refetch:
+                to_fetch.append(protein)
             else:
                 self.log.debug(
                     f"Structure {protein} is already processed and refetch is not allowed."
                 )
 
+        # Read the structures which are available in the local archive
+        remaining = self.fetch_from_archive(to_fetch)
+        fetched = set(to_fetch) - set(remaining)
+
+        # Fetch all missing structures concurrently
+        if len(remaining) > 0:
+            self.log.debug(f"Fetching {remaining} from {self.db}.")
+            results = fetcher.fetch_structures(
+                remaining,
+                self.PDB_DIR,
+                self.db,
+                self.alphafold_ver,
+                self.max_connections,
+                compress=self.compress_pdb,
+                revalidate=self.force_refetch,
+                mirrors=self.get_mirror_set(),
+            )
+            with self.thread_lock:
+                for protein, status in results.items():
+                    if status.success:
+                        fetched.add(protein)
+                        self.not_fetched.discard(protein)
+                    else:
+                        self.not_fetched.add(protein)
+                # Remember which structures are not available on the server
+                not_found = {
+                    p for p, s in results.items() if s == FetchStatus.not_found
+                }
+                found = {p for p, s in results.items() if s.success}
+                ov_util.update_not_fetched(
+                    self.source,
+                    not_found,
+                    found & ov_util.get_not_fetched(self.source, self.overview_file),
+                    self.overview_file,
+                    self.missing_ttl,
+                )
+            not_modified = [
+                p for p, s in results.items() if s == FetchStatus.not_modified
+            ]
+            if len(not_modified) > 0:
+                self.log.debug(
+                    f"Structures {not_modified} did not change on the server."
+                )
+
         # Remove the collected files
         if on_demand:
-            util.remove_cached_files(
-                tmp, self.num_cached, len(proteins) - len(self.not_fetched)
-            )
+            with self.thread_lock:
+                not_fetched = len(self.not_fetched)
+            util.remove_cached_files(tmp, self.num_cached, len(proteins) - not_fetched)
+        return fetched
 
-    def chimerax_process(self, proteins: list[str], processing: str or None) -> None:
+    def chimerax_process(
+        self,
+        proteins: list[str],
+        processing: str or None,
+        completed: queue.Queue = None,
+    ) -> None:
         """
         Processes the .pdb files using ChimeraX and the bundle chimerax_bundle.py. Default processing mode is ColoringModes.cartoons_sscoloring
         As default, the source pdb file is NOT removed.
         To change this set self.keep_tmp[FT.pdb_file] = False.
+        If completed is given, each protein is put into it as soon as ChimeraX is done with it. None is put into it once all proteins are done.
         """
         colors = None
         import timeit
 
-        self.chimerax = util.search_for_chimerax()
-        if processing is None:
-            processing = ColoringModes.cartoons_ss_coloring.value
-        if processing.find("ss") != -1:
-            colors = self.colors
+        materialized = []
+        try:
+            if processing is None:
+                processing = ColoringModes.cartoons_ss_coloring.value
+            mode_parsers = self.mode_parsers(proteins)
+            modes = [processing] + [parser.processing for parser in mode_parsers]
+            if any(mode.find("ss") != -1 for mode in modes):
+                colors = self.colors
+            native = self.use_native_engine(modes)
+            if not native:
+                self.chimerax = util.search_for_chimerax()
+
+            to_process = set()
+            tmp_structs = []
+            by_file = {}
+            materialized = self.materialize_pdbs(proteins)
+            for protein in proteins:
+                structure = self.structures[protein]
+                if (
+                    (
+                        not structure.existing_files[
+                            FT.glb_file
+                        ]  # Skip if GLB file is present
+                        and not structure.existing_files[
+                            FT.ply_file
+                        ]  # Skip if PLY file is present
+                        and not structure.existing_files[FT.ascii_file]
+                        # Skip if ASCII file is present
+                    )
+                    # check if source is there
+                    and structure.existing_files[FT.pdb_file]
+                    or (self.overwrite and structure.existing_files[FT.pdb_file])
+                    # The GLB file of an additional mode is missing
+                    or structure.existing_files[FT.pdb_file]
+                    and any(parser.needs_glb(protein) for parser in mode_parsers)
+                ):
+                    to_process.add(structure.pdb_file.split("/")[-1])
+                    tmp_structs.append(structure)
+                    by_file[os.path.basename(structure.pdb_file)] = protein
+
+            def on_done(file: str, success: bool) -> None:
+                if completed is not None and success:
+                    completed.put(by_file[file])
+
+            # Process all Structures
+            if len(to_process) > 0:
+                self.log.info(f"Processing Structures:{to_process}")
+                if native:
+                    quarantined = self.run_native(
+                        tmp_structs, processing, colors, on_done
+                    )
+                else:
+                    quarantined = self.run_chimerax(
+                        to_process, processing, colors, on_done
+                    )
+                if len(quarantined) > 0:
+                    self.log.warning(
+                        f"Quarantined {list(quarantined)}, as ChimeraX crashed or timed out on them. Use --clear_quarantine to process them again."
+                    )
+                    with self.thread_lock:
+                        ov_util.update_quarantine(
+                            processing,
+                            {by_file[file]: r for file, r in quarantined.items()},
+                            self.overview_file,
+                        )
+                for structure in tmp_structs:
+                    structure.update_file_existence(
+                        [FT.glb_file, FT.ply_file, FT.ascii_file]
+                    )
+                    if (
+                        not self.keep_tmp[FT.pdb_file]
+                        and structure.existing_files[FT.pdb_file]
+                        and structure.pdb_file not in materialized
+                    ):
+                        if self.residue_index:
+                            self.pending_pdbs.append(structure.pdb_file)
+                        else:
+                            util.remove_fetched(structure.pdb_file)
+                    self.structures[structure.uniprot_id] = structure
+        finally:
+            # Signals the consumers first, so a failure below cannot block them
+            if completed is not None:
+                completed.put(None)
+            if self.residue_index:
+                # The residue indices are computed from the PDB files, see convert_glbs
+                self.pending_pdbs.extend(materialized)
+            else:
+                self.remove_materialized(materialized)
+
+    def run_chimerax(
+        self,
+        files: list[str],
+        processing: str,
+        colors: list,
+        on_done: callable = None,
+    ) -> dict[str, str]:
+        """
+        Processes the PDB files with the pool of long-lived ChimeraX workers. on_done is called with the file name and whether it succeeded as soon as a structure is processed. If self.chimerax_workers is 0, a single new ChimeraX process is started for all files instead. If this process crashes or times out, the remaining files are bisected to find the offending structures.
+        The GLB files of the additional modes are exported from the same load of each structure, see mode_parsers.
 
-        to_process = set()
-        tmp_structs = []
+        Returns:
+            dict[str, str]: Maps the files on which ChimeraX crashed or timed out to the reason.
+        """
+        save_location, images_dir = self.GLB_DIR, self.IMAGES_DIR
+        mode_parsers = self.mode_parsers()
+        if len(mode_parsers) > 0:
+            processing = [processing] + [parser.processing for parser in mode_parsers]
+            save_location = [save_location] + [p.GLB_DIR for p in mode_parsers]
+            images_dir = [images_dir] + [p.IMAGES_DIR for p in mode_parsers]
+        if self.chimerax_workers == 0:
+
+            def run(batch: list[str]) -> tuple[set[str], bool]:
+                finished = set()
+
+                def done(file: str, success: bool) -> None:
+                    finished.add(file)
+                    if on_done is not None:
+                        on_done(file, success)
+
+                success = util.run_chimerax_coloring_script(
+                    self.chimerax,
+                    self.PDB_DIR,
+                    batch,
+                    save_location,
+                    processing,
+                    colors,
+                    images_dir,
+                    self.images,
+                    self.gui,
+                    self.only_images,
+                    done,
+                    self.chimerax_timeout or None,
+                    self.chimerax_memory_limit(),
+                )
+                return finished, success
+
+            offenders = chimerax_pool.isolate_failures(run, sorted(files))
+            return {file: chimerax_pool.CRASHED for file in offenders}
+        images = self.images or self.only_images
+        results = self.get_chimerax_pool().process(
+            self.PDB_DIR,
+            files,
+            save_location,
+            processing,
+            colors,
+            images_dir if images else None,
+            self.only_images,
+            on_done,
+        )
+        return {
+            file: status
+            for file, status in results.items()
+            if status in (chimerax_pool.TIMEOUT_EXPIRED, chimerax_pool.CRASHED)
+        }
+
+    def use_native_engine(self, modes: list[str]) -> bool:
+        """Returns True if all modes are processed without ChimeraX, see run_native."""
+        if self.engine != Engine.native.value:
+            return False
+        unsupported = [
+            mode
+            for mode in modes
+            if not (surface.supports(mode) or sample_atoms.supports(mode))
+        ]
+        if len(unsupported) > 0:
+            self.log.warning(
+                f"The native engine does not support {unsupported}. Using ChimeraX instead."
+            )
+            return False
+        if self.images or self.only_images:
+            self.log.warning("Thumbnails can only be taken with ChimeraX.")
+            return False
+        return True
+
+    def run_native(
+        self,
+        structures: list[ProteinStructure],
+        processing: str,
+        colors: list,
+        on_done: callable = None,
+    ) -> dict[str, str]:
+        """
+        Processes the structures in this process instead of ChimeraX. The GLB files of the surface modes are created by surface.write_surface_glbs, so the surface of each structure is computed once for all modes. The ASCII point clouds of the sphere, ball, stick and cartoon modes are sampled directly from the atoms and the backbone by sample_atoms.write_point_clouds, which skips the GLB and PLY files. on_done is called with the file name and whether it succeeded as soon as a structure is processed.
+
+        Returns:
+            dict[str, str]: Always empty, as there is no ChimeraX process which could crash. Failed structures are logged.
+        """
+        parsers = [(self, processing)] + [
+            (parser, parser.processing) for parser in self.mode_parsers()
+        ]
+        for structure in structures:
+            file = os.path.basename(structure.pdb_file)
+            protein = structure.uniprot_id
+            meshes, clouds, point_indices = {}, {}, {}
+            for parser, mode in parsers:
+                target = parser.structures[protein]
+                if surface.supports(mode):
+                    meshes[target.glb_file] = mode
+                else:
+                    clouds[target.ascii_file] = mode
+                    if self.residue_index:
+                        point_indices[target.ascii_file] = recolor.point_index_file(
+                            target.rgb_file
+                        )
+            try:
+                if len(meshes) > 0:
+                    surface.write_surface_glbs(structure.pdb_file, meshes, colors)
+                scales = {}
+                if len(clouds) > 0:
+                    scales = sample_atoms.write_point_clouds(
+                        structure.pdb_file,
+                        clouds,
+                        self.img_size * self.img_size,
+                        colors,
+                        point_indices,
+                    )
+            except (OSError, ValueError) as e:
+                self.log.error(f"Could not process {file} natively: {e}")
+                if on_done is not None:
+                    on_done(file, False)
+                continue
+            for parser, _ in parsers:
+                target = parser.structures[protein]
+                if target.ascii_file in scales:
+                    target.scale = scales[target.ascii_file]
+                    target.update_file_existence(FT.ascii_file)
+                    parser.write_scale(protein)
+            self.log.debug(f"Processed {file} natively.")
+            if on_done is not None:
+                on_done(file, True)
+        return {}
+
+    def chimerax_memory_limit(self) -> int or None:
+        """Returns the limit of the address space of each ChimeraX process in bytes."""
+        if self.chimerax_memory is None:
+            return None
+        return int(self.chimerax_memory * 1024**3)
+
+    def get_chimerax_pool(self) -> chimerax_pool.ChimeraXPool:
+        """Returns the pool of ChimeraX workers. The pool is created on first use and kept until close_chimerax_pool is called, i.e. until the entry point of the run returns (see closes_chimerax_pool) or the interpreter exits."""
+        # Images are taken with the GUI, as in run_chimerax_coloring_script
+        gui = self.gui or self.images or self.only_images
+        size = self.chimerax_workers
+        if size == chimerax_pool.AUTO:
+            size = chimerax_pool.auto_workers()
+        timeout = self.chimerax_timeout or None
+        memory_limit = self.chimerax_memory_limit()
+        config = (self.chimerax, size, gui, timeout, memory_limit)
+        pool = self._chimerax_pool
+        if (
+            pool is None
+            or (
+                pool.chimerax,
+                pool.size,
+                pool.gui,
+                pool.timeout,
+                pool.memory_limit,
+            )
+            != config
+        ):
+            self.close_chimerax_pool()
+            self.log.debug(f"Using {size} ChimeraX workers.")
+            self._chimerax_pool = chimerax_pool.ChimeraXPool(*config)
+            atexit.register(self.close_chimerax_pool)
+        return self._chimerax_pool
+
+    def close_chimerax_pool(self) -> None:
+        if self._chimerax_pool is not None:
+            self._chimerax_pool.close()
+            self._chimerax_pool = None
+            atexit.unregister(self.close_chimerax_pool)
+
+    def materialize_pdbs(
+        self, proteins: list[str], fragments: bool = False
+    ) -> list[str]:
+        """
+        Writes the PDB files of structures, which still have to be processed by ChimeraX but are only available in self.archive, to the PDB directory. The files have to be removed with remove_materialized as soon as ChimeraX is done.
+
+        Args:
+            proteins (list[str]): Proteins which are scheduled for ChimeraX.
+            fragments (bool): If True, all fragments of each structure are written, e.g. to combine multi fraction structures. Defaults to False.
+
+        Returns:
+            list[str]: Paths of the written PDB files.
+        """
+        archive = self.get_archive_source()
+        if archive is None:
+            return []
+        materialized = []
         for protein in proteins:
+            if protein not in archive:
+                continue
             structure = self.structures[protein]
-            if (
-                (
-                    not structure.existing_files[
-                        FT.glb_file
-                    ]  # Skip if GLB file is present
-                    and not structure.existing_files[
-                        FT.ply_file
-                    ]  # Skip if PLY file is present
-                    and not structure.existing_files[FT.ascii_file]
-                    # Skip if ASCII file is present
+            if not fragments and (
+                # Multi fraction structures are stitched from their fragments, see combine_pipeline
+                structure.mf
+                or structure.existing_files[FT.pdb_file]
+                or not self.overwrite
+                and (
+                    structure.existing_files[FT.glb_file]
+                    or structure.existing_files[FT.ply_file]
+                    or structure.existing_files[FT.ascii_file]
                 )
-                and structure.existing_files[FT.pdb_file]  # check if source is there
-                or (self.overwrite and structure.existing_files[FT.pdb_file])
             ):
-                to_process.add(structure.pdb_file.split("/")[-1])
-                tmp_structs.append(structure)
-        # Process all Structures
-        if len(to_process) > 0:
-            self.log.info(f"Processing Structures:{to_process}")
-            util.run_chimerax_coloring_script(
-                self.chimerax,
-                self.PDB_DIR,
-                to_process,
-                self.GLB_DIR,
-                processing,
-                colors,
-                self.IMAGES_DIR,
-                self.images,
-                self.gui,
-                self.only_images,
-            )
-            for structure in tmp_structs:
-                structure.update_file_existence(
-                    [FT.glb_file, FT.ply_file, FT.ascii_file]
+                continue
+            for fragment in archive.fragments(protein) if fragments else [1]:
+                file_name = f"AF-{protein}-F{fragment}-model_{self.alphafold_ver}.pdb"
+                path = os.path.join(self.PDB_DIR, file_name)
+                if os.path.isfile(path) or os.path.isfile(path + ".gz"):
+                    continue
+                if archive.extract(protein, self.PDB_DIR, file_name, fragment).success:
+                    materialized.append(path)
+            if not fragments:
+                structure.pdb_file = os.path.join(
+                    self.PDB_DIR, self.get_filename(protein) + ".pdb"
                 )
-                if (
-                    not self.keep_tmp[FT.pdb_file]
-                    and structure.existing_files[FT.pdb_file]
-                ):
-                    os.remove(structure.pdb_file)
-                self.structures[structure.uniprot_id] = structure
+                structure.update_file_existence(FT.pdb_file)
+        return materialized
+
+    def remove_pending_pdbs(self) -> None:
+        """Removes the PDB files, whose removal was deferred until their residue indices are written."""
+        self.remove_materialized(self.pending_pdbs)
+        self.pending_pdbs = []
+
+    def remove_materialized(self, materialized: list[str]) -> None:
+        """Removes the PDB files written by materialize_pdbs together with their metadata sidecars."""
+        materialized = set(materialized)
+        for path in materialized:
+            util.remove_fetched(path)
+        for structure in self.structures.values():
+            if structure.pdb_file in materialized:
+                structure.existing_files[FT.pdb_file] = False
 
     def convert_glbs(self, proteins: list[str]) -> None:
         """
         Converts the .glb files to .ply files.
         As default, the source glb file is removed afterwards.
         To change this set self.keep_tmp[FT.glb_file] = True.
+        If self.residue_index is True, the residue index of each PLY file is written as well.
         """
         for protein in proteins:
             structure = self.structures[protein]
@@ -332,8 +896,15 @@ class AlphafoldDBParser:
                 )
                 and structure.existing_files[FT.glb_file]
             ) or (self.overwrite and structure.existing_files[FT.glb_file]):
+                pdb_file = None
+                if self.residue_index and os.path.isfile(structure.pdb_file):
+                    pdb_file = structure.pdb_file
                 if util.convert_glb_to_ply(
-                    structure.glb_file, structure.ply_file, self.pcc_preview
+                    structure.glb_file,
+                    structure.ply_file,
+                    self.pcc_preview,
+                    pdb_file,
+                    self.processing,
                 ):
                     self.log.debug(
                         f"Converted {structure.glb_file} to {structure.ply_file}"
@@ -358,6 +929,7 @@ class AlphafoldDBParser:
         Samples the point cloud form the ply files.
         As default, the source ply file is removed afterwards.
         To change this set self.keep_tmp[FT.ply_file] = True.
+        If the PLY file has a residue index, the residue of each point is stored next to the color maps, see recolor.write_point_index.
         """
         for protein in proteins:
             structure = self.structures[protein]
@@ -366,40 +938,106 @@ class AlphafoldDBParser:
                 not structure.existing_files[FT.ascii_file]
                 and structure.existing_files[FT.ply_file]
             ) or (self.overwrite and structure.existing_files[FT.ply_file]):
+                index_file = recolor.residue_index_file(structure.ply_file)
+                point_index = recolor.point_index_file(structure.rgb_file)
+                if not os.path.isfile(index_file):
+                    index_file = None
+                    if os.path.isfile(point_index):
+                        # The point index of a previous run is outdated
+                        os.remove(point_index)
                 scale = spc.sample_pcd(
                     structure.ply_file,
                     structure.ascii_file,
                     self.img_size * self.img_size,
                     debug=self.pcc_preview,
+                    residue_index=index_file,
+                    point_index=point_index,
                 )
                 structure.update_file_existence(FT.ascii_file)
                 if structure.existing_files[FT.ascii_file]:
                     if not self.keep_tmp[FT.ply_file]:
                         os.remove(structure.ply_file)
-                    structure.scale = scale
+                        # The residue index is only valid for its mesh
+                        if index_file is not None:
+                            os.remove(index_file)
                     structure.update_file_existence(FT.ply_file)
-                    self.structures[protein] = structure
-                    if not async_call:
-                        self.write_scale(protein)
-                        self.log.debug(
-                            f"Sampled pcd to {structure.ascii_file} and wrote scale of {scale} to file {self.overview_file}"
-                        )
-                    else:
-                        with overview_lock:
-                            self.write_scale(protein)
-                            self.log.debug(
-                                f"Sampled pcd to {structure.ascii_file} and wrote scale of {scale} to file {self.overview_file}"
-                            )
+                    self.store_scale(protein, scale, async_call, overview_lock)
                 else:
                     self.log.warning(
                         f"Could not sample {structure.ply_file} to {structure.ascii_file}"
                     )
 
-            else:
+            elif not structure.existing_files[FT.ascii_file]:
                 self.log.warning(
                     f"PLY file for {protein} does not exist. Skipping sampling."
                 )
 
+    def sample_glbs(
+        self, proteins: list[str], async_call=False, overview_lock=None
+    ) -> None:
+        """
+        Samples the point clouds directly from the GLB files. The mesh is handed over in memory, so no PLY file is written and read again. Thus, this replaces convert_glbs and sample_pcd, unless the PLY files are kept (self.keep_tmp[FT.ply_file]).
+        As default, the source glb file is removed afterwards.
+        To change this set self.keep_tmp[FT.glb_file] = True.
+        If self.residue_index is True, the residue of each point is stored next to the color maps, see recolor.write_point_index.
+        """
+        for protein in proteins:
+            structure = self.structures[protein]
+            structure.update_file_existence([FT.glb_file, FT.ascii_file])
+            if not structure.existing_files[FT.glb_file] or (
+                structure.existing_files[FT.ascii_file] and not self.overwrite
+            ):
+                continue
+            try:
+                vertices, faces, colors = util.load_glb(structure.glb_file)
+            except Exception as e:
+                self.log.error(f"Could not load {structure.glb_file}: {e}")
+                continue
+            residue_index = None
+            if self.residue_index and os.path.isfile(structure.pdb_file):
+                residue_index = recolor.map_residues(
+                    vertices, structure.pdb_file, self.processing
+                )
+            point_index = recolor.point_index_file(structure.rgb_file)
+            if residue_index is None and os.path.isfile(point_index):
+                # The point index of a previous run is outdated
+                os.remove(point_index)
+            scale = spc.sample_mesh(
+                spc.mesh_from_arrays(vertices, faces, colors),
+                structure.ascii_file,
+                self.img_size * self.img_size,
+                debug=self.pcc_preview,
+                residue_index=residue_index,
+                point_index=point_index,
+            )
+            structure.update_file_existence(FT.ascii_file)
+            if not structure.existing_files[FT.ascii_file]:
+                self.log.warning(
+                    f"Could not sample {structure.glb_file} to {structure.ascii_file}"
+                )
+                continue
+            del vertices, faces, colors
+            if not self.keep_tmp[FT.glb_file]:
+                os.remove(structure.glb_file)
+            structure.update_file_existence(FT.glb_file)
+            self.store_scale(protein, scale, async_call, overview_lock)
+
+    def store_scale(
+        self, protein: str, scale: float, async_call=False, overview_lock=None
+    ) -> None:
+        """Keeps the scale of a sampled point cloud and writes it to the overview file. The parallel workers share the overview_lock."""
+        structure = self.structures[protein]
+        structure.scale = scale
+        self.structures[protein] = structure
+        if not async_call:
+            self.write_scale(protein)
+        else:
+            with overview_lock:
+                self.write_scale(protein)
+        self.log.debug(
+            f"Sampled pcd to {structure.ascii_file} and wrote scale of {scale} to file {self.overview_file}"
+        )
+
     def gen_maps(self, proteins: list[str]) -> None:
         """
         Generates the maps from the point cloud files.
@@ -450,11 +1088,12 @@ class AlphafoldDBParser:
         if isinstance(protein, str):
             protein = [protein]
         structures = [self.structures[p] for p in protein]
-        ov_util.write_scale(
-            structures,
-            self.processing,
-            self.overview_file,
-        )
+        with self.thread_lock:
+            ov_util.write_scale(
+                structures,
+                self.processing,
+                self.overview_file,
+            )
 
     def write_mf_property(self, protein) -> None:
         """
@@ -463,12 +1102,13 @@ class AlphafoldDBParser:
         if isinstance(protein, str):
             protein = [protein]
         structures = [self.structures[p] for p in protein]
-        ov_util.write_property(
-            structures,
-            "multi_structure",
-            "mf",
-            self.overview_file,
-        )
+        with self.thread_lock:
+            ov_util.write_property(
+                structures,
+                "multi_structure",
+                "mf",
+                self.overview_file,
+            )
 
     def set_version_from_filenames(self) -> None:
         """Iterates over all Directories and searches for files, which have AlphaFold version number. If one is found, set the Parser to this version. All files are treated with this version."""
@@ -499,26 +1139,30 @@ class AlphafoldDBParser:
         files = []
         for file in file_list:
             self.check_dirs(file, source)
-            if file.endswith((".pdb", ".glb", ".ply", ".xyzrgb", ".png", ".bmp")):
-                path = os.path.join(source, file)
-                files.append(path)
+            if file.endswith(
+                (".pdb", ".pdb.gz", ".glb", ".ply", ".xyzrgb", ".png", ".bmp")
+            ):
+                parsed = multifraction.parse_structure(file)
+                if parsed is None:
+                    self.log.warning(f"Skipping {file}, as it is no AlphaFold DB file.")
+                    continue
+                files.append((os.path.join(source, file), parsed))
         del file_list
-        self.alphafold_ver = (
-            os.path.basename(files[0]).split("/")[-1].split("_")[1]
-        )  # extract the Alphafold version from the first file
-        self.alphafold_ver = self.alphafold_ver[: self.alphafold_ver.find(".")]
-        proteins = set()
-        for file in files:
-            file_name = file.split("/")[-1]
-            proteins.add(file_name.split("-")[1])
+        if len(files) == 0:
+            self.log.warning(f"No structures found in {source}.")
+            return
+        # extract the Alphafold version from the first file
+        self.alphafold_ver = files[0][1][1]
+        proteins = {protein for _, (protein, _) in files}
 
         self.init_structures_dict(proteins, self.multi_fraction)
-        for file in files:
-            protein = file.split("/")[-1].split("-")[1]
+        for file, (protein, _) in files:
             structure = self.structures[protein]
             if protein in self.multi_fraction:
                 structure.mf = True
-            structure.set_file(file)
+            # The PDB files of multi fraction structures are their fractions, which are stitched by combine_pipeline
+            if not (structure.mf and file.endswith((".pdb", ".pdb.gz"))):
+                structure.set_file(file)
             structure.update_existence()
             self.structures[protein] = structure
         self.log.info("Starting the batched processing of all proteins...")
@@ -531,82 +1175,128 @@ class AlphafoldDBParser:
         The PLY file is used to sample the point cloud which will be saved as an ASCII point cloud. This ASCII point cloud will then be used to generate the color maps (rgb, xyz_low and xyz_high).
         """
         proteins = self.filter_already_processed(proteins)
+        # If they are not fetched and there are no local files, You wont be able to process them
+        with self.thread_lock:
+            missing = self.not_fetched | self.known_missing()
         proteins = [
-            p for p in proteins if p not in self.not_fetched
-        ]  # If they are not fetched, You wont be able to process them
-        not_multi_fraction = [
-            proteins for proteins in proteins if self.structures[proteins].mf == False
+            p
+            for p in proteins
+            if p not in missing or any(self.structures[p].existing_files.values())
         ]
+        quarantined = ov_util.get_quarantined(self.processing, self.overview_file)
+        skipped = [p for p in proteins if p in quarantined]
+        if len(skipped) > 0:
+            self.log.info(
+                f"ChimeraX crashed or timed out on {skipped} in {self.processing} during a previous run. Skipping them."
+            )
+            proteins = [p for p in proteins if p not in quarantined]
+        # Multi fraction structures are rendered from their stitched PDB files, see combine_pipeline
         if self.only_singletons:
-            proteins = not_multi_fraction
+            proteins = [p for p in proteins if not self.structures[p].mf]
 
-        if len(not_multi_fraction) == 0 and len(proteins) == 0:
-            tmp = ", ".join(proteins)
+        if len(proteins) == 0:
             self.log.info(
-                f"All structures of this batch: {tmp} are already processed. Skipping this batch."
+                "All structures of this batch are already processed. Skipping this batch."
             )
             return
         # clean up exiting glb files
         if self.overwrite:
-            for protein in not_multi_fraction:
-                structure = self.structures[protein]
-                if structure.existing_files[FT.glb_file]:
-                    os.remove(structure.glb_file)
+            for parser in [self] + self.mode_parsers(proteins):
+                for protein in proteins:
+                    structure = parser.structures[protein]
                     structure.update_file_existence([FT.glb_file])
-                    self.structures[protein] = structure
+                    if structure.existing_files[FT.glb_file]:
+                        os.remove(structure.glb_file)
+                        structure.update_file_existence([FT.glb_file])
+                        parser.structures[protein] = structure
+        completed = queue.Queue()
         try:
             self.chimeraX_thread = threading.Thread(
                 target=self.chimerax_process,
                 args=(
-                    not_multi_fraction,
+                    proteins,
                     self.processing,
+                    completed,
                 ),
             )
         except Exception as e:
             traceback.print_exc(e)
             raise exceptions.ChimeraXException
 
-        if len(not_multi_fraction) > 0:
-            self.log.debug(
-                "Some structures are not multi fraction. Starting ChimeraX..."
-            )
-            self.chimeraX_thread.start()
+        self.log.debug("Starting ChimeraX...")
+        self.chimeraX_thread.start()
 
         if self.only_images:
             self.wait_for_subprocesses()
+            self.remove_pending_pdbs()
             return
 
         if self.parallel and len(proteins) > 1 and os.cpu_count() > 2:
-            self.fill_queue(proteins)
+            self.fill_queue(proteins, completed)
+            # The parallel workers only handle the first mode
+            for parser in self.mode_parsers(proteins):
+                parser.post_process(proteins)
             self.wait_for_subprocesses()
             return
 
-        # If the program is not parallelized, run the pipeline sequentially
+        # If the program is not parallelized, each structure is processed further as soon as ChimeraX is done with it
+        remaining = list(proteins)
+        for protein in self.iter_completed(completed):
+            if protein in remaining:
+                remaining.remove(protein)
+                self.post_process([protein])
         self.wait_for_subprocesses()
+        # Structures which did not pass ChimeraX in this batch, e.g. with existing GLB files
+        self.post_process(remaining)
+        self.remove_pending_pdbs()
 
+    def post_process(self, proteins: list[str]) -> None:
+        """Converts the GLB files of the proteins, samples their point clouds and generates the color maps."""
+        if len(proteins) == 0:
+            return
         for protein in proteins:
             self.structures[protein].update_file_existence([FT.glb_file])
 
-        self.log.debug("Converting GLBs to PLYs...")
-        self.convert_glbs(proteins)
+        if self.keep_tmp[FT.ply_file]:
+            self.log.debug("Converting GLBs to PLYs...")
+            self.convert_glbs(proteins)
+        else:
+            self.log.debug("Sampling PointClouds from GLBs...")
+            self.sample_glbs(proteins)
         self.log.debug("Sampling PointClouds...")
         self.sample_pcd(proteins)
         self.log.debug("Generating Color Maps...")
         self.gen_maps(proteins)
+        for parser in self.mode_parsers(proteins):
+            self.log.debug(f"Post-processing {parser.processing}...")
+            parser.post_process(proteins)
+
+    def iter_completed(self, completed: queue.Queue):
+        """Yields the proteins which chimerax_process puts into completed until it puts None. Stops as well if the ChimeraX thread died without doing so."""
+        while True:
+            try:
+                protein = completed.get(timeout=COMPLETED_POLL)
+            except queue.Empty:
+                alive = (
+                    self.chimeraX_thread is not None and self.chimeraX_thread.is_alive()
+                )
+                if not alive and completed.empty():
+                    self.log.error("The ChimeraX thread stopped unexpectedly.")
+                    return
+                continue
+            if protein is None:
+                return
+            yield protein
 
     def wait_for_subprocesses(self):
         if self.chimeraX_thread and self.chimeraX_thread.is_alive():
             self.log.debug("Joining ChimeraX thread ...")
             self.chimeraX_thread.join()
             self.log.debug("ChimeraX thread joined.")
-        if self.combine_thread and self.combine_thread.is_alive():
-            self.log.debug("Joining Combine thread ...")
-            self.combine_thread.join()
-            self.log.debug("Combine thread joined.")
 
     def fetch_pipeline(self, proteins: set[str], **kwargs) -> None:
         """
-        Fetch of the structure from the alphafold db.
+        Fetch of the structure from the alphafold db. The structures of each batch are fetched concurrently, see fetch_pdb.
         """
         print(proteins)
         if isinstance(proteins, str):
@@ -629,8 +1319,9 @@ class AlphafoldDBParser:
         Filter out the proteins that have already been processed.
         """
         to_process = []
+        parsers = [self] + self.mode_parsers(proteins)
         for protein in proteins:
-            if not self.output_exists(self.structures[protein]):
+            if not all(p.output_exists(p.structures[protein]) for p in parsers):
                 to_process.append(protein)
             else:
                 self.already_processed.add(protein)
@@ -657,7 +1348,7 @@ class AlphafoldDBParser:
         """
         # TODO reduce to do this only once for each file type.
         if self.PDB_DIR != source:
-            if file.endswith(".pdb"):
+            if file.endswith((".pdb", ".pdb.gz")):
                 self.PDB_DIR = source
         if self.GLB_DIR != source:
             if file.endswith(".glb"):
@@ -713,8 +1404,17 @@ class AlphafoldDBParser:
 
     def set_coloring_mode(self, args: Namespace) -> None:
         if args.color_mode is not None:
-            if args.color_mode in ColoringModes.__members__.keys():
-                self.processing = args.color_mode
+            # Several modes can be given comma separated
+            modes = []
+            for mode in args.color_mode.split(","):
+                if mode in ColoringModes.__members__.keys():
+                    modes.append(mode)
+                elif mode:
+                    self.log.warning(f"Unknown coloring mode {mode}. Ignoring it.")
+            if len(modes) > 0:
+                self.processing = modes[0]
+                self.additional_modes = modes[1:]
+                self._mode_parsers = None
 
     def set_img_size(self, args: Namespace) -> None:
         if args.img_size is not None:
@@ -724,23 +1424,191 @@ class AlphafoldDBParser:
         if args.database is not None:
             self.db = args.database
 
+    def set_max_connections(self, args: Namespace) -> None:
+        if args.max_connections is not None:
+            self.max_connections = args.max_connections
+
+    def set_force_refetch(self, args: Namespace) -> None:
+        if args.refetch is not None:
+            self.force_refetch = args.refetch
+
+    def set_missing_cache(self, args: Namespace) -> None:
+        if args.ignore_missing_cache is not None:
+            self.use_missing_cache = not args.ignore_missing_cache
+        if args.clear_missing_cache:
+            ov_util.clear_not_fetched(self.overview_file)
+
+    def set_mirrors(self, args: Namespace) -> None:
+        if args.mirror is not None:
+            self.mirrors = args.mirror
+        if args.rate_limit is not None:
+            self.rate_limit = args.rate_limit
+
+    def set_prefetch(self, args: Namespace) -> None:
+        if args.prefetch is not None:
+            self.prefetch = args.prefetch
+
+    def set_archive(self, args: Namespace) -> None:
+        if args.structure_archive is not None:
+            self.archive = args.structure_archive
+
+    def set_extract_bulk(self, args: Namespace) -> None:
+        if getattr(args, "no_extract", None) is not None:
+            self.extract_bulk = not args.no_extract
+
+    def set_engine(self, args: Namespace) -> None:
+        if args.engine is not None:
+            self.engine = args.engine
+
+    def set_chimerax_workers(self, args: Namespace) -> None:
+        if args.chimerax_workers is not None:
+            self.chimerax_workers = args.chimerax_workers
+
+    def set_chimerax_limits(self, args: Namespace) -> None:
+        if args.chimerax_timeout is not None:
+            self.chimerax_timeout = args.chimerax_timeout
+        if args.chimerax_memory is not None:
+            self.chimerax_memory = args.chimerax_memory
+        if args.clear_quarantine:
+            ov_util.clear_quarantine(self.overview_file)
+
+    def set_compress_pdb(self, args: Namespace) -> None:
+        if args.compress_pdb is not None:
+            self.compress_pdb = args.compress_pdb
+
+    @closes_chimerax_pool
     def execute_fetch(self, proteins: str) -> None:
         """Uses a list of proteins to fetch the PDB files from the alphafold db. This PDB files will then be used to generated the color maps."""
         print(proteins)
         proteins = proteins.split(",")
         print(proteins)
+        proteins = self.filter_known_missing(proteins)
         self.log.debug(f"Proteins to fetch from Alphafold:{proteins}")
         self.fetch_pipeline(proteins)
 
+    @closes_chimerax_pool
     def execute_from_object(self, proteins: list[str]) -> None:
         """Uses a list of proteins which are extracted from a Python object. This assumes that the PDB files of these structures already exist in the PDB directory."""
         self.proteins_from_list(proteins)
 
+    @closes_chimerax_pool
     def execute_local(self, source: str) -> None:
         """Will extract all Uniprot IDs from a local directory. Assumes that the file names have a the following format:
         AF-<Uniprot ID>-F1-model-<v1/v2>.[pdb/glb/ply/xyzrgb]"""
         self.proteins_from_dir(source)
 
+    def execute_recolor(self, source: str) -> None:
+        """
+        Applies self.processing to already processed structures in source without ChimeraX. Only structures with a residue index (see residue_index), which were rendered with the same display mode, e.g. cartoons, can be recolored. The colors are computed from the fields of the PDB files, see recolor.residue_colors.
+        If source is an output directory whose maps have point indices (see recolor.write_point_index), only the rgb maps are written again and the xyz maps are reused. Otherwise, the meshes (PLY files) in source are recolored, sampled and mapped like in the pdb_pipeline.
+        """
+        if recolor.scheme(self.processing) not in recolor.SCHEMES:
+            self.log.error(
+                f"{self.processing} can not be computed without ChimeraX. Possible colorings: {recolor.SCHEMES}"
+            )
+            return
+        self.recolor_sources = {}
+        candidates = []
+        for file in os.listdir(source):
+            path = os.path.join(source, file)
+            if file.endswith(".ply") and os.path.isfile(
+                recolor.residue_index_file(path)
+            ):
+                candidates.append(path)
+        point_indices = os.path.join(source, recolor.POINT_INDEX_DIR)
+        if os.path.isdir(point_indices):
+            # Recoloring the maps is preferred, as it needs no sampling
+            candidates.extend(
+                os.path.join(point_indices, file)
+                for file in os.listdir(point_indices)
+                if file.endswith(recolor.RESIDUE_INDEX_EXT)
+            )
+        for path in candidates:
+            parsed = multifraction.parse_structure(path)
+            if parsed is None:
+                self.log.warning(f"Skipping {path}, as it is no AlphaFold DB file.")
+                continue
+            protein, self.alphafold_ver = parsed
+            self.recolor_sources[protein] = path
+        if len(self.recolor_sources) == 0:
+            self.log.warning(f"No structures with a residue index found in {source}.")
+            return
+        proteins = list(self.recolor_sources)
+        self.init_structures_dict(proteins)
+        self.log.info(f"Recoloring {len(proteins)} structures with {self.processing}.")
+        self.batch([self.recolor_pipeline], proteins, self.batch_size, on_demand=False)
+
+    def recolor_pipeline(self, proteins: list[str], **kwargs) -> None:
+        """Recolors the structures of the proteins, see execute_recolor. Maps with a point index are recolored directly. Meshes are recolored, sampled and mapped."""
+        colors = self.colors if recolor.scheme(self.processing) == "ss" else None
+        for protein in self.filter_already_processed(proteins):
+            structure = self.structures[protein]
+            source = self.recolor_sources[protein]
+            if source.endswith(".ply"):
+                self.recolor_structure_mesh(structure, source, colors)
+            else:
+                self.recolor_structure_map(structure, source, colors)
+
+    def recolor_structure_map(
+        self, structure: ProteinStructure, index_file: str, colors: list = None
+    ) -> None:
+        """Writes the rgb map of a structure from its point index and reuses the xyz maps next to the point index, see recolor.recolor_map."""
+        if not recolor.recolor_map(
+            index_file, structure.rgb_file, self.processing, self.img_size, colors
+        ):
+            return
+        source_dir = os.path.dirname(os.path.dirname(index_file))
+        targets = {
+            os.path.join(source_dir, "xyz", "low"): structure.xyz_low_file,
+            os.path.join(source_dir, "xyz", "high"): structure.xyz_high_file,
+            os.path.join(source_dir, recolor.POINT_INDEX_DIR): recolor.point_index_file(
+                structure.rgb_file
+            ),
+        }
+        for directory, target in targets.items():
+            path = os.path.join(directory, os.path.basename(target))
+            if os.path.isfile(path) and not (
+                os.path.isfile(target) and os.path.samefile(path, target)
+            ):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(path, target)
+        structure.scale = float(recolor.read_residue_index(index_file)["scale"])
+        structure.update_file_existence(
+            [FT.rgb_file, FT.xyz_low_file, FT.xyz_high_file]
+        )
+        self.write_scale(structure.uniprot_id)
+
+    def recolor_structure_mesh(
+        self, structure: ProteinStructure, mesh: str, colors: list = None
+    ) -> None:
+        """Recolors the mesh of a structure, see recolor.recolor_mesh, and samples and maps it."""
+        directory, name = os.path.split(structure.ply_file)
+        # The source mesh might be located in the PLY directory
+        output = os.path.join(directory, "tmp_" + name)
+        index_file = recolor.residue_index_file(mesh)
+        if not recolor.recolor_mesh(mesh, index_file, output, self.processing, colors):
+            return
+        try:
+            scale = spc.sample_pcd(
+                output,
+                structure.ascii_file,
+                self.img_size * self.img_size,
+                residue_index=index_file,
+                point_index=recolor.point_index_file(structure.rgb_file),
+            )
+        finally:
+            os.remove(output)
+        if scale is None:
+            self.log.warning(
+                f"Could not sample the recolored mesh of {structure.uniprot_id}."
+            )
+            return
+        structure.scale = scale
+        structure.update_file_existence(FT.ascii_file)
+        self.write_scale(structure.uniprot_id)
+        self.gen_maps([structure.uniprot_id])
+
+    @closes_chimerax_pool
     def execute_apply_to_multifractions(self):
         """Will combine all multifractions into a single 3D object with the desired processing mode applied to it. Will take the PDB directory as source."""
         self.only_singletons = False
@@ -758,18 +1626,7 @@ class AlphafoldDBParser:
 
         self.init_structures_dict(self.multi_fraction)
         self.multi_fraction = self.filter_already_processed(self.multi_fraction)
-        for protein in self.multi_fraction:
-            structure = self.structures[protein]
-            glb_file = structure.glb_file
-            file_name = os.path.basename(glb_file)
-            path = os.path.dirname(glb_file)
-            file_name = f"mf_{file_name}"
-            glb_file = os.path.join(path, file_name)
-            structure.glb_file = glb_file
-            structure.update_file_existence(FT.glb_file)
-            structure.mf = True
-            self.structures[protein] = structure
-        self.write_mf_property(self.multi_fraction)
+        self.mark_multifractions(self.multi_fraction)
         if self.only_singletons:
             return
         all_processed = True
@@ -784,44 +1641,143 @@ class AlphafoldDBParser:
             self.batch(
                 [self.combine_pipeline, self.pdb_pipeline],
                 proteins=self.multi_fraction,
-                batch_size=5,
+                batch_size=self.batch_size,
             )
 
-    def combine_pipeline(self, proteins):
-        self.combine_thread = threading.Thread(
-            util.combine_fractions(
-                self.PDB_DIR,
-                self.GLB_DIR,
-                self.processing,
-                gui=self.gui,
-                proteins=proteins,
-            )
-        )
-        self.combine_thread.start()
+    def mark_multifractions(self, proteins: list[str]) -> None:
+        """Marks the structures as multi fraction structures. Their stitched structure is stored as mf_<file name>.pdb (see combine_pipeline) and rendered to mf_<file name>.glb."""
+        for protein in proteins:
+            self.structures[protein] = self.mark_multifraction(self.structures[protein])
+        self.write_mf_property(proteins)
+
+    def mark_multifraction(self, structure: ProteinStructure) -> ProteinStructure:
+        """Points the PDB and GLB file of a structure to the ones of its stitched structure, see mark_multifractions."""
+        for file_type, directory, extension in [
+            (FT.pdb_file, self.PDB_DIR, ".pdb"),
+            (FT.glb_file, self.GLB_DIR, ".glb"),
+        ]:
+            path = os.path.join(directory, f"mf_{structure.file_name}{extension}")
+            structure.set_file(path)
+            structure.update_file_existence(file_type)
+        structure.mf = True
+        return structure
 
+    def combine_pipeline(self, proteins: list[str]) -> None:
+        """
+        Stitches the fractions of multi fraction structures into a single PDB file each, see combine.stitch_fractions. The stitched structures are then processed by pdb_pipeline like single fraction structures, so the overlaps of the fractions are only rendered and sampled once. Different structures are stitched in parallel.
+        """
+        materialized = self.materialize_pdbs(proteins, fragments=True)
+        try:
+            fractions = multifraction.multi_fractions(self.PDB_DIR, proteins)
+            parsers = [self] + self.mode_parsers(list(fractions))
+            jobs = []
+            for protein, files in fractions.items():
+                structure = self.structures[protein]
+                structure.update_file_existence(FT.pdb_file)
+                if structure.existing_files[FT.pdb_file] and not self.overwrite:
+                    continue
+                if not any(parser.needs_glb(protein) for parser in parsers):
+                    continue
+                jobs.append({"pdb_files": files, "output": structure.pdb_file})
+            if len(jobs) == 0:
+                return
+            self.log.info(f"Stitching the fractions of {len(jobs)} structures.")
+            combine.stitch_all(jobs, max(1, os.cpu_count() - 1))
+            for protein in fractions:
+                self.structures[protein].update_file_existence(FT.pdb_file)
+        finally:
+            self.remove_materialized(materialized)
+
+    @closes_chimerax_pool
     def execute_from_bulk(self, source: str):
-        """Will extract all PDB files from a tar archive downloaded from AlphafoldDB to Process all structures within it with the desired processing mode. Furthermore, multi fraction structures are combined to one large structure. These structures are not handled with the desired processing mode."""
+        """Will extract all PDB files from a tar archive downloaded from AlphafoldDB to Process all structures within it with the desired processing mode. Furthermore, multi fraction structures are combined to one large structure. These structures are not handled with the desired processing mode.
+        For uncompressed archives, single fraction structures are processed batch wise as soon as they are extracted, while the remaining members are still extracted in the background.
+        """
         self.scan_for_multifractions = True
-        self.extract_archive(source)
+        if not self.extract_bulk:
+            return self.process_archive(source)
+        try:
+            index = archive_index.load_index(source)
+        except ValueError:
+            # Which structures consist of multiple fractions is only known after a compressed archive is read completely
+            self.log.info(f"{source} is compressed. Extracting it before processing.")
+            index = None
+        if index is not None:
+            self.process_while_extracting(source, index)
+        else:
+            self.extract_archive(source)
         self.proteins_from_dir(self.PDB_DIR)
 
+    def process_archive(self, source: str) -> None:
+        """
+        Processes all structures of an uncompressed tar archive without extracting it. The PDB files are read from the archive when ChimeraX processes them and removed right afterwards, see materialize_pdbs.
+
+        Args:
+            source (str): Path to the tar archive.
+        """
+        self.archive = source
+        archive = archive_index.ArchiveSource(source)
+        if archive.version is not None:
+            self.alphafold_ver = archive.version
+        self._archive_source = archive
+        proteins = archive.proteins()
+        self.multi_fraction = [p for p in proteins if len(archive.fragments(p)) > 1]
+        self.init_structures_dict(proteins)
+        self.mark_multifractions(self.multi_fraction)
+        to_combine = self.filter_already_processed(self.multi_fraction)
+        if not self.only_singletons and len(to_combine) > 0:
+            self.batch(
+                [self.combine_pipeline, self.pdb_pipeline],
+                proteins=to_combine,
+                batch_size=self.batch_size,
+            )
+        self.log.info("Starting the batched processing of all proteins...")
+        self.batch([self.pdb_pipeline], proteins, self.batch_size, on_demand=False)
+
+    def process_while_extracting(self, source: str, index: dict) -> None:
+        """
+        Extracts a tar archive in a background thread and processes the single fraction structures in batches as soon as they are extracted. Multi fraction structures are skipped, as they can only be combined once all of their fractions are extracted.
+
+        Args:
+            source (str): Path to the tar archive.
+            index (dict): Index of the archive, see archive_index.load_index.
+        """
+        if index["version"] is not None:
+            self.alphafold_ver = index["version"]
+        singletons = {
+            protein
+            for protein, fragments in index["members"].items()
+            if list(fragments) == ["1"]
+        }
+        extracted = queue.Queue()
+
+        def extract():
+            try:
+                for protein, _, _ in self.ingest_archive(source):
+                    if protein in singletons:
+                        extracted.put(protein)
+            finally:
+                extracted.put(None)
+
+        thread = threading.Thread(target=extract, daemon=True)
+        thread.start()
+        for batch_proteins in batcher.batches_from_queue(extracted, self.batch_size):
+            self.init_structures_dict(batch_proteins)
+            self.batch(
+                [self.pdb_pipeline], batch_proteins, self.batch_size, on_demand=False
+            )
+        thread.join()
+
+    def ingest_archive(self, source: str):
+        """Extracts the PDB files of a tar archive to the PDB directory and yields each structure once it is written, see archive_index.ingest_archive."""
+        return archive_index.ingest_archive(
+            source, self.PDB_DIR, compress=self.compress_pdb
+        )
+
     def extract_archive(self, source: str) -> None:
-        """Extracts a tar archive to the PDB directory."""
-        tar = tarfile.open(source)
-        ext = ".pdb.gz"
-        for member in tar.getmembers():
-            if member.name.endswith(ext):
-                tar.extract(member, self.PDB_DIR)
-        tar.close()
-
-        for file in os.listdir(self.PDB_DIR):
-            if file.endswith(ext):
-                in_file = os.path.join(self.PDB_DIR, file)
-                out_file = os.path.join(self.PDB_DIR, file.replace(".gz", ""))
-                with gzip.open(in_file, "rb") as f_in:
-                    with open(out_file, "wb") as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                os.remove(in_file)
+        """Extracts all PDB files of a tar archive to the PDB directory. The archive is read once and the members are decompressed in parallel."""
+        extracted = sum(1 for _ in self.ingest_archive(source))
+        self.log.info(f"Extracted {extracted} PDB files from {source}.")
 
     def clear_default_dirs(self) -> None:
         """Clears the default directories."""
@@ -877,6 +1833,10 @@ class AlphafoldDBParser:
         if args.process_multi_fraction is not None:
             self.only_singletons = not args.process_multi_fraction
 
+    def set_residue_index(self, args: Namespace):
+        if args.residue_index is not None:
+            self.residue_index = args.residue_index
+
     def set_scan_for_multifractions(self, args: Namespace):
         if args.scan_for_multifractions is not None:
             self.scan_for_multifractions = args.scan_for_multifractions
@@ -888,8 +1848,19 @@ class AlphafoldDBParser:
             self.set_alphafold_version,
             self.set_coloring_mode,
             self.set_chimerax,
+            self.set_engine,
+            self.set_chimerax_workers,
+            self.set_chimerax_limits,
             self.set_img_size,
             self.set_database,
+            self.set_max_connections,
+            self.set_compress_pdb,
+            self.set_force_refetch,
+            self.set_missing_cache,
+            self.set_prefetch,
+            self.set_mirrors,
+            self.set_archive,
+            self.set_extract_bulk,
             self.set_keep_tmp,
             self.set_only_images,
             self.set_thumbnails,
@@ -900,6 +1871,7 @@ class AlphafoldDBParser:
             self.set_parallel,
             self.set_singletons,
             self.set_scan_for_multifractions,
+            self.set_residue_index,
         ]:
             func(args)
 
@@ -934,18 +1906,38 @@ class AlphafoldDBParser:
                 self.img_size,
                 self.keep_tmp,
                 self.overview_lock,
+                self.residue_index,
+                self.processing,
             ]
             [self.pool.apply_async(worker_setup, args) for _ in range(np)]
             self.log.info(f"Runs in parallel with {np} processes.")
 
-        while len(que) > 0:
-            self.log.debug(f"Starting Batch form: {start} to {end}")
-            batch_proteins = que[:batch_size]
-            for func in funcs:
-                func(batch_proteins, **kwargs)
-            start = end
-            end += batch_size
-            del que[:batch_size]
+        prefetcher = self.start_prefetcher(funcs, que, batch_size, **kwargs)
+        if prefetcher is not None:
+            # The prefetcher only downloads, the structures are created when their batch is processed
+            funcs = [
+                self.prepare_batch if func == self.fetch_pdb else func for func in funcs
+            ]
+        i = 0
+        try:
+            while len(que) > 0:
+                self.log.debug(f"Starting Batch form: {start} to {end}")
+                batch_proteins = que[:batch_size]
+                if prefetcher is not None:
+                    prefetcher.wait_for(i)
+                for func in funcs:
+                    func(batch_proteins, **kwargs)
+                if prefetcher is not None:
+                    with self.thread_lock:
+                        self.in_flight.difference_update(batch_proteins)
+                    prefetcher.release()
+                start = end
+                end += batch_size
+                del que[:batch_size]
+                i += 1
+        finally:
+            if prefetcher is not None:
+                prefetcher.stop()
 
         if self.parallel and self.pool_initialized:
             self.all_done.set()
@@ -956,25 +1948,83 @@ class AlphafoldDBParser:
             self.pool.join()
             for protein, structure in self.result_dict.items():
                 self.to_process.remove(protein)
+            # The parallel workers are done with the PDB files
+            self.remove_pending_pdbs()
         self.log.info("=" * 30)
         self.log.info("All Batches, done!")
 
-    def fill_queue(self, proteins: list[str]):
-        while len(proteins) > 0:
-            tmp = []
-            for p in proteins:
-                if p in self.to_process:
-                    continue
-                structure = self.structures[p]
-                self.structures[p].update_file_existence(FT.glb_file)
-                if structure.existing_files[FT.glb_file]:
+    def start_prefetcher(
+        self, funcs: list[object], proteins: list[str], batch_size: int, **kwargs
+    ) -> batcher.Prefetcher or None:
+        """
+        Starts a prefetcher, which downloads the PDB files of the upcoming batches in the background while the current batch is processed, see download_pdbs. Nothing is started, if fetch_pdb is not part of funcs or prefetching is disabled.
+        """
+        if self.fetch_pdb not in funcs or self.prefetch <= 0:
+            return None
+        batches = [
+            proteins[i : i + batch_size] for i in range(0, len(proteins), batch_size)
+        ]
+        if len(batches) <= 1:
+            return None
+        depth = self.prefetch
+        if self.num_cached is not None and self.num_cached > 0:
+            # The current batch and all prefetched batches have to fit into the cache
+            depth = min(depth, self.num_cached // batch_size - 1)
+            if depth <= 0:
+                self.log.debug("Cache is too small for prefetching.")
+                return None
+
+        # The mode parsers and the archive index are created here, so the prefetcher only reads them
+        parsers = [self] + self.mode_parsers()
+        self.get_archive_source()
+
+        def fetch(batch_proteins, **kwargs):
+            with self.thread_lock:
+                self.in_flight.update(batch_proteins)
+            # Skips finished structures without creating their structures, see prepare_batch
+            to_fetch = [
+                protein
+                for protein in batch_proteins
+                if not all(
+                    parser.output_exists(parser.create_structure(protein))
+                    for parser in parsers
+                )
+            ]
+            if len(to_fetch) > 0:
+                self.download_pdbs(to_fetch, **kwargs)
+
+        prefetcher = batcher.Prefetcher(fetch, batches, depth, **kwargs)
+        prefetcher.start()
+        self.log.debug(f"Prefetching up to {depth} batches ahead.")
+        return prefetcher
+
+    def fill_queue(self, proteins: list[str], completed: queue.Queue = None):
+        """
+        Puts the proteins into the queue of the parallel workers as soon as their GLB files exist.
+
+        Args:
+            proteins (list[str]): Proteins of the current batch.
+            completed (queue.Queue): Queue into which chimerax_process puts each protein once its GLB file is written, followed by None. Defaults to None.
+        """
+        waiting = set()
+        for p in proteins:
+            if p in self.to_process:
+                continue
+            self.structures[p].update_file_existence(FT.glb_file)
+            if self.structures[p].existing_files[FT.glb_file]:
+                self.mp_queue.put(p)
+                self.to_process.add(p)
+            else:
+                waiting.add(p)
+        if completed is not None:
+            for p in self.iter_completed(completed):
+                if p in waiting and p not in self.to_process:
                     self.mp_queue.put(p)
                     self.to_process.add(p)
-                    continue
-                tmp.append(p)
-            proteins = tmp
-            print
-        print("Queue filled")
+                    waiting.discard(p)
+        if len(waiting) > 0:
+            self.log.warning(f"No GLB files were created for: {sorted(waiting)}")
+        self.log.debug("Queue filled")
 
 
 class AlphafoldDBParser_Worker:
@@ -988,9 +2038,15 @@ class AlphafoldDBParser_Worker:
         img_size,
         keep_tmp,
         overview_lock,
+        residue_index=False,
+        processing=ColoringModes.cartoons_ss_coloring.value,
     ):
         self.parser = AlphafoldDBParser(
-            overwrite=overwrite, img_size=img_size, keep_tmp=keep_tmp
+            overwrite=overwrite,
+            img_size=img_size,
+            keep_tmp=keep_tmp,
+            residue_index=residue_index,
+            processing=processing,
         )
         self.queue = queue
         self.all_done = all_done
@@ -1011,14 +2067,18 @@ class AlphafoldDBParser_Worker:
                 self.queue.task_done()
                 break
             proteins = [protein]
+            # The protein is only queued once its GLB file exists, see fill_queue
             structure = self.parser.structures[protein]
-
-            while not self.parser.structures[protein].existing_files[FT.glb_file]:
-                self.log.debug(f"Waiting for GLB files of: {protein}")
-                structure.update_file_existence(FT.glb_file)
-                self.parser.structures[protein] = structure
-            self.log.debug(f"Converting GLBs to PLYs for: {protein}")
-            self.parser.convert_glbs(proteins)
+            structure.update_file_existence(FT.glb_file)
+            self.parser.structures[protein] = structure
+            if self.parser.keep_tmp[FT.ply_file]:
+                self.log.debug(f"Converting GLBs to PLYs for: {protein}")
+                self.parser.convert_glbs(proteins)
+            else:
+                self.log.debug(f"Sampling PointClouds from GLBs for: {protein}")
+                self.parser.sample_glbs(
+                    proteins, async_call=True, overview_lock=self.overview_lock
+                )
 
             # while not self.parser.structures[protein].existing_files[FT.ply_file]:
             #     self.log.debug("Waiting for PLY files...")
@@ -1051,6 +2111,8 @@ def worker_setup(
     img_size,
     keep_tmp,
     overview_lock,
+    residue_index=False,
+    processing=ColoringModes.cartoons_ss_coloring.value,
 ):
     worker = AlphafoldDBParser_Worker(
         queue=queue,
@@ -1061,5 +2123,7 @@ def worker_setup(
         img_size=img_size,
         keep_tmp=keep_tmp,
         overview_lock=overview_lock,
+        residue_index=residue_index,
+        processing=processing,
     )
     worker.run()
@@ -0,0 +1,283 @@
+import gzip
+import json
+import os
+import tarfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import util
+from .classes import FetchStatus, Logger
+from .exceptions import InvalidStructureError
+from .multifraction import FRACTION_PATTERN
+
+log = Logger("ArchiveIndex")
+INDEX_EXT = ".index.json"
+
+
+def index_file(archive: str) -> str:
+    """Returns the path of the index sidecar of an archive."""
+    return archive + INDEX_EXT
+
+
+def build_index(archive: str) -> dict:
+    """
+    Scans the headers of an uncompressed tar archive (as provided for the proteomes of the AlphaFold DB) and records the position of each PDB member. Only the headers are read, the content of the members is skipped.
+
+    Args:
+        archive (str): Path to the tar archive.
+
+    Raises:
+        ValueError: If the archive is compressed as a whole. The members of a compressed archive cannot be read by seeking.
+
+    Returns:
+        dict: Index containing the size and modification time of the archive, the AlphaFold DB version and a mapping of UniProtID -> fragment -> [offset, size, member name].
+    """
+    members = {}
+    versions = set()
+    try:
+        tar = tarfile.open(archive, "r:")
+    except tarfile.ReadError as e:
+        raise ValueError(
+            f"{archive} is not an uncompressed tar archive. Only uncompressed archives can be indexed."
+        ) from e
+    with tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            match = FRACTION_PATTERN.match(os.path.basename(member.name))
+            if match is None:
+                continue
+            uniprot_id, fragment, version, _ = match.groups()
+            versions.add(version)
+            members.setdefault(uniprot_id, {})[fragment] = [
+                member.offset_data,
+                member.size,
+                member.name,
+            ]
+    if len(versions) > 1:
+        log.warning(f"{archive} contains structures of several versions: {versions}")
+    stat = os.stat(archive)
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "version": versions.pop() if len(versions) == 1 else None,
+        "members": members,
+    }
+
+
+def load_index(archive: str, rebuild: bool = False) -> dict:
+    """
+    Loads the index of an archive from its sidecar. The index is (re)built and stored next to the archive, if the sidecar does not exist, is unreadable or the archive changed since it was built.
+
+    Args:
+        archive (str): Path to the tar archive.
+        rebuild (bool): If True, the index is always rebuilt. Defaults to False.
+
+    Returns:
+        dict: The index, see build_index.
+    """
+    path = index_file(archive)
+    if not rebuild and os.path.isfile(path):
+        try:
+            with open(path, "r") as f:
+                index = json.load(f)
+            stat = os.stat(archive)
+            if index["size"] == stat.st_size and index["mtime"] == stat.st_mtime:
+                return index
+            log.info(f"{archive} changed since it was indexed.")
+        except (OSError, ValueError, KeyError):
+            log.warning(f"Index {path} is unreadable.")
+    log.info(f"Indexing {archive}.")
+    index = build_index(archive)
+    tmp_file = path + ".part"
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_file, path)
+    except OSError:
+        # The archive may be located in a read-only directory. The index is only kept in memory then.
+        log.warning(f"Could not store the index of {archive} at {path}.")
+    return index
+
+
+class ArchiveSource:
+    """
+    Structure source that reads single PDB files from a local AlphaFold DB proteome archive. An index of the archive (see load_index) is used to seek directly to the requested member, so that no other member has to be read or extracted.
+
+    Args:
+        archive (str): Path to the uncompressed tar archive.
+        rebuild (bool): If True, the index is rebuilt even if an up to date sidecar exists. Defaults to False.
+    """
+
+    def __init__(self, archive: str, rebuild: bool = False):
+        self.archive = archive
+        self.index = load_index(archive, rebuild)
+        self.members = self.index["members"]
+        self.file = None
+        self.lock = threading.Lock()
+
+    def __contains__(self, uniprot_id: str) -> bool:
+        return uniprot_id in self.members
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    @property
+    def version(self) -> str or None:
+        """AlphaFold DB version of the structures in the archive."""
+        return self.index["version"]
+
+    def proteins(self) -> list[str]:
+        """Returns the UniProtIDs of all structures in the archive."""
+        return list(self.members.keys())
+
+    def fragments(self, uniprot_id: str) -> list[int]:
+        """Returns the sorted fragment numbers of a structure. Structures with more than one fragment are multi fraction structures."""
+        return sorted(int(fragment) for fragment in self.members.get(uniprot_id, {}))
+
+    def read(self, uniprot_id: str, fragment: int = 1) -> bytes:
+        """
+        Reads the content of a single PDB file from the archive.
+
+        Args:
+            uniprot_id (str): UniProtID of the structure.
+            fragment (int): Number of the fragment. Defaults to 1.
+
+        Raises:
+            KeyError: If the structure is not contained in the archive.
+
+        Returns:
+            bytes: The uncompressed content of the PDB file.
+        """
+        offset, size, name = self.members[uniprot_id][str(fragment)]
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.archive, "rb")
+            self.file.seek(offset)
+            data = self.file.read(size)
+        if name.endswith(".gz"):
+            data = gzip.decompress(data)
+        return data
+
+    def extract(
+        self,
+        uniprot_id: str,
+        save_location: str,
+        file_name: str,
+        fragment: int = 1,
+        compress: bool = False,
+    ) -> FetchStatus:
+        """
+        Writes a single PDB file from the archive to the save location. The file is validated and written atomically like a fetched file (see util.write_pdb).
+
+        Args:
+            uniprot_id (str): UniProtID of the structure.
+            save_location (str): Path to the directory where the .pdb file should be saved.
+            file_name (str): Name of the resulting file.
+            fragment (int): Number of the fragment. Defaults to 1.
+            compress (bool): If True, the file is stored gzip compressed and ".gz" is appended to the file name. Defaults to False.
+
+        Returns:
+            FetchStatus: fetched, not_found if the structure is not contained in the archive or failed if the member is corrupt.
+        """
+        if str(fragment) not in self.members.get(uniprot_id, {}):
+            return FetchStatus.not_found
+        if compress:
+            file_name += ".gz"
+        try:
+            data = self.read(uniprot_id, fragment)
+            os.makedirs(save_location, exist_ok=True)
+            util.write_pdb([data], os.path.join(save_location, file_name), compress)
+        except (OSError, EOFError, InvalidStructureError) as e:
+            log.error(f"Could not read {uniprot_id} from {self.archive}: {e}")
+            return FetchStatus.failed
+        log.debug(f"Read {uniprot_id} from {self.archive}.")
+        return FetchStatus.fetched
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def pdb_members(archive: str):
+    """
+    Reads the PDB members of a tar archive in a single sequential pass. Compressed archives are supported as well.
+
+    Args:
+        archive (str): Path to the tar archive.
+
+    Yields:
+        tuple[str, int, str, bytes]: UniProtID, fragment, file name of the member and its raw (possibly gzip compressed) content.
+    """
+    with tarfile.open(archive, "r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = os.path.basename(member.name)
+            match = FRACTION_PATTERN.match(name)
+            if match is None:
+                continue
+            data = tar.extractfile(member).read()
+            yield match.group(1), int(match.group(2)), name, data
+
+
+def _write_member(data: bytes, path: str, compress: bool) -> None:
+    """Decompresses a member and writes it atomically. Runs in a worker process of ingest_archive."""
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    util.write_pdb([data], path, compress)
+
+
+def ingest_archive(
+    archive: str,
+    save_location: str,
+    processes: int = None,
+    compress: bool = False,
+    overwrite: bool = False,
+):
+    """
+    Extracts all PDB files of a tar archive to the save location. The archive is read once, the members are decompressed and written in a process pool and each PDB file is written atomically (see util.write_pdb). As this is a generator, the caller can process the structures while the remaining members are still extracted.
+
+    Args:
+        archive (str): Path to the tar archive.
+        save_location (str): Path to the directory where the .pdb files should be saved.
+        processes (int): Number of worker processes. Defaults to the number of CPUs.
+        compress (bool): If True, the files are stored gzip compressed as .pdb.gz. Defaults to False.
+        overwrite (bool): If True, already existing files are extracted again. Defaults to False.
+
+    Yields:
+        tuple[str, int, str]: UniProtID, fragment and path of each extracted PDB file, in the order in which they are finished.
+    """
+    os.makedirs(save_location, exist_ok=True)
+    processes = processes or os.cpu_count() or 1
+    # Bound the number of members in memory to keep the memory usage constant
+    max_pending = 4 * processes
+    pending = {}
+
+    def finished(futures):
+        for future in futures:
+            uniprot_id, fragment, path = pending.pop(future)
+            try:
+                future.result()
+            except (OSError, EOFError, InvalidStructureError) as e:
+                log.error(f"Could not extract {os.path.basename(path)}: {e}")
+                continue
+            yield uniprot_id, fragment, path
+
+    with ProcessPoolExecutor(processes) as executor:
+        for uniprot_id, fragment, name, data in pdb_members(archive):
+            name = name[:-3] if name.endswith(".gz") else name
+            path = os.path.join(save_location, name + (".gz" if compress else ""))
+            if not overwrite and os.path.isfile(path):
+                yield uniprot_id, fragment, path
+                continue
+            future = executor.submit(_write_member, data, path, compress)
+            pending[future] = (uniprot_id, fragment, path)
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+        while len(pending) > 0:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
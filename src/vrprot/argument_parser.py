@@ -1,11 +1,23 @@
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
 
-from .classes import AlphaFoldVersion, ColoringModes, Database
+from .chimerax_pool import AUTO
+from .classes import AlphaFoldVersion, ColoringModes, Database, Engine
+from .fetcher import MAX_CONNECTIONS, RATE_LIMIT
 from logging import _nameToLevel
 
 COLORMODE_CHOICES = ", ".join(list(col.value for col in ColoringModes)[:5])
 
 
+def worker_count(value: str) -> int or str:
+    """Parses the number of ChimeraX workers, which is an integer or "auto"."""
+    if value == AUTO:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise ArgumentTypeError(f'{value} is neither an integer nor "{AUTO}".')
+
+
 def argument_parser(exec_name="main.py"):
     """Argument parser function for the main function."""
     parser = ArgumentParser(prog=exec_name)
@@ -61,9 +73,25 @@ def argument_parser(exec_name="main.py"):
         help="Path to the tar archive",
         action="store",
     )
+    bulk_parser.add_argument(
+        "--no_extract",
+        "-nx",
+        help="Process the structures directly from the archive instead of extracting it. Each PDB file is only written while ChimeraX processes it. Requires an uncompressed archive.",
+        action="store_true",
+    )
+    recolor_parser = subparsers.add_parser(
+        "recolor",
+        help="Apply the coloring mode to structures with a residue index (see --residue_index) without ChimeraX. The structures need to be rendered with the same display mode, e.g. cartoons.",
+    )
+    recolor_parser.add_argument(
+        "source",
+        type=str,
+        help="Output directory containing the color maps and their residues directory or a directory containing PLY files and their residue indices.",
+        action="store",
+    )
     combine_parser = subparsers.add_parser(
         "combine",
-        help="Combine multi fraction protein structures into a single glb file. with ChimeraX and the desired coloring mode.",
+        help="Combine multi fraction protein structures into a single glb file. The overlapping fractions are stitched into a single structure, which is processed with the desired coloring mode.",
     )
     # Argument parser for clearing the processing_files directory
     clear = subparsers.add_parser(
@@ -152,7 +180,7 @@ def argument_parser(exec_name="main.py"):
         type=bool,
         nargs="?",
         choices=[True, False],
-        help="Define whether to still keep the PLY files after the ASCII file is created. Default is False.",
+        help="Define whether to still keep the PLY files after the ASCII file is created. If False, no PLY files are written and the point clouds are sampled directly from the GLB files. Default is False.",
         default=False,
     )
     parser.add_argument(
@@ -172,12 +200,44 @@ def argument_parser(exec_name="main.py"):
         metavar="CHIMERAX_EXEC",
         help="Defines, where to find the ChimeraX executable.",
     )
+    parser.add_argument(
+        "--engine",
+        "-en",
+        type=str,
+        nargs="?",
+        choices=[engine.value for engine in Engine],
+        help="Defines, how the PDB files are processed. native computes the surface, sphere, ball, stick and cartoons modes with the ss, rainbow, bFactor and chain colorings without ChimeraX. The sphere, ball, stick and cartoons point clouds are sampled directly from the atoms. All other modes and the thumbnails still need ChimeraX. Default is chimerax.",
+    )
+    parser.add_argument(
+        "--chimerax_workers",
+        "-cw",
+        type=worker_count,
+        nargs="?",
+        metavar="WORKERS",
+        help="Defines the number of long-lived ChimeraX processes, which process the structures concurrently. auto starts one per CPU core minus one, limited by the available memory. Each of them needs about 2 GB of memory. 0 starts a single new ChimeraX process for each batch. Default is 1.",
+    )
+    parser.add_argument(
+        "--chimerax_timeout",
+        "-ct",
+        type=float,
+        nargs="?",
+        metavar="SECONDS",
+        help="Defines the number of seconds ChimeraX may spend on a single structure before it is killed. Default is 600. 0 disables the timeout.",
+    )
+    parser.add_argument(
+        "--chimerax_memory",
+        "-cmem",
+        type=float,
+        nargs="?",
+        metavar="GB",
+        help="Defines the maximal virtual address space of each ChimeraX process in GB. This is not its resident memory: ChimeraX reserves far more address space than it uses, so the limit has to be generous, e.g. 16. Structures which exceed it are quarantined. Only supported on Linux. Default is no limit.",
+    )
     parser.add_argument(
         "--color_mode",
         "-cm",
         type=str,
         nargs="?",
-        help=f"Defines the coloring mode which will be used to color the structure. Choices: {COLORMODE_CHOICES}... . For a full list, see README.",
+        help=f"Defines the coloring mode which will be used to color the structure. Choices: {COLORMODE_CHOICES}... . For a full list, see README. Several modes can be given comma separated. Each structure is then opened only once in ChimeraX and the files of the additional modes are stored in subdirectories named after the mode.",
         default=ColoringModes.cartoons_ss_coloring.value,
     )
     parser.add_argument(
@@ -196,6 +256,84 @@ def argument_parser(exec_name="main.py"):
         choices=[db.value for db in Database],
         help=f"Defines the database from which the proteins will be fetched.",
     )
+    parser.add_argument(
+        "--max_connections",
+        "-mc",
+        type=int,
+        nargs="?",
+        metavar="MAX_CONNECTIONS",
+        help=f"Defines the maximal number of concurrent downloads. Default is {MAX_CONNECTIONS}.",
+        default=MAX_CONNECTIONS,
+    )
+    parser.add_argument(
+        "--mirror",
+        "-mi",
+        type=str,
+        action="append",
+        metavar="URL",
+        help="Base URL of a mirror of the database. Mirrors are tried in the given order before the public server. Can be used multiple times.",
+    )
+    parser.add_argument(
+        "--rate_limit",
+        "-rl",
+        type=float,
+        nargs="?",
+        metavar="REQUESTS_PER_SECOND",
+        help=f"Defines the maximal number of requests per second sent to each server. 0 disables the limit. Default is {RATE_LIMIT}.",
+        default=RATE_LIMIT,
+    )
+    parser.add_argument(
+        "--archive",
+        "-ar",
+        type=str,
+        dest="structure_archive",
+        metavar="ARCHIVE",
+        help="Path to a local AlphaFold DB proteome archive (uncompressed tar). Structures contained in the archive are read from it instead of being fetched from the server.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        "-pf",
+        type=int,
+        nargs="?",
+        metavar="BATCHES",
+        help="Defines how many batches are fetched in the background while the current batch is processed. 0 disables prefetching. Default is 1.",
+        default=1,
+    )
+    parser.add_argument(
+        "--compress_pdb",
+        "-gz",
+        action="store_true",
+        help="Store fetched PDB files gzip compressed.",
+        default=False,
+    )
+    parser.add_argument(
+        "--refetch",
+        "-rf",
+        action="store_true",
+        help="Revalidate already fetched PDB files against the server. Unchanged files are not downloaded again.",
+        default=False,
+    )
+    parser.add_argument(
+        "--ignore_missing_cache",
+        "-imc",
+        action="store_true",
+        help="Request structures again, which were not available on the server during the last runs.",
+        default=False,
+    )
+    parser.add_argument(
+        "--clear_missing_cache",
+        "-cmc",
+        action="store_true",
+        help="Forget which structures were not available on the server during the last runs.",
+        default=False,
+    )
+    parser.add_argument(
+        "--clear_quarantine",
+        "-cq",
+        action="store_true",
+        help="Process the structures again, on which ChimeraX crashed or timed out during the last runs.",
+        default=False,
+    )
     parser.add_argument(
         "--thumbnails",
         "-thumb",
@@ -256,6 +394,13 @@ def argument_parser(exec_name="main.py"):
         help="Defines whether to scan for multi fraction structures.",
         default=False,
     )
+    parser.add_argument(
+        "--residue_index",
+        "-ri",
+        action="store_true",
+        help="Store the residue of each vertex next to the PLY files and the residue of each pixel next to the color maps, so they can be recolored without ChimeraX with the recolor command.",
+        default=False,
+    )
     if parser.parse_args().mode == None:
         parser.parse_args(["-h"])
         exit()
@@ -1,3 +1,6 @@
+import threading
+import traceback
+
 from .classes import Logger
 
 log = Logger("batcher")
@@ -16,3 +19,66 @@ def batch(functions, proteins, batch_size):
             start = end
             end += batch_size
         del proteins[:batch_size]
+
+
+def batches_from_queue(queue, batch_size):
+    """Collects the items of a queue into batches of batch_size, as soon as they are available. None marks the end of the queue, the last batch may be smaller."""
+    batch_items = []
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        batch_items.append(item)
+        if len(batch_items) == batch_size:
+            yield batch_items
+            batch_items = []
+    if len(batch_items) > 0:
+        yield batch_items
+
+
+class Prefetcher(threading.Thread):
+    """
+    Fetches upcoming batches in a background thread while the current batch is processed. At most depth batches are fetched ahead of the batch which is currently processed.
+
+    Args:
+        fetch (callable): Function which fetches a batch of protein structures.
+        batches (list[list[str]]): All batches in the order in which they are processed.
+        depth (int): Number of batches which are fetched ahead.
+        kwargs: Keyword arguments passed to fetch.
+    """
+
+    def __init__(self, fetch, batches, depth, **kwargs):
+        super().__init__(daemon=True)
+        self.fetch = fetch
+        self.batches = batches
+        self.kwargs = kwargs
+        self.fetched = [threading.Event() for _ in batches]
+        # One slot for the batch which is processed and one for each batch ahead
+        self.slots = threading.Semaphore(depth + 1)
+        self.stopped = threading.Event()
+
+    def run(self):
+        for i, batch_proteins in enumerate(self.batches):
+            self.slots.acquire()
+            if self.stopped.is_set():
+                break
+            log.debug(f"Prefetching batch {i}.")
+            try:
+                self.fetch(batch_proteins, **self.kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                log.error(f"Prefetching of batch {i} failed: {e}")
+            finally:
+                self.fetched[i].set()
+
+    def wait_for(self, i):
+        """Blocks until batch i is fetched."""
+        self.fetched[i].wait()
+
+    def release(self):
+        """Marks the current batch as processed, so that the next batch can be fetched."""
+        self.slots.release()
+
+    def stop(self):
+        self.stopped.set()
+        self.slots.release()
@@ -0,0 +1,315 @@
+import json
+import os
+import queue
+import subprocess as sp
+import threading
+
+from . import util
+from .classes import Logger
+
+log = Logger("ChimeraXPool")
+WORKER_SCRIPT = os.path.join(util.SCRIPTS, "chimerax_worker.py")
+EXIT_TIMEOUT = 10  # Seconds to wait for a worker to exit before it is killed
+WORKER_MEMORY = 2 * 1024**3  # Bytes of memory reserved for each worker
+AUTO = "auto"  # Number of workers, which is chosen by auto_workers
+GZIP_RATIO = 4  # Typical compression ratio of PDB files
+TIMEOUT = 600  # Seconds a worker may spend on a single structure
+RETRIES = 1  # Retries of a structure after a crash or timeout before it is quarantined
+DONE, FAILED, TIMEOUT_EXPIRED, CRASHED = "done", "failed", "timeout", "crashed"
+
+
+def auto_workers() -> int:
+    """Returns the number of workers for this machine. One worker per available CPU core, leaving one core for the rest of the pipeline, but not more workers than fit into the available memory."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    workers = max(1, cpus - 1)
+    memory = available_memory()
+    if memory is not None:
+        workers = min(workers, max(1, memory // WORKER_MEMORY))
+    return workers
+
+
+def available_memory() -> int or None:
+    """
+    Returns the memory in bytes, which is available for new processes. This is MemAvailable of /proc/meminfo, which includes the reclaimable page cache, unlike the free pages. On systems without /proc/meminfo, the physical memory is used instead.
+
+    Returns:
+        int or None: The available memory or None, if it cannot be determined (Windows).
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    # The value is given in kB
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        # sysconf is not available on Windows
+        return None
+
+
+def estimate_cost(pdb_file: str) -> int:
+    """Estimates the processing cost of a structure by the size of its PDB file, which is proportional to the number of atoms."""
+    try:
+        size = os.path.getsize(pdb_file)
+    except OSError:
+        return 0
+    if pdb_file.endswith(".gz"):
+        size *= GZIP_RATIO
+    return size
+
+
+class ChimeraXWorker:
+    """
+    Long-lived ChimeraX process, which runs scripts/chimerax_worker.py. Structures are sent one at a time over stdin and the worker answers with one message per structure on stdout. Thus, the startup of ChimeraX is only paid once.
+
+    Args:
+        chimerax (str): Path to the ChimeraX executable.
+        gui (bool): If True, ChimeraX is started with its GUI. Defaults to False.
+        timeout (float): Seconds the worker may spend on a single structure before it is killed. Defaults to 600.
+        memory_limit (int): Maximal address space of the worker in bytes, see util.limit_memory. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        chimerax: str,
+        gui: bool = False,
+        timeout: float = TIMEOUT,
+        memory_limit: int = None,
+    ):
+        self.chimerax = chimerax
+        self.gui = gui
+        self.process = sp.Popen(
+            util.chimerax_command(chimerax, [WORKER_SCRIPT], gui),
+            stdin=sp.PIPE,
+            stdout=sp.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        util.limit_memory(self.process, memory_limit)
+        self.messages = util.watch_messages(self.process, timeout)
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def process_structure(self, job: dict) -> dict:
+        """
+        Sends a job to the worker and blocks until the structure is processed.
+
+        Args:
+            job (dict): Job containing source, target, file and mode. Optionally colors, images and only_images.
+
+        Returns:
+            dict: Message of the worker with the keys file, status and error. The status is "done" or "failed" as reported by the worker, "timeout" if the worker was killed by the watchdog or "crashed" if it exited.
+        """
+        try:
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return {"file": job["file"], "status": CRASHED, "error": "ChimeraX exited."}
+        try:
+            for message in self.messages:
+                if message.get("file") == job["file"]:
+                    return message
+        except TimeoutError as e:
+            return {"file": job["file"], "status": TIMEOUT_EXPIRED, "error": str(e)}
+        return {
+            "file": job["file"],
+            "status": CRASHED,
+            "error": f"ChimeraX exited with code {self.process.wait()}.",
+        }
+
+    def close(self) -> None:
+        """Asks the worker to exit and kills it, if it does not exit in time."""
+        if self.alive():
+            try:
+                self.process.stdin.write(json.dumps({"command": "exit"}) + "\n")
+                self.process.stdin.close()
+                self.process.wait(EXIT_TIMEOUT)
+            except (BrokenPipeError, OSError, sp.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+
+class ChimeraXPool:
+    """
+    Pool of long-lived ChimeraX workers. The workers are started on first use and kept until the pool is closed, so consecutive batches do not pay the startup of ChimeraX again.
+    A worker which exceeds the timeout or crashes, e.g. because it exceeded the memory limit, is replaced. Its structure is retried on a fresh worker and reported as quarantined if it fails again.
+
+    Args:
+        chimerax (str): Path to the ChimeraX executable.
+        size (int): Number of workers. Defaults to 1.
+        gui (bool): If True, ChimeraX is started with its GUI. Defaults to False.
+        timeout (float): Seconds a worker may spend on a single structure. Defaults to 600.
+        memory_limit (int): Maximal address space of each worker in bytes, see util.limit_memory. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        chimerax: str,
+        size: int = 1,
+        gui: bool = False,
+        timeout: float = TIMEOUT,
+        memory_limit: int = None,
+    ):
+        self.chimerax = chimerax
+        self.size = max(1, size)
+        self.gui = gui
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def new_worker(self) -> ChimeraXWorker:
+        return ChimeraXWorker(self.chimerax, self.gui, self.timeout, self.memory_limit)
+
+    def start(self, count: int = None) -> None:
+        """Starts workers until count (at most size) workers are running."""
+        count = self.size if count is None else min(count, self.size)
+        with self.lock:
+            self.workers = [w for w in self.workers if w.alive()]
+            while len(self.workers) < count:
+                self.workers.append(self.new_worker())
+
+    def process(
+        self,
+        pdb_dir: str,
+        files: list[str],
+        save_location: str or list[str],
+        processing: str or list[str],
+        colors: list = None,
+        images_dir: str or list[str] = None,
+        only_images: bool = False,
+        on_done: callable = None,
+    ) -> dict[str, str]:
+        """
+        Processes the structures concurrently with the workers of the pool. The structures are handed out in the order of decreasing estimated cost (see estimate_cost) and each idle worker takes the next one. This balances the load of the workers like the longest processing time first rule, so a large structure at the end of a batch does not keep a single worker busy while the others are idle.
+
+        Args:
+            pdb_dir (str): Directory containing the PDB files.
+            files (list[str]): File names of the structures to process.
+            save_location (str or list[str]): Directory where the GLB files are saved. One directory per mode, if several modes are given.
+            processing (str or list[str]): Coloring mode, e.g. "cartoons_ss_coloring". If several modes are given, each structure is opened once and one GLB file is saved per mode.
+            colors (list): Colors of the secondary structures. Defaults to None.
+            images_dir (str or list[str]): Directory where images of the structures are saved. One directory per mode, if several modes are given. No images are taken, if None. Defaults to None.
+            only_images (bool): If True, only images are taken. Defaults to False.
+            on_done (callable): Called with the file name and whether it succeeded as soon as a structure is processed. Defaults to None.
+
+        Returns:
+            dict[str, str]: Maps each file name to its final status, see ChimeraXWorker.process_structure. Structures with the status "timeout" or "crashed" failed on every retry.
+        """
+        for path in [save_location, images_dir]:
+            if path is None:
+                continue
+            for directory in [path] if isinstance(path, str) else path:
+                os.makedirs(directory, exist_ok=True)
+        jobs = queue.Queue()
+        files = sorted(
+            files,
+            key=lambda file: estimate_cost(os.path.join(pdb_dir, file)),
+            reverse=True,
+        )
+        for file in files:
+            jobs.put(
+                {
+                    "source": pdb_dir,
+                    "target": save_location,
+                    "file": os.path.basename(file),
+                    "mode": processing,
+                    "colors": colors,
+                    "images": images_dir,
+                    "only_images": only_images,
+                    "retries": 0,
+                }
+            )
+        self.start(len(files))
+        results = {}
+
+        def finish(file: str, status: str, error: str = None) -> None:
+            if status != DONE:
+                log.error(f"ChimeraX could not process {file}: {error}")
+            results[file] = status
+            if on_done is not None:
+                on_done(file, status == DONE)
+
+        def work(index: int) -> None:
+            while True:
+                try:
+                    job = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                worker = self.workers[index]
+                message = worker.process_structure(job)
+                status = message["status"]
+                replaced = worker.alive()
+                if not replaced:
+                    # Replace the crashed worker to continue with the remaining structures
+                    try:
+                        with self.lock:
+                            self.workers[index] = self.new_worker()
+                        replaced = True
+                    except (OSError, ValueError) as e:
+                        log.error(f"Could not restart a ChimeraX worker: {e}")
+                if status in (TIMEOUT_EXPIRED, CRASHED) and job["retries"] < RETRIES:
+                    log.warning(
+                        f"ChimeraX {status} on {job['file']}: {message.get('error')} Retrying it."
+                    )
+                    job["retries"] += 1
+                    jobs.put(job)
+                else:
+                    finish(job["file"], status, message.get("error"))
+                if not replaced:
+                    # The other workers take over the remaining structures
+                    return
+
+        threads = [
+            threading.Thread(target=work, args=(i,), daemon=True)
+            for i in range(len(self.workers))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Structures which are left, if no worker could be restarted
+        while not jobs.empty():
+            finish(jobs.get_nowait()["file"], CRASHED, "No ChimeraX worker is running.")
+        return results
+
+    def close(self) -> None:
+        """Stops all workers."""
+        with self.lock:
+            for worker in self.workers:
+                worker.close()
+            self.workers = []
+
+
+def isolate_failures(run: callable, files: list[str]) -> list[str]:
+    """
+    Isolates the structures which crash ChimeraX or let it hang, if all structures are processed by a single ChimeraX process. After a failed run, the structures which were not reported as processed are retried in two halves, until each offender is run on its own.
+
+    Args:
+        run (callable): Runs ChimeraX on a list of files. Returns the set of files reported as processed and whether ChimeraX exited normally.
+        files (list[str]): Files to process.
+
+    Returns:
+        list[str]: Files on which ChimeraX failed when run on their own.
+    """
+    finished, success = run(files)
+    remaining = [file for file in files if file not in finished]
+    if success or len(remaining) == 0:
+        return []
+    if len(remaining) == 1:
+        log.error(f"ChimeraX failed on {remaining[0]}.")
+        return remaining
+    log.warning(
+        f"ChimeraX failed. Retrying the remaining {len(remaining)} structures in two halves."
+    )
+    middle = len(remaining) // 2
+    return isolate_failures(run, remaining[:middle]) + isolate_failures(
+        run, remaining[middle:]
+    )
@@ -96,7 +96,9 @@ class ProteinStructure:
 
     def set_file(self, file):
         ext = file.split(".")[-1]
-        if ext == "pdb":
+        if file.endswith(".pdb.gz"):
+            self.pdb_file = file
+        elif ext == "pdb":
             self.pdb_file = file
         elif ext == "glb":
             self.glb_file = file
@@ -185,3 +187,20 @@ class AlphaFoldVersion(Enum):
 class Database(Enum):
     AlphaFold = "alphafold"
     RCSB = "rcsb"
+
+
+class Engine(Enum):
+    chimerax = "chimerax"
+    native = "native"
+
+
+class FetchStatus(Enum):
+    fetched = "fetched"
+    not_modified = "not_modified"
+    not_found = "not_found"
+    failed = "failed"
+
+    @property
+    def success(self) -> bool:
+        """The structure is available locally after the fetch."""
+        return self in (FetchStatus.fetched, FetchStatus.not_modified)
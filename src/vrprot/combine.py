@@ -0,0 +1,274 @@
+# Stitching of the fractions of multi fraction structures.
+# AlphaFold DB splits long proteins into fractions, which overlap with their neighbors. Each fraction is superimposed onto its predecessor on the residues around the middle of their overlap and each residue is only kept from the fraction in which it is farthest from the ends. The result is a single continuous PDB file, which is processed like any other structure.
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .classes import Logger
+
+log = Logger("Combine")
+MIN_OVERLAP = 20  # Number of residues consecutive fractions have to share to be joined
+# Residues on each side of a seam, on which the fractions are superimposed
+SEAM_WINDOW = 50
+HY36_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def read_records(pdb_file: str) -> tuple[list[str], np.ndarray, dict[str, np.ndarray]]:
+    """
+    Reads the ATOM and HETATM records of the first model of a PDB file.
+
+    Args:
+        pdb_file (str): Path to the PDB file. Can be gzip compressed.
+
+    Returns:
+        tuple[list[str], np.ndarray, dict[str, np.ndarray]]: The records, the residue of each record and the residues with the fields name, ca (coordinates of the CA atom, NaN if missing) and bfactor.
+    """
+    opener = gzip.open if pdb_file.endswith(".gz") else open
+    records, record_residue = [], []
+    residues = {}
+    names, ca, bfactors = [], [], []
+    with opener(pdb_file, "rt") as f:
+        for line in f:
+            if line.startswith(("ATOM  ", "HETATM")):
+                key = (line[21], line[22:27])
+                if key not in residues:
+                    residues[key] = len(residues)
+                    names.append(line[17:20])
+                    ca.append((np.nan,) * 3)
+                    bfactors.append(float(line[60:66]))
+                if line[12:16].strip() == "CA":
+                    ca[residues[key]] = (
+                        float(line[30:38]),
+                        float(line[38:46]),
+                        float(line[46:54]),
+                    )
+                records.append(line.rstrip("\n"))
+                record_residue.append(residues[key])
+            elif line.startswith("ENDMDL"):
+                break
+    return (
+        records,
+        np.array(record_residue, dtype=np.int64),
+        {
+            "name": np.array(names),
+            "ca": np.array(ca, dtype=np.float64).reshape(-1, 3),
+            "bfactor": np.array(bfactors),
+        },
+    )
+
+
+def hy36_encode(value: int, width: int) -> str:
+    """Encodes a number in the hybrid-36 format of the PDB columns, so residue numbers above 9999 and atom serials above 99999 still fit."""
+    if value < 10**width:
+        return str(value).rjust(width)
+    value -= 10**width
+    block = 26 * 36 ** (width - 1)
+    digits = HY36_DIGITS
+    if value >= block:
+        value -= block
+        digits = digits.lower()
+    value += 10 * 36 ** (width - 1)
+    encoded = ""
+    for _ in range(width):
+        value, digit = divmod(value, 36)
+        encoded = digits[digit] + encoded
+    return encoded
+
+
+def overlap(previous: np.ndarray, current: np.ndarray) -> int or None:
+    """
+    Finds where a fraction starts within the previous fraction.
+
+    Args:
+        previous (np.ndarray): Residue names of the previous fraction.
+        current (np.ndarray): Residue names of the fraction.
+
+    Returns:
+        int or None: Index of the residue of previous at which current starts, such that the overlap is as long as possible. None if the fractions share less than MIN_OVERLAP residues.
+    """
+    first = max(1, len(previous) - len(current))
+    for start in range(first, len(previous) - MIN_OVERLAP + 1):
+        if np.array_equal(previous[start:], current[: len(previous) - start]):
+            return start
+    return None
+
+
+def offsets(sequences: list[np.ndarray]) -> np.ndarray:
+    """Returns the position of the first residue of each fraction in the full sequence. Fractions without an overlap are appended to their predecessor."""
+    starts = [0]
+    for previous, current in zip(sequences, sequences[1:]):
+        start = overlap(previous, current)
+        if start is None:
+            log.warning(
+                "Found no overlap between two fractions. Appending them instead."
+            )
+            start = len(previous)
+        starts.append(starts[-1] + start)
+    return np.array(starts)
+
+
+def owned_residues(starts: np.ndarray, lengths: list[int]) -> list[np.ndarray]:
+    """
+    Assigns each residue of the full sequence to the fraction, in which it is farthest from the ends of the fraction. Ties are assigned to the earlier fraction.
+
+    Returns:
+        list[np.ndarray]: For each fraction, whether each of its residues is kept.
+    """
+    total = max(start + length for start, length in zip(starts, lengths))
+    best = np.full(total, -1)
+    owner = np.full(total, -1)
+    for fraction, (start, length) in enumerate(zip(starts, lengths)):
+        local = np.arange(length)
+        centrality = np.minimum(local, length - 1 - local)
+        better = centrality > best[start + local]
+        best[start + local[better]] = centrality[better]
+        owner[start + local[better]] = fraction
+    return [
+        owner[start : start + length] == fraction
+        for fraction, (start, length) in enumerate(zip(starts, lengths))
+    ]
+
+
+def superimpose(
+    mobile: np.ndarray, target: np.ndarray, weights: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the rigid motion, which superimposes the mobile points onto the target points with the least weighted squared distance (Kabsch algorithm).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Rotation matrix and translation, which are applied as points @ rotation.T + translation.
+    """
+    weights = weights / weights.sum()
+    mobile_center = weights @ mobile
+    target_center = weights @ target
+    covariance = (mobile - mobile_center).T @ (
+        (target - target_center) * weights[:, None]
+    )
+    u, _, vt = np.linalg.svd(covariance)
+    # Prevents a reflection
+    d = np.sign(np.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ np.diag([1, 1, d]) @ u.T
+    return rotation, target_center - rotation @ mobile_center
+
+
+def seam_motion(
+    previous: dict[str, np.ndarray],
+    current: dict[str, np.ndarray],
+    shift: int,
+    seam: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Superimposes a fraction onto the (already placed) previous fraction on the residues within SEAM_WINDOW of their seam. The residues are weighted by their confidence (pLDDT), which AlphaFold stores in the B-factor column.
+
+    Args:
+        previous (dict[str, np.ndarray]): Residues of the previous fraction, see read_records.
+        current (dict[str, np.ndarray]): Residues of the fraction.
+        shift (int): Index of the residue of previous at which current starts.
+        seam (int): Index of the first residue of current which is kept from it.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Rotation and translation of the fraction, see superimpose.
+    """
+    local = np.arange(
+        max(0, seam - SEAM_WINDOW),
+        min(len(previous["ca"]) - shift, seam + SEAM_WINDOW),
+    )
+    target = previous["ca"][local + shift]
+    mobile = current["ca"][local]
+    valid = ~(np.isnan(target).any(axis=1) | np.isnan(mobile).any(axis=1))
+    if valid.sum() < 3:
+        log.warning("Too few shared CA atoms to superimpose two fractions.")
+        return np.eye(3), np.zeros(3)
+    weights = np.maximum(
+        np.minimum(previous["bfactor"][local + shift], current["bfactor"][local]), 1
+    )
+    return superimpose(mobile[valid], target[valid], weights[valid])
+
+
+def stitch_fractions(pdb_files: list[str], output: str) -> None:
+    """
+    Stitches the fractions of a structure into a single PDB file. The residues are numbered continuously, numbers above 9999 are written in the hybrid-36 format.
+
+    Args:
+        pdb_files (list[str]): PDB files of the fractions, sorted by fragment number.
+        output (str): Path of the stitched PDB file.
+    """
+    fractions = [read_records(pdb_file) for pdb_file in pdb_files]
+    residues = [fraction[2] for fraction in fractions]
+    starts = offsets([fraction["name"] for fraction in residues])
+    kept = owned_residues(starts, [len(fraction["name"]) for fraction in residues])
+
+    motions = [(np.eye(3), np.zeros(3))]
+    for k in range(1, len(fractions)):
+        rotation, translation = motions[-1]
+        previous = dict(residues[k - 1])
+        previous["ca"] = previous["ca"] @ rotation.T + translation
+        seam = np.argmax(kept[k]) if kept[k].any() else 0
+        motions.append(
+            seam_motion(previous, residues[k], starts[k] - starts[k - 1], seam)
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    serial = 0
+    with open(output + ".part", "w") as f:
+        for (records, record_residue, _), start, keep, (rotation, translation) in zip(
+            fractions, starts, kept, motions
+        ):
+            selected = np.flatnonzero(keep[record_residue])
+            coordinates = np.array(
+                [
+                    (
+                        float(records[i][30:38]),
+                        float(records[i][38:46]),
+                        float(records[i][46:54]),
+                    )
+                    for i in selected
+                ]
+            ).reshape(-1, 3)
+            coordinates = coordinates @ rotation.T + translation
+            for i, xyz in zip(selected, coordinates):
+                record = records[i]
+                serial += 1
+                f.write(
+                    record[:6]
+                    + hy36_encode(serial, 5)
+                    + record[11:22]
+                    + hy36_encode(start + record_residue[i] + 1, 4)
+                    + " "
+                    + record[27:30]
+                    + "%8.3f%8.3f%8.3f" % tuple(xyz)
+                    + record[54:]
+                    + "\n"
+                )
+        f.write("TER\nEND\n")
+    os.replace(output + ".part", output)
+
+
+def _stitch(job: dict) -> bool:
+    try:
+        stitch_fractions(**job)
+    except (OSError, ValueError) as e:
+        log.error(f"Could not stitch {os.path.basename(job['output'])}: {e}")
+        return False
+    log.debug(f"Stitched {len(job['pdb_files'])} fractions to {job['output']}")
+    return True
+
+
+def stitch_all(jobs: list[dict], processes: int = None) -> dict[str, bool]:
+    """
+    Stitches several structures in parallel, see stitch_fractions.
+
+    Args:
+        jobs (list[dict]): Keyword arguments of stitch_fractions for each structure.
+        processes (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict[str, bool]: Maps the output of each job to whether it was stitched.
+    """
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes <= 1:
+        return {job["output"]: _stitch(job) for job in jobs}
+    with ProcessPoolExecutor(processes) as executor:
+        return dict(zip([job["output"] for job in jobs], executor.map(_stitch, jobs)))
@@ -2,5 +2,9 @@ class StructureNotFoundError(Exception):
     pass
 
 
+class InvalidStructureError(Exception):
+    pass
+
+
 class ChimeraXException(Exception):
     pass
@@ -0,0 +1,223 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from . import util
+from .classes import AlphaFoldVersion, Database, FetchStatus, Logger
+
+log = Logger("Fetcher")
+MAX_CONNECTIONS = 8
+RATE_LIMIT = 10.0  # Requests per second and host
+COOLDOWN = 30.0  # Seconds a mirror is skipped after its first failure
+MAX_COOLDOWN = 600.0
+
+
+class TokenBucket:
+    """
+    Client side rate limiter. Allows rate requests per second on average and bursts of up to capacity requests.
+
+    Args:
+        rate (float): Requests per second. A rate <= 0 disables the limiter.
+        capacity (float): Maximal number of requests in a burst. Defaults to max(1, rate).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate or 0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a request is allowed."""
+        if self.rate is None or self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class Mirror:
+    """Base URL of a structure source and its health."""
+
+    base_url: str
+    failures: int = 0
+    disabled_until: float = 0.0
+
+    @property
+    def host(self) -> str:
+        return urlparse(self.base_url).netloc
+
+    def healthy(self) -> bool:
+        return time.time() >= self.disabled_until
+
+    def report(self, success: bool) -> None:
+        """Resets the mirror on success. Otherwise, the mirror is skipped for a cooldown that doubles with each consecutive failure."""
+        if success:
+            self.failures = 0
+            self.disabled_until = 0.0
+            return
+        self.failures += 1
+        cooldown = min(COOLDOWN * 2 ** (self.failures - 1), MAX_COOLDOWN)
+        self.disabled_until = time.time() + cooldown
+        log.warning(
+            f"Mirror {self.base_url} failed {self.failures} times. Skipping it for {cooldown:.0f}s."
+        )
+
+
+class MirrorSet:
+    """
+    Ordered list of base URLs (e.g. local mirrors followed by the public server) from which structures are fetched. Each request goes to the first healthy mirror. If a mirror fails or does not have the structure, the next one is tried. Requests to each host are throttled by a TokenBucket.
+
+    Args:
+        base_urls (list[str]): Base URLs in the order in which they are tried.
+        rate_limit (float): Maximal requests per second for each host. A rate_limit <= 0 disables throttling. Defaults to 10.
+    """
+
+    def __init__(self, base_urls: list[str], rate_limit: float = RATE_LIMIT):
+        self.mirrors = [
+            Mirror(url if url.endswith("/") else url + "/") for url in base_urls
+        ]
+        self.buckets = {mirror.host: TokenBucket(rate_limit) for mirror in self.mirrors}
+        self.lock = threading.Lock()
+
+    def candidates(self) -> list[Mirror]:
+        """Healthy mirrors in their configured order, followed by the unhealthy ones which recover first."""
+        with self.lock:
+            healthy = [mirror for mirror in self.mirrors if mirror.healthy()]
+            unhealthy = [mirror for mirror in self.mirrors if not mirror.healthy()]
+        return healthy + sorted(unhealthy, key=lambda mirror: mirror.disabled_until)
+
+    def fetch(self, fetch: callable, protein: str) -> FetchStatus:
+        """
+        Fetches a structure from the first mirror that has it.
+
+        Args:
+            fetch (callable): Fetch function which accepts the protein and a base_url keyword argument.
+            protein (str): Structure to fetch.
+
+        Returns:
+            FetchStatus: The status of the successful fetch. not_found only if no mirror failed and none had the structure, otherwise failed.
+        """
+        statuses = []
+        for mirror in self.candidates():
+            self.buckets[mirror.host].acquire()
+            status = fetch(protein, base_url=mirror.base_url)
+            with self.lock:
+                mirror.report(status != FetchStatus.failed)
+            if status.success:
+                return status
+            statuses.append(status)
+        if FetchStatus.failed in statuses:
+            return FetchStatus.failed
+        return FetchStatus.not_found
+
+
+async def _fetch_one(
+    executor: ThreadPoolExecutor,
+    semaphore: asyncio.Semaphore,
+    fetch: callable,
+    protein: str,
+) -> tuple[str, FetchStatus]:
+    """Runs a single blocking fetch in the executor as soon as the semaphore allows it."""
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        status = await loop.run_in_executor(executor, fetch, protein)
+    return protein, status
+
+
+async def _fetch_all(
+    fetch: callable, proteins: list[str], max_connections: int
+) -> dict[str, FetchStatus]:
+    """Schedules all fetches at once. At most max_connections requests are in flight at the same time."""
+    semaphore = asyncio.Semaphore(max_connections)
+    with ThreadPoolExecutor(max_workers=max_connections) as executor:
+        tasks = [
+            _fetch_one(executor, semaphore, fetch, protein) for protein in proteins
+        ]
+        results = await asyncio.gather(*tasks)
+    return dict(results)
+
+
+def default_url(db: str) -> str:
+    """Returns the base URL of the public server of the database."""
+    if db == Database.AlphaFold.value:
+        return util.ALPHAFOLD_URL
+    elif db == Database.RCSB.value:
+        return util.RCSB_URL
+    raise ValueError(f"Unknown database: {db}")
+
+
+def fetch_structures(
+    proteins: list[str],
+    save_location: str,
+    db: str = Database.AlphaFold.value,
+    db_version: str = AlphaFoldVersion.v1.value,
+    max_connections: int = MAX_CONNECTIONS,
+    base_url: str = None,
+    compress: bool = False,
+    revalidate: bool = False,
+    mirrors: MirrorSet = None,
+) -> dict[str, FetchStatus]:
+    """
+    Fetches the .pdb files of all proteins concurrently. The downloads are scheduled on an asyncio event loop, each download is executed by util.fetch_pdb in a worker thread.
+
+    Args:
+        proteins (list[str]): UniProtIDs (or PDB IDs for RCSB) of the structures to fetch.
+        save_location (str): Path to the directory where the .pdb files should be saved.
+        db (str): Database to fetch from. Either "alphafold" or "rcsb". Defaults to "alphafold".
+        db_version (str): Version of the AlphaFold database. Defaults to "v1".
+        max_connections (int): Maximal number of concurrent requests. Defaults to 8.
+        base_url (str): Base URL of the server to fetch from. Defaults to the URL of the corresponding database. Can be used to fetch from a mirror or a local server.
+        compress (bool): If True, the structures are stored gzip compressed as .pdb.gz. Defaults to False.
+        revalidate (bool): If True, already fetched structures are revalidated with conditional requests instead of being downloaded again. Defaults to False.
+        mirrors (MirrorSet): Mirrors to fetch from. Pass the same MirrorSet to consecutive calls to keep the health of the mirrors and the rate limits. Overrides base_url. Defaults to a MirrorSet containing only base_url.
+
+    Returns:
+        dict[str, FetchStatus]: Maps each protein to the result of its fetch.
+    """
+    proteins = list(proteins)
+    if len(proteins) == 0:
+        return {}
+    if db == Database.AlphaFold.value:
+        fetch = functools.partial(
+            util.fetch_pdb_from_alphafold,
+            save_location=save_location,
+            db_version=db_version,
+            compress=compress,
+            revalidate=revalidate,
+        )
+    elif db == Database.RCSB.value:
+        fetch = functools.partial(
+            util.fetch_pdb_from_rcsb,
+            save_location=save_location,
+            compress=compress,
+            revalidate=revalidate,
+        )
+    else:
+        raise ValueError(f"Unknown database: {db}")
+    if mirrors is None:
+        mirrors = MirrorSet([base_url or default_url(db)])
+    max_connections = max(1, max_connections)
+    # Size the connection pool so that every concurrent request can reuse a connection
+    util.get_session(max_connections)
+    log.debug(
+        f"Fetching {len(proteins)} structures from {db} with {max_connections} concurrent connections."
+    )
+    return asyncio.run(
+        _fetch_all(functools.partial(mirrors.fetch, fetch), proteins, max_connections)
+    )
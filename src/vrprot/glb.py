@@ -0,0 +1,273 @@
+# Lean reader for binary glTF (GLB) files.
+# The file is memory-mapped and the vertex attributes are read as NumPy views on its binary chunk, instead of building a trimesh scene, which copies and concatenates all buffers. Only the results are copied out of the memory map, which is closed afterwards. Only the features used by the exported meshes of ChimeraX and the native engine are supported. Other files raise a ValueError, so the caller can fall back to trimesh.
+import json
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b"glTF"
+JSON_CHUNK = 0x4E4F534A
+BIN_CHUNK = 0x004E4942
+TRIANGLES = 4
+COMPONENT_TYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+COMPONENTS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT4": 16}
+# Color of meshes without colors, like in trimesh
+DEFAULT_COLOR = (102, 102, 102, 255)
+
+
+def read_chunks(buffer: mmap.mmap) -> tuple[dict, memoryview]:
+    """
+    Splits a GLB file into its JSON and its binary chunk.
+
+    Returns:
+        tuple[dict, memoryview]: The parsed JSON chunk and the binary chunk.
+    """
+    magic, version, length = struct.unpack_from("<4sII", buffer, 0)
+    if magic != MAGIC or version != 2:
+        raise ValueError("Not a glTF 2.0 binary file.")
+    document, binary = None, None
+    offset = 12
+    while offset + 8 <= min(length, len(buffer)):
+        chunk_length, chunk_type = struct.unpack_from("<II", buffer, offset)
+        start = offset + 8
+        if chunk_type == JSON_CHUNK:
+            document = json.loads(bytes(buffer[start : start + chunk_length]))
+        elif chunk_type == BIN_CHUNK and binary is None:
+            binary = memoryview(buffer)[start : start + chunk_length]
+        offset = start + chunk_length
+    if document is None:
+        raise ValueError("The file has no JSON chunk.")
+    return document, binary
+
+
+def accessor(document: dict, binary: memoryview, index: int) -> np.ndarray:
+    """
+    Returns the data of an accessor as a view on the binary chunk. Interleaved buffer views result in strided views.
+
+    Returns:
+        np.ndarray: Array of shape (count, components), or (count,) for scalars.
+    """
+    info = document["accessors"][index]
+    if "sparse" in info or "bufferView" not in info:
+        raise ValueError("Sparse accessors are not supported.")
+    view = document["bufferViews"][info["bufferView"]]
+    if view.get("buffer", 0) != 0 or binary is None:
+        raise ValueError("Only the binary chunk is supported as buffer.")
+    dtype = np.dtype(COMPONENT_TYPES[info["componentType"]])
+    components = COMPONENTS[info["type"]]
+    count = info["count"]
+    offset = view.get("byteOffset", 0) + info.get("byteOffset", 0)
+    stride = view.get("byteStride", dtype.itemsize * components)
+    data = np.ndarray(
+        shape=(count, components),
+        dtype=dtype,
+        buffer=binary,
+        offset=offset,
+        strides=(stride, dtype.itemsize),
+    )
+    return data[:, 0] if components == 1 else data
+
+
+def node_matrix(node: dict) -> np.ndarray:
+    """Returns the local transformation of a node, which is given as matrix or as translation, rotation (quaternion) and scale."""
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", (0, 0, 0, 1))
+    rotation = np.array(
+        [
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+        ]
+    )
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.array(node.get("scale", (1, 1, 1)))
+    matrix[:3, 3] = node.get("translation", (0, 0, 0))
+    return matrix
+
+
+def mesh_instances(document: dict) -> list[tuple[int, np.ndarray]]:
+    """Returns the mesh and the world transformation of each node of the default scene, which references a mesh."""
+    nodes = document.get("nodes", [])
+    scenes = document.get("scenes", [])
+    if len(scenes) > 0:
+        roots = scenes[document.get("scene", 0)].get("nodes", [])
+    else:
+        roots = range(len(nodes))
+    instances = []
+    stack = [(root, np.eye(4)) for root in roots]
+    while len(stack) > 0:
+        index, parent = stack.pop()
+        node = nodes[index]
+        matrix = parent @ node_matrix(node)
+        if "mesh" in node:
+            instances.append((node["mesh"], matrix))
+        stack.extend((child, matrix) for child in node.get("children", []))
+    return instances
+
+
+def colors_of(
+    document: dict, binary: memoryview, primitive: dict, count: int
+) -> np.ndarray:
+    """Returns the RGBA color of each vertex of a primitive as uint8. Without vertex colors, the base color of the material is used."""
+    attributes = primitive["attributes"]
+    if "COLOR_0" in attributes:
+        colors = accessor(document, binary, attributes["COLOR_0"])
+        if colors.dtype != np.uint8:
+            scale = 1 if colors.dtype == np.float32 else np.iinfo(colors.dtype).max
+            colors = np.rint(colors * (255 / scale)).astype(np.uint8)
+        if colors.shape[1] == 3:
+            colors = np.hstack([colors, np.full((count, 1), 255, dtype=np.uint8)])
+        return colors
+    color = DEFAULT_COLOR
+    if "material" in primitive:
+        material = document["materials"][primitive["material"]]
+        factor = material.get("pbrMetallicRoughness", {}).get("baseColorFactor")
+        if factor is not None:
+            color = np.rint(np.array(factor) * 255)
+    return np.broadcast_to(np.array(color, dtype=np.uint8), (count, 4))
+
+
+def read_meshes(
+    buffer: mmap.mmap,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Reads the triangles of all meshes of a memory-mapped GLB file. Each primitive is transformed and written into the merged arrays at once. A single mesh without transformation is copied out of the memory map as it is.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Vertices, triangles, RGBA colors (uint8) and normals of the vertices. The normals are None, if a primitive has none.
+    """
+    document, binary = read_chunks(buffer)
+    parts = []
+    for mesh, matrix in mesh_instances(document):
+        for primitive in document["meshes"][mesh]["primitives"]:
+            if primitive.get("mode", TRIANGLES) != TRIANGLES:
+                continue
+            if "extensions" in primitive:
+                raise ValueError("Compressed meshes are not supported.")
+            attributes = primitive["attributes"]
+            positions = accessor(document, binary, attributes["POSITION"])
+            if "indices" in primitive:
+                indices = accessor(document, binary, primitive["indices"])
+            else:
+                indices = np.arange(len(positions), dtype=np.uint32)
+            normals = None
+            if "NORMAL" in attributes:
+                normals = accessor(document, binary, attributes["NORMAL"])
+            colors = colors_of(document, binary, primitive, len(positions))
+            parts.append((matrix, positions, indices.reshape(-1, 3), colors, normals))
+    if len(parts) == 0:
+        raise ValueError("The file contains no triangles.")
+
+    if len(parts) == 1 and np.array_equal(parts[0][0], np.eye(4)):
+        _, vertices, triangles, colors, normals = parts[0]
+        return (
+            np.array(vertices, dtype=np.float32),
+            np.array(triangles, dtype=np.uint32),
+            np.array(colors),
+            None if normals is None else np.array(normals, dtype=np.float32),
+        )
+
+    vertex_count = sum(len(part[1]) for part in parts)
+    vertices = np.empty((vertex_count, 3), dtype=np.float32)
+    triangles = np.empty((sum(len(part[2]) for part in parts), 3), dtype=np.uint32)
+    colors = np.empty((vertex_count, 4), dtype=np.uint8)
+    normals = None
+    if all(part[4] is not None for part in parts):
+        normals = np.empty((vertex_count, 3), dtype=np.float32)
+    vertex_offset, triangle_offset = 0, 0
+    for matrix, positions, indices, part_colors, part_normals in parts:
+        rows = slice(vertex_offset, vertex_offset + len(positions))
+        np.matmul(positions, matrix[:3, :3].T.astype(np.float32), out=vertices[rows])
+        vertices[rows] += matrix[:3, 3].astype(np.float32)
+        np.add(
+            indices,
+            vertex_offset,
+            out=triangles[triangle_offset : triangle_offset + len(indices)],
+            casting="unsafe",
+        )
+        colors[rows] = part_colors
+        if normals is not None:
+            # Normals are transformed with the inverse transpose, which equals the rotation for rigid transformations
+            normal_matrix = np.linalg.inv(matrix[:3, :3]).T.astype(np.float32)
+            np.matmul(part_normals, normal_matrix.T, out=normals[rows])
+            lengths = np.linalg.norm(normals[rows], axis=1, keepdims=True)
+            np.divide(normals[rows], lengths, out=normals[rows], where=lengths > 0)
+        vertex_offset += len(positions)
+        triangle_offset += len(indices)
+    return vertices, triangles, colors, normals
+
+
+def merge_vertices(
+    vertices: np.ndarray,
+    triangles: np.ndarray,
+    colors: np.ndarray,
+    normals: np.ndarray = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merges vertices with the same position and color, like trimesh does when it processes a mesh. Merged vertices keep the normal of their first occurrence.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The arrays without duplicate vertices. They are returned unchanged, if there are none.
+    """
+    # Position and color of each vertex as two 64 bit keys
+    keys = np.empty((len(vertices), 16), dtype=np.uint8)
+    keys[:, :12] = np.ascontiguousarray(vertices, dtype=np.float32).view(np.uint8)
+    keys[:, 12:] = colors
+    keys = keys.view(np.uint64)
+    # The sort is stable, so each group of duplicates starts with its first occurrence
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    ordered = keys[order]
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    if np.all(starts):
+        return vertices, triangles, colors, normals
+    group = np.cumsum(starts) - 1
+    first = order[starts]
+    # Keep the order of the vertices
+    rank = np.empty(len(first), dtype=np.uint32)
+    rank[np.argsort(first)] = np.arange(len(first), dtype=np.uint32)
+    remap = np.empty(len(order), dtype=np.uint32)
+    remap[order] = rank[group]
+    kept = np.sort(first)
+    return (
+        vertices[kept],
+        remap[triangles],
+        colors[kept],
+        None if normals is None else normals[kept],
+    )
+
+
+def read_glb(glb_file: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Reads the triangles of all meshes of a GLB file, see read_meshes, and merges duplicate vertices, see merge_vertices.
+
+    Args:
+        glb_file (str): Path to the GLB file.
+
+    Raises:
+        ValueError: If the file is truncated or uses features which are not supported.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Vertices, triangles, RGBA colors (uint8) and normals of the vertices. The normals are None, if a primitive has none.
+    """
+    error = None
+    with open(glb_file, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        try:
+            arrays = read_meshes(buffer)
+        except (ValueError, KeyError, IndexError, TypeError, struct.error) as e:
+            # Raised once the traceback, which references the views on the memory map, is released, so the map can be closed
+            error = ValueError(f"{type(e).__name__}: {e}")
+    if error is not None:
+        raise error
+    return merge_vertices(*arrays)
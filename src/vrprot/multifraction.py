@@ -0,0 +1,84 @@
+# Grouping of the fractions of AlphaFold DB structures.
+# This module only depends on the standard library, as it is also imported by the scripts which run inside ChimeraX (see scripts/combine_structures.py).
+import os
+import re
+
+FRACTION_PATTERN = re.compile(r"AF-(\w+)-F(\d+)-model_(v\d+)\.pdb(\.gz)?$")
+# Any file derived from a structure, e.g. mf_AF-<UniProtID>-F1-model_v4.glb or AF-<UniProtID>-F1-model_v4.residues.npz
+STRUCTURE_PATTERN = re.compile(r"(?:mf_)?AF-(\w+)-F\d+-model_(v\d+)(?:[._]|$)")
+
+
+def parse_fraction(file_name: str) -> tuple[str, int, str] or None:
+    """
+    Parses the file name of a fraction of an AlphaFold DB structure.
+
+    Args:
+        file_name (str): File name like AF-<UniProtID>-F<n>-model_v<k>.pdb(.gz).
+
+    Returns:
+        tuple[str, int, str] or None: UniProtID, fragment number and version or None if the name does not match.
+    """
+    match = FRACTION_PATTERN.match(os.path.basename(file_name))
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2)), match.group(3)
+
+
+def parse_structure(file_name: str) -> tuple[str, str] or None:
+    """
+    Parses the file name of any file of an AlphaFold DB structure, like its PDB, GLB or PLY file, its maps or their residue indices.
+
+    Args:
+        file_name (str): File name or path like [mf_]AF-<UniProtID>-F<n>-model_v<k>.<extension>.
+
+    Returns:
+        tuple[str, str] or None: UniProtID and version or None if the name does not match.
+    """
+    match = STRUCTURE_PATTERN.match(os.path.basename(file_name))
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+def group_fractions(directory: str, proteins: list[str] = None) -> dict:
+    """
+    Groups the PDB files of a directory by their UniProtID in a single pass over the directory.
+
+    Args:
+        directory (str): Directory containing AF-<UniProtID>-F<n>-model_v<k>.pdb(.gz) files.
+        proteins (list[str]): If given, only these structures are considered. Defaults to None.
+
+    Returns:
+        dict[str, dict[int, str]]: Maps each UniProtID to its fragment numbers and the paths of the corresponding files.
+    """
+    if proteins is not None:
+        proteins = set(proteins)
+    groups = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            parsed = parse_fraction(entry.name)
+            if parsed is None:
+                continue
+            protein, fragment, _ = parsed
+            if proteins is not None and protein not in proteins:
+                continue
+            groups.setdefault(protein, {})[fragment] = entry.path
+    return groups
+
+
+def multi_fractions(directory: str, proteins: list[str] = None) -> dict:
+    """
+    Collects the structures of a directory which consist of more than one fraction.
+
+    Args:
+        directory (str): Directory containing AF-<UniProtID>-F<n>-model_v<k>.pdb(.gz) files.
+        proteins (list[str]): If given, only these structures are considered. Defaults to None.
+
+    Returns:
+        dict[str, list[str]]: Maps each multi fraction structure to the paths of its fractions, sorted by fragment number.
+    """
+    return {
+        protein: [fractions[fragment] for fragment in sorted(fractions)]
+        for protein, fractions in group_fractions(directory, proteins).items()
+        if len(fractions) > 1
+    }
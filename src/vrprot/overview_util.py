@@ -1,4 +1,6 @@
+import json
 import os
+import time
 
 import pandas as pd
 
@@ -15,6 +17,11 @@ for mode in ColoringModes.__dict__.values():
             COLUMNS.append(mode)
 UNIPROT_ID = "uniprot_id"
 MULTI_STRUCTURE = "multi_structure"
+NOT_FETCHED_FILE = "not_fetched.json"
+NOT_FETCHED_TTL = (
+    7 * 24 * 60 * 60
+)  # Seconds until a missing structure is requested again
+QUARANTINE_FILE = "quarantine.json"
 
 
 def init_overview(columns=None) -> pd.DataFrame:
@@ -126,6 +133,133 @@ def get_all_multifractions(overview: str) -> list[str]:
     return list(overview[overview["multi_structure"] == True].index)
 
 
+def not_fetched_file(overview=None) -> str:
+    """Returns the path of the file in which the structures that are not available are stored. The file is located next to the overview file."""
+    if overview is None:
+        overview = DEFAULT_OVERVIEW_FILE
+    return os.path.join(os.path.dirname(overview), NOT_FETCHED_FILE)
+
+
+def read_not_fetched(overview=None) -> dict[str, dict[str, float]]:
+    """
+    Reads the structures that could not be fetched.
+
+    Returns:
+        dict[str, dict[str, float]]: Maps each source (database and version) to the structures which are not available and the time they were requested the last time.
+    """
+    file = not_fetched_file(overview)
+    if not os.path.isfile(file):
+        return {}
+    try:
+        with open(file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_not_fetched(source: str, overview=None, ttl=NOT_FETCHED_TTL) -> set[str]:
+    """Returns all structures of the source that were not available within the last ttl seconds."""
+    not_fetched = read_not_fetched(overview).get(source, {})
+    now = time.time()
+    return {protein for protein, t in not_fetched.items() if now - t < ttl}
+
+
+def update_not_fetched(
+    source: str,
+    missing: set[str],
+    found: set[str] = None,
+    overview=None,
+    ttl=NOT_FETCHED_TTL,
+) -> None:
+    """
+    Adds the missing structures of the source to the not fetched file and removes the ones that were found.
+    Entries that are older than ttl seconds are not kept.
+    """
+    if found is None:
+        found = set()
+    if len(missing) == 0 and len(found) == 0:
+        return
+    all_not_fetched = read_not_fetched(overview)
+    now = time.time()
+    not_fetched = {
+        protein: t
+        for protein, t in all_not_fetched.get(source, {}).items()
+        if now - t < ttl and protein not in found
+    }
+    for protein in missing:
+        not_fetched[protein] = now
+    all_not_fetched[source] = not_fetched
+    file = not_fetched_file(overview)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file + ".part", "w") as f:
+        json.dump(all_not_fetched, f)
+    os.replace(file + ".part", file)
+
+
+def clear_not_fetched(overview=None) -> None:
+    """Removes the not fetched file."""
+    file = not_fetched_file(overview)
+    if os.path.isfile(file):
+        os.remove(file)
+
+
+def quarantine_file(overview=None) -> str:
+    """Returns the path of the file which stores the structures on which ChimeraX failed. It is stored next to the overview file."""
+    if overview is None:
+        overview = DEFAULT_OVERVIEW_FILE
+    return os.path.join(os.path.dirname(overview), QUARANTINE_FILE)
+
+
+def read_quarantine(overview=None) -> dict[str, dict[str, str]]:
+    """
+    Reads the quarantined structures.
+
+    Returns:
+        dict[str, dict[str, str]]: Maps each processing mode to the structures on which ChimeraX failed in this mode and the reason why it failed.
+    """
+    file = quarantine_file(overview)
+    if not os.path.isfile(file):
+        return {}
+    try:
+        with open(file, "r") as f:
+            quarantined = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Files of older versions map the structures directly to the reasons
+    return {
+        processing: structures
+        for processing, structures in quarantined.items()
+        if isinstance(structures, dict)
+    }
+
+
+def get_quarantined(processing: str, overview=None) -> dict[str, str]:
+    """Returns the structures on which ChimeraX failed in the processing mode and the reason why it failed."""
+    return read_quarantine(overview).get(processing, {})
+
+
+def update_quarantine(
+    processing: str, quarantined: dict[str, str], overview=None
+) -> None:
+    """Adds the structures to the quarantine of the processing mode. quarantined maps each structure to the reason why ChimeraX failed on it."""
+    if len(quarantined) == 0:
+        return
+    all_quarantined = read_quarantine(overview)
+    all_quarantined.setdefault(processing, {}).update(quarantined)
+    file = quarantine_file(overview)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file + ".part", "w") as f:
+        json.dump(all_quarantined, f)
+    os.replace(file + ".part", file)
+
+
+def clear_quarantine(overview=None) -> None:
+    """Removes the quarantine file, so all quarantined structures are processed again."""
+    file = quarantine_file(overview)
+    if os.path.isfile(file):
+        os.remove(file)
+
+
 def main(proteins: list[ProteinStructure], mode: str):
     overview = get_overview()
     for protein in proteins:
@@ -0,0 +1,560 @@
+# Recoloring of already rendered structures without ChimeraX.
+# Within one display mode (e.g. all cartoons_* modes) the geometry is identical and only the colors differ. Thus, each vertex of a mesh is mapped to its residue once (see write_residue_index) and the colors of other coloring modes are computed from the fields of the PDB file.
+# The sampled points keep the residue of their vertex (see write_point_index), so even the color maps can be recolored without sampling again.
+import gzip
+import os
+
+import numpy as np
+import trimesh
+from PIL import Image, ImageColor
+
+from .classes import Logger
+
+log = Logger("Recolor")
+RESIDUE_INDEX_EXT = ".residues.npz"  # Sidecar next to a mesh, see write_residue_index
+POINT_INDEX_DIR = "residues"  # Directory of the point indices next to the rgb maps, see point_index_file
+# Coloring schemes, which are computed without ChimeraX
+SCHEMES = ("ss", "rainbow", "bFactor", "chain")
+COIL, HELIX, STRAND = 0, 1, 2
+DEFAULT_SS_COLORS = ["red", "green", "blue"]
+RAINBOW = ["blue", "cyan", "lime", "yellow", "red"]
+BFACTOR = ["blue", "white", "red"]
+CHAIN_COLORS = ["tan", "skyblue", "plum", "lightgreen", "salmon", "lightgray", "gold"]
+CHUNK_ELEMENTS = (
+    256 * 1024
+)  # Number of distances computed at once, small enough to stay in the CPU cache
+MAX_DISTANCE = 15  # Mean distance (Å) of the vertices to their atoms above which mesh and PDB file do not match
+# P-SEA criteria (Labesse et al., 1997) of helices and strands as (mean, tolerance), see secondary_structure: the distances (Å) of the CA atom i-1 to i+1, i+2 and i+3, the CA angle at i and the CA dihedral of i-1 to i+2 (degrees)
+HELIX_CRITERIA = {
+    "d2": (5.5, 0.5),
+    "d3": (5.3, 0.5),
+    "d4": (6.4, 0.6),
+    "angle": (89, 12),
+    "dihedral": (50, 20),
+}
+STRAND_CRITERIA = {
+    "d2": (6.7, 0.6),
+    "d3": (9.9, 0.9),
+    "d4": (12.4, 1.1),
+    "angle": (124, 14),
+    "dihedral": (-170, 45),
+}
+MIN_HELIX = 5  # Minimal number of residues of a helix
+MIN_STRAND = 3  # Minimal number of residues of a strand
+STRAND_CONTACT = (4.2, 5.2)  # Distances (Å) of the CA atoms of paired strands
+
+
+def hy36_decode(field: str) -> int:
+    """Decodes a number of a PDB column, which may be in the hybrid-36 format, see combine.hy36_encode."""
+    field = field.strip()
+    try:
+        return int(field)
+    except ValueError:
+        pass
+    width = len(field)
+    value = int(field, 36) - 10 * 36 ** (width - 1) + 10**width
+    if field[0].islower():
+        value += 26 * 36 ** (width - 1)
+    return value
+
+
+def read_pdb(
+    pdb_file: str,
+) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray], dict[str, np.ndarray]]:
+    """
+    Reads the atoms and residues of the first model of a PDB file.
+
+    Args:
+        pdb_file (str): Path to the PDB file. Can be gzip compressed.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, dict[str, np.ndarray], dict[str, np.ndarray]]: Coordinates of the atoms, index of the residue of each atom, the residues with the fields chain, number, bfactor and ss and the atoms with the fields element, name and residue (name).
+    """
+    opener = gzip.open if pdb_file.endswith(".gz") else open
+    coords, atom_residue, elements, names, residue_names = [], [], [], [], []
+    chains, numbers, bfactors, ca = [], [], [], []
+    helices, sheets = [], []
+    residues = {}
+    with opener(pdb_file, "rt") as f:
+        for line in f:
+            record = line[:6]
+            if record in ("ATOM  ", "HETATM"):
+                key = (line[21], hy36_decode(line[22:26]), line[26])
+                if key not in residues:
+                    residues[key] = len(residues)
+                    chains.append(line[21])
+                    numbers.append(key[1])
+                    bfactors.append(float(line[60:66]))
+                    ca.append(None)
+                xyz = (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+                coords.append(xyz)
+                atom_residue.append(residues[key])
+                # Old files lack the element column, then the atom name starts with it
+                elements.append(line[76:78].strip() or line[12:16].strip()[:1])
+                names.append(line[12:16].strip())
+                residue_names.append(line[17:20].strip())
+                if line[12:16].strip() == "CA":
+                    ca[residues[key]] = xyz
+            elif record == "HELIX ":
+                helices.append((line[19], int(line[21:25]), int(line[33:37])))
+            elif record == "SHEET ":
+                sheets.append((line[21], int(line[22:26]), int(line[33:37])))
+            elif record == "ENDMDL":
+                break
+    table = {
+        "chain": np.array(chains),
+        "number": np.array(numbers, dtype=np.int32),
+        "bfactor": np.array(bfactors, dtype=np.float32),
+    }
+    if len(helices) > 0 or len(sheets) > 0:
+        ss = np.full(len(residues), COIL, dtype=np.int8)
+        for segments, value in ((helices, HELIX), (sheets, STRAND)):
+            for chain, start, end in segments:
+                ss[
+                    (table["chain"] == chain)
+                    & (table["number"] >= start)
+                    & (table["number"] <= end)
+                ] = value
+    else:
+        ss = secondary_structure(ca, table["chain"], table["number"])
+    table["ss"] = ss
+    return (
+        np.array(coords, dtype=np.float32).reshape(-1, 3),
+        np.array(atom_residue, dtype=np.int32),
+        table,
+        {
+            "element": np.array(elements),
+            "name": np.array(names),
+            "residue": np.array(residue_names),
+        },
+    )
+
+
+def ca_geometry(
+    ca: list, chains: np.ndarray, numbers: np.ndarray
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Computes the P-SEA measures of each residue i from the CA atoms of the residues i-1 to i+3, see HELIX_CRITERIA. Measures of residues, whose neighbors are missing or belong to another chain, are NaN.
+
+    Args:
+        ca (list): CA coordinates of each residue or None, if a residue has no CA atom.
+        chains (np.ndarray): Chain of each residue.
+        numbers (np.ndarray): Residue number of each residue.
+
+    Returns:
+        tuple[np.ndarray, dict[str, np.ndarray]]: The CA coordinates (NaN for missing atoms) and the measures d2, d3, d4, angle and dihedral.
+    """
+    count = len(ca)
+    coords = np.array(
+        [c if c is not None else (np.nan,) * 3 for c in ca], dtype=np.float64
+    ).reshape(-1, 3)
+    # Coordinates of the residues i-1 to i+3, NaN where the chain is interrupted
+    neighbors = np.full((5, count, 3), np.nan)
+    for k, shift in enumerate(range(-1, 4)):
+        rows = np.arange(max(0, -shift), min(count, count - shift))
+        connected = (chains[rows + shift] == chains[rows]) & (
+            numbers[rows + shift] - numbers[rows] == shift
+        )
+        neighbors[k, rows[connected]] = coords[rows[connected] + shift]
+    before, at, after, second, third = neighbors
+    first, last = before - at, after - at
+    cosine = np.sum(first * last, axis=1) / (
+        np.linalg.norm(first, axis=1) * np.linalg.norm(last, axis=1)
+    )
+    b1, b2, b3 = at - before, after - at, second - after
+    n1, n2 = np.cross(b1, b2), np.cross(b2, b3)
+    measures = {
+        "d2": np.linalg.norm(after - before, axis=1),
+        "d3": np.linalg.norm(second - before, axis=1),
+        "d4": np.linalg.norm(third - before, axis=1),
+        "angle": np.degrees(np.arccos(np.clip(cosine, -1, 1))),
+        "dihedral": np.degrees(
+            np.arctan2(
+                np.linalg.norm(b2, axis=1) * np.sum(b1 * n2, axis=1),
+                np.sum(n1 * n2, axis=1),
+            )
+        ),
+    }
+    return coords, measures
+
+
+def matches(measures: dict[str, np.ndarray], criteria: dict, *names: str) -> np.ndarray:
+    """Returns which residues meet all given criteria. Angles are compared on the circle. NaN measures never match."""
+    match = np.ones(len(measures[names[0]]), dtype=bool)
+    for name in names:
+        mean, tolerance = criteria[name]
+        difference = measures[name] - mean
+        if name == "dihedral":
+            difference = (difference + 180) % 360 - 180
+        with np.errstate(invalid="ignore"):
+            match &= np.abs(difference) <= tolerance
+    return match
+
+
+def runs(mask: np.ndarray, length: int) -> list[tuple[int, int]]:
+    """Returns the start and the (exclusive) end of each run of at least length consecutive True values."""
+    changes = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return [
+        (start, end)
+        for start, end in zip(changes[0::2], changes[1::2])
+        if end - start >= length
+    ]
+
+
+def extend(ss: np.ndarray, segment: tuple[int, int], relaxed: np.ndarray, value: int):
+    """Assigns a segment and extends it by one residue at each end, which meets the relaxed criteria and has no secondary structure yet."""
+    start, end = segment
+    ss[start:end] = value
+    for index in (start - 1, end):
+        if 0 <= index < len(ss) and relaxed[index] and ss[index] == COIL:
+            ss[index] = value
+
+
+def paired(coords: np.ndarray, candidates: np.ndarray, segment: tuple[int, int]):
+    """Returns True if a CA atom of the segment has the distance of paired strands to a CA atom of another strand candidate, which is at least three residues away."""
+    start, end = segment
+    others = candidates[(candidates < start - 2) | (candidates >= end + 2)]
+    if len(others) == 0:
+        return False
+    distances = np.linalg.norm(coords[start:end, None] - coords[None, others], axis=2)
+    return bool(
+        np.any((distances >= STRAND_CONTACT[0]) & (distances <= STRAND_CONTACT[1]))
+    )
+
+
+def secondary_structure(
+    ca: list, chains: np.ndarray, numbers: np.ndarray
+) -> np.ndarray:
+    """
+    Assigns the secondary structure of residues from their CA atoms with P-SEA, as AlphaFold DB PDB files contain no HELIX and SHEET records. Helices are runs of at least MIN_HELIX residues, which meet the distance criteria or the angle and dihedral criteria of HELIX_CRITERIA. Strands are runs of at least MIN_STRAND residues, which meet the ones of STRAND_CRITERIA and are paired with another strand. Both are extended by one residue at each end, which meets the CA angle or the d3 criterion. Helices take precedence over strands. This is an approximation of the DSSP assignment of ChimeraX.
+
+    Args:
+        ca (list): CA coordinates of each residue or None, if a residue has no CA atom.
+        chains (np.ndarray): Chain of each residue.
+        numbers (np.ndarray): Residue number of each residue.
+
+    Returns:
+        np.ndarray: COIL, HELIX or STRAND for each residue.
+    """
+    ss = np.full(len(ca), COIL, dtype=np.int8)
+    if len(ca) < MIN_STRAND + 2:
+        return ss
+    coords, measures = ca_geometry(ca, chains, numbers)
+    helix = matches(measures, HELIX_CRITERIA, "d3", "d4") | matches(
+        measures, HELIX_CRITERIA, "angle", "dihedral"
+    )
+    relaxed = matches(measures, HELIX_CRITERIA, "d3") | matches(
+        measures, HELIX_CRITERIA, "angle"
+    )
+    for segment in runs(helix, MIN_HELIX):
+        extend(ss, segment, relaxed, HELIX)
+    strand = (
+        matches(measures, STRAND_CRITERIA, "d2", "d3", "d4")
+        | matches(measures, STRAND_CRITERIA, "angle", "dihedral")
+    ) & (ss == COIL)
+    relaxed = matches(measures, STRAND_CRITERIA, "d3") | matches(
+        measures, STRAND_CRITERIA, "angle"
+    )
+    candidates = np.flatnonzero(strand)
+    for segment in runs(strand, MIN_STRAND):
+        if paired(coords, candidates, segment):
+            extend(ss, segment, relaxed, STRAND)
+    return ss
+
+
+def nearest(points: np.ndarray, targets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the nearest target of each point. The distances are computed in chunks with a matrix product, so memory stays bounded for large meshes.
+
+    Args:
+        points (np.ndarray): Points of shape (n, 3).
+        targets (np.ndarray): Targets of shape (m, 3).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Index of the nearest target and its squared distance for each point.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    targets = np.asarray(targets, dtype=np.float32)
+    target_norms = np.einsum("ij,ij->i", targets, targets)
+    step = max(1, CHUNK_ELEMENTS // max(1, len(targets)))
+    index = np.empty(len(points), dtype=np.int32)
+    distance = np.empty(len(points), dtype=np.float32)
+    for start in range(0, len(points), step):
+        chunk = points[start : start + step]
+        # |p - t|^2 = |p|^2 - 2 p.t + |t|^2, computed in place
+        distances = chunk @ targets.T
+        distances *= -2
+        distances += target_norms
+        nearest_target = distances.argmin(axis=1)
+        index[start : start + step] = nearest_target
+        distance[start : start + step] = distances[
+            np.arange(len(chunk)), nearest_target
+        ] + np.einsum("ij,ij->i", chunk, chunk)
+    return index, np.maximum(distance, 0)
+
+
+def residue_index_file(mesh_file: str) -> str:
+    """Returns the path of the residue index of a mesh."""
+    return os.path.splitext(mesh_file)[0] + RESIDUE_INDEX_EXT
+
+
+def map_residues(
+    vertices: np.ndarray, pdb_file: str, processing: str = None
+) -> dict[str, np.ndarray] or None:
+    """
+    Maps each vertex of a mesh to the residue of its nearest atom.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh in the coordinates of the PDB file.
+        pdb_file (str): PDB file from which the mesh was rendered.
+        processing (str): Processing mode with which the mesh was rendered. Defaults to None.
+
+    Returns:
+        dict[str, np.ndarray] or None: The residue index, i.e. the residue of each vertex (index), the processing mode and the residue fields, which are needed for recoloring. None if the mesh does not match the PDB file.
+    """
+    try:
+        atoms, atom_residue, residues, _ = read_pdb(pdb_file)
+    except (OSError, ValueError) as e:
+        log.error(f"Could not read {pdb_file}: {e}")
+        return None
+    if len(atoms) == 0:
+        log.error(f"{pdb_file} contains no atoms.")
+        return None
+    nearest_atom, distance = nearest(vertices, atoms)
+    if len(distance) > 0 and np.sqrt(distance).mean() > MAX_DISTANCE:
+        log.warning(
+            f"The mesh of {pdb_file} does not match its atoms. Skipping the residue index."
+        )
+        return None
+    return {
+        "index": atom_residue[nearest_atom],
+        "processing": np.array(processing or ""),
+        **residues,
+    }
+
+
+def write_residue_index(
+    vertices: np.ndarray, pdb_file: str, index_file: str, processing: str = None
+) -> bool:
+    """
+    Stores the residue of each vertex of a mesh next to it, see map_residues.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh in the coordinates of the PDB file.
+        pdb_file (str): PDB file from which the mesh was rendered.
+        index_file (str): Path of the residue index, see residue_index_file.
+        processing (str): Processing mode with which the mesh was rendered. Defaults to None.
+
+    Returns:
+        bool: True if the residue index was written.
+    """
+    index = map_residues(vertices, pdb_file, processing)
+    if index is None:
+        return False
+    save_index(index_file, index.pop("index"), **index)
+    return True
+
+
+def point_index_file(rgb_file: str) -> str:
+    """Returns the path of the point index of a color map, e.g. output/residues/<name>.residues.npz for output/rgb/<name>.png."""
+    maps, name = os.path.split(rgb_file)
+    return os.path.join(
+        os.path.dirname(maps),
+        POINT_INDEX_DIR,
+        os.path.splitext(name)[0] + RESIDUE_INDEX_EXT,
+    )
+
+
+def write_point_index(
+    residue_index: dict[str, np.ndarray],
+    vertices: np.ndarray,
+    index_file: str,
+    scale: float,
+) -> bool:
+    """
+    Stores the residue of each sampled point. As the points are written to the color maps in order, the i-th entry belongs to the i-th pixel. Thus, the maps can be recolored with recolor_map and a pixel can be related to its residue, e.g. to pick residues in VR.
+
+    Args:
+        residue_index (dict[str, np.ndarray]): Residue index of the sampled mesh, see map_residues and read_residue_index.
+        vertices (np.ndarray): Vertex of the mesh from which each point was sampled.
+        index_file (str): Path of the point index, see point_index_file.
+        scale (float): Scale of the point cloud, which is kept for recolored maps.
+
+    Returns:
+        bool: True if the point index was written.
+    """
+    index = dict(residue_index)
+    if len(vertices) > 0 and vertices.max() >= len(index["index"]):
+        log.error(
+            f"The residue index does not match the mesh sampled for {index_file}."
+        )
+        return False
+    residues = index.pop("index")[vertices]
+    save_index(index_file, residues, scale=np.array(scale), **index)
+    return True
+
+
+def save_index(index_file: str, index: np.ndarray, **fields: np.ndarray) -> None:
+    """
+    Writes a residue or point index atomically.
+
+    Args:
+        index_file (str): Path of the index.
+        index (np.ndarray): Residue of each vertex or point.
+        fields (np.ndarray): Residue fields (see read_pdb), processing mode and scale.
+    """
+    # Structures with more than 65535 residues are rare
+    dtype = np.uint16 if len(fields["number"]) <= np.iinfo(np.uint16).max else np.uint32
+    os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+    with open(index_file + ".part", "wb") as f:
+        np.savez_compressed(f, index=index.astype(dtype), **fields)
+    os.replace(index_file + ".part", index_file)
+
+
+def read_residue_index(index_file: str) -> dict[str, np.ndarray]:
+    """Reads a residue index, see write_residue_index, or a point index, see write_point_index."""
+    with np.load(index_file) as data:
+        return {key: data[key] for key in data.files}
+
+
+def scheme(processing: str) -> str:
+    """Returns the coloring scheme of a processing mode, e.g. "bFactor" for "cartoons_bFactor_coloring"."""
+    return processing.split("_")[1]
+
+
+def same_geometry(processing: str, other: str) -> bool:
+    """Returns True if both processing modes use the same display mode, i.e. they result in the same mesh."""
+    return processing.split("_")[0] == other.split("_")[0]
+
+
+def palette(names: list[str], values: np.ndarray) -> np.ndarray:
+    """Interpolates the colors linearly for values between 0 and 1."""
+    stops = np.array([ImageColor.getrgb(name)[:3] for name in names], dtype=np.float32)
+    positions = np.linspace(0, 1, len(names))
+    values = np.clip(values, 0, 1)
+    return np.stack(
+        [np.interp(values, positions, stops[:, c]) for c in range(3)], axis=1
+    ).astype(np.uint8)
+
+
+def residue_colors(
+    residues: dict[str, np.ndarray], coloring: str, colors: list[str] = None
+) -> np.ndarray:
+    """
+    Computes the color of each residue like the corresponding coloring of ChimeraX.
+
+    Args:
+        residues (dict[str, np.ndarray]): Residue fields, see read_pdb.
+        coloring (str): One of SCHEMES.
+        colors (list[str]): Colors of coil, helix and strand for the ss scheme. Defaults to red, green and blue.
+
+    Returns:
+        np.ndarray: RGB colors of shape (residues, 3) as uint8.
+    """
+    count = len(residues["number"])
+    if coloring == "ss":
+        if not colors:
+            colors = DEFAULT_SS_COLORS
+        table = np.array(
+            [ImageColor.getrgb(color)[:3] for color in colors[:3]], dtype=np.uint8
+        )
+        return table[residues["ss"]]
+    if coloring == "rainbow":
+        # Each chain runs through the whole palette from its N- to its C-terminus
+        values = np.zeros(count, dtype=np.float32)
+        for chain in np.unique(residues["chain"]):
+            members = np.flatnonzero(residues["chain"] == chain)
+            if len(members) > 1:
+                values[members] = np.arange(len(members)) / (len(members) - 1)
+        return palette(RAINBOW, values)
+    if coloring == "bFactor":
+        bfactor = residues["bfactor"]
+        span = bfactor.max() - bfactor.min() if count > 0 else 0
+        values = (bfactor - bfactor.min()) / span if span > 0 else np.zeros(count)
+        return palette(BFACTOR, values)
+    if coloring == "chain":
+        _, chain_index = np.unique(residues["chain"], return_inverse=True)
+        table = np.array(
+            [ImageColor.getrgb(color)[:3] for color in CHAIN_COLORS], dtype=np.uint8
+        )
+        return table[chain_index % len(table)]
+    raise ValueError(
+        f"Coloring {coloring} can not be computed without ChimeraX. Choices: {SCHEMES}"
+    )
+
+
+def recolor_mesh(
+    mesh_file: str,
+    index_file: str,
+    output: str,
+    processing: str,
+    colors: list[str] = None,
+) -> bool:
+    """
+    Colors a mesh with another coloring mode of the same display mode.
+
+    Args:
+        mesh_file (str): Mesh (e.g. PLY file) with a residue index.
+        index_file (str): Residue index of the mesh, see write_residue_index.
+        output (str): Path of the recolored mesh.
+        processing (str): Processing mode to apply, e.g. "cartoons_bFactor_coloring".
+        colors (list[str]): Colors of coil, helix and strand for the ss scheme. Defaults to None.
+
+    Returns:
+        bool: True if the recolored mesh was written.
+    """
+    index = read_residue_index(index_file)
+    source = str(index["processing"])
+    if source and not same_geometry(source, processing):
+        log.error(
+            f"{mesh_file} was rendered with {source}, which has another geometry than {processing}."
+        )
+        return False
+    mesh = trimesh.load(mesh_file, force="mesh", process=False)
+    if len(mesh.vertices) != len(index["index"]):
+        log.error(f"The residue index of {mesh_file} does not match its vertices.")
+        return False
+    table = residue_colors(index, scheme(processing), colors)
+    mesh.visual.vertex_colors = table[index["index"]]
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    mesh.export(output)
+    return True
+
+
+def recolor_map(
+    index_file: str,
+    rgb_file: str,
+    processing: str,
+    img_size: int,
+    colors: list[str] = None,
+) -> bool:
+    """
+    Writes the color map of another coloring mode of the same display mode by looking up the color of the residue of each pixel. The xyz maps stay valid, as the points are not sampled again.
+
+    Args:
+        index_file (str): Point index of the map, see write_point_index.
+        rgb_file (str): Path of the recolored map.
+        processing (str): Processing mode to apply, e.g. "cartoons_bFactor_coloring".
+        img_size (int): Width and height of the map, like in pcd_to_png. The map has to be sampled with img_size * img_size points, as its xyz maps are reused.
+        colors (list[str]): Colors of coil, helix and strand for the ss scheme. Defaults to None.
+
+    Returns:
+        bool: True if the recolored map was written.
+    """
+    index = read_residue_index(index_file)
+    source = str(index["processing"])
+    if source and not same_geometry(source, processing):
+        log.error(
+            f"{index_file} was sampled from {source}, which has another geometry than {processing}."
+        )
+        return False
+    if len(index["index"]) != img_size * img_size:
+        log.error(
+            f"{index_file} has {len(index['index'])} points, but a map of {img_size}x{img_size} pixels needs {img_size * img_size}."
+        )
+        return False
+    table = residue_colors(index, scheme(processing), colors)
+    pixels = table[index["index"]]
+    os.makedirs(os.path.dirname(os.path.abspath(rgb_file)), exist_ok=True)
+    Image.fromarray(pixels.reshape(img_size, img_size, 3), "RGB").save(rgb_file)
+    return True
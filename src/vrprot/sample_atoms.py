@@ -0,0 +1,323 @@
+# Point clouds of the sphere, ball, stick and cartoon modes without ChimeraX.
+# Instead of tessellating the atoms and bonds, exporting and sampling the mesh, the points are sampled directly on the atom spheres and bond cylinders. Points inside of other spheres or cylinders are hidden and rejected, which is tested with a spatial hash. The cartoons are sampled by sample_cartoon.
+import itertools
+import os
+
+import numpy as np
+import trimesh
+
+from . import recolor, sample_cartoon
+from .classes import Logger
+from .util import CUBE_NO_LINES
+from .surface import DEFAULT_RADIUS, RADII
+
+log = Logger("SampleAtoms")
+STYLES = ("sphere", "ball", "stick")
+CARTOON = "cartoons"
+BALL_SCALE = 0.25  # Radius of the balls relative to the atom radius, like in ChimeraX
+BOND_RADIUS = 0.2  # Radius (Å) of the bonds and of the atoms in the stick style
+# Covalent radii (Å) of the common elements, which decide whether two atoms are bonded
+COVALENT_RADII = {"H": 0.31, "C": 0.76, "N": 0.71, "O": 0.66, "S": 1.05, "P": 1.07}
+DEFAULT_COVALENT_RADIUS = 0.76
+# Two atoms are bonded up to the sum of their covalent radii plus this (Å)
+BOND_TOLERANCE = 0.4
+# Points closer than this (Å) to the surface of another primitive are visible
+EPSILON = 1e-4
+MAX_ROUNDS = 20  # Maximal number of sampling rounds to replace rejected points
+# Minimal edge length (Å) of the cells of neighbor_pairs, so small cutoffs like the stick radius do not result in many tiny cells
+MIN_CELL_SIZE = 2.0
+# Number of points, which hidden tests at once
+CHUNK_SIZE = 32768
+
+
+def supports(processing: str) -> bool:
+    """Returns True if the point cloud of the processing mode can be sampled without ChimeraX, i.e. a sphere, ball, stick or cartoon mode with one of the colorings of recolor.SCHEMES."""
+    parts = processing.split("_")
+    return (
+        parts[0] in STYLES + (CARTOON,)
+        and len(parts) > 1
+        and parts[1] in recolor.SCHEMES
+    )
+
+
+def neighbor_pairs(
+    queries: np.ndarray, points: np.ndarray, cutoff: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the candidate pairs of queries and points, which are closer than cutoff, with a spatial hash. The points are sorted by their cell and each query looks up the 27 cells around it in a sorted table of the occupied cells, so the memory only grows with the number of points and not with the extent of the structure.
+
+    Args:
+        queries (np.ndarray): Query positions of shape (n, 3).
+        points (np.ndarray): Point positions of shape (m, 3).
+        cutoff (float): Distance up to which the pairs are found. The cells are at least MIN_CELL_SIZE wide.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Index of the query and of the point of each candidate pair. The pairs still have to be filtered by their distance.
+    """
+    cell_size = max(cutoff, MIN_CELL_SIZE)
+    origin = np.minimum(queries.min(axis=0), points.min(axis=0))
+    cells = np.floor((points - origin) / cell_size).astype(np.int64)
+    query_cells = np.floor((queries - origin) / cell_size).astype(np.int64)
+    # The neighboring cells of the queries range from -1 to the maximum + 1
+    size = np.maximum(cells.max(axis=0), query_cells.max(axis=0)) + 3
+
+    def key(cell: np.ndarray) -> np.ndarray:
+        cell = cell + 1
+        return (cell[:, 0] * size[1] + cell[:, 1]) * size[2] + cell[:, 2]
+
+    keys = key(cells)
+    order = np.argsort(keys, kind="stable")
+    occupied, cell_starts, cell_counts = np.unique(
+        keys[order], return_index=True, return_counts=True
+    )
+    # The keys are linear in the cells, so the neighboring cells are constant offsets of the sorted query keys
+    query_order = np.argsort(key(query_cells))
+    query_keys = key(query_cells[query_order])
+    query_index, point_index = [], []
+    for offset in itertools.product((-1, 0, 1), repeat=3):
+        neighbors = query_keys + (offset[0] * size[1] + offset[1]) * size[2] + offset[2]
+        slot = np.minimum(np.searchsorted(occupied, neighbors), len(occupied) - 1)
+        found = occupied[slot] == neighbors
+        low = np.where(found, cell_starts[slot], 0)
+        counts = np.where(found, cell_counts[slot], 0)
+        first = np.cumsum(counts) - counts
+        position = np.arange(counts.sum()) + np.repeat(low - first, counts)
+        query_index.append(np.repeat(query_order, counts))
+        point_index.append(order[position])
+    return np.concatenate(query_index), np.concatenate(point_index)
+
+
+def bonds(atoms: np.ndarray, elements: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Connects the atoms by their distance, as the PDB files of AlphaFold DB contain no CONECT records.
+
+    Args:
+        atoms (np.ndarray): Coordinates of the atoms.
+        elements (np.ndarray): Element of each atom.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: First and second atom of each bond.
+    """
+    radii = np.array(
+        [COVALENT_RADII.get(e.upper(), DEFAULT_COVALENT_RADIUS) for e in elements]
+    )
+    cutoff = 2 * radii.max() + BOND_TOLERANCE
+    first, second = neighbor_pairs(atoms, atoms, cutoff)
+    keep = first < second
+    first, second = first[keep], second[keep]
+    distance = np.linalg.norm(atoms[first] - atoms[second], axis=1)
+    bonded = distance <= radii[first] + radii[second] + BOND_TOLERANCE
+    return first[bonded], second[bonded]
+
+
+def primitives(atoms: np.ndarray, elements: np.ndarray, style: str) -> dict:
+    """
+    Builds the spheres and cylinders of a style.
+
+    Args:
+        atoms (np.ndarray): Coordinates of the atoms.
+        elements (np.ndarray): Element of each atom.
+        style (str): One of STYLES.
+
+    Returns:
+        dict: Radius of each atom sphere ("radii") and the atoms ("first", "second") and radius ("bond_radius") of the bond cylinders.
+    """
+    radii = np.array(
+        [RADII.get(e.upper(), DEFAULT_RADIUS) for e in elements], dtype=np.float64
+    )
+    empty = np.zeros(0, dtype=np.int64)
+    if style == "sphere":
+        return {"radii": radii, "first": empty, "second": empty, "bond_radius": 0}
+    first, second = bonds(atoms, elements)
+    if style == "ball":
+        radii = radii * BALL_SCALE
+    else:
+        radii = np.full(len(atoms), BOND_RADIUS)
+    return {
+        "radii": radii,
+        "first": first,
+        "second": second,
+        "bond_radius": BOND_RADIUS,
+    }
+
+
+def sample_points(
+    atoms: np.ndarray, shapes: dict, count: int, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Samples points uniformly on the spheres and cylinders. Each primitive is drawn with a probability proportional to its area. Each point on a bond takes the atom of its half, like the half bond coloring of ChimeraX.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The points and the atom of each point.
+    """
+    radii, first, second = shapes["radii"], shapes["first"], shapes["second"]
+    axes = atoms[second] - atoms[first]
+    lengths = np.linalg.norm(axes, axis=1)
+    areas = np.concatenate(
+        [4 * np.pi * radii**2, 2 * np.pi * shapes["bond_radius"] * lengths]
+    )
+    primitive = rng.choice(len(areas), count, p=areas / areas.sum())
+    on_sphere = primitive < len(atoms)
+    points = np.empty((count, 3))
+    atom = np.empty(count, dtype=np.int64)
+
+    sphere = primitive[on_sphere]
+    directions = rng.normal(size=(len(sphere), 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    points[on_sphere] = atoms[sphere] + directions * radii[sphere, None]
+    atom[on_sphere] = sphere
+
+    bond = primitive[~on_sphere] - len(atoms)
+    axis = axes[bond] / lengths[bond, None]
+    # Two directions perpendicular to the axis
+    helper = np.where(
+        np.abs(axis[:, [0]]) < 0.9, np.array([1.0, 0, 0]), np.array([0, 1.0, 0])
+    )
+    normal = np.cross(axis, helper)
+    normal /= np.linalg.norm(normal, axis=1, keepdims=True)
+    binormal = np.cross(axis, normal)
+    t = rng.random(len(bond))
+    angle = rng.random(len(bond)) * 2 * np.pi
+    points[~on_sphere] = (
+        atoms[first[bond]]
+        + axes[bond] * t[:, None]
+        + shapes["bond_radius"]
+        * (np.cos(angle)[:, None] * normal + np.sin(angle)[:, None] * binormal)
+    )
+    atom[~on_sphere] = np.where(t < 0.5, first[bond], second[bond])
+    return points, atom
+
+
+def hidden(points: np.ndarray, atoms: np.ndarray, shapes: dict) -> np.ndarray:
+    """Returns True for each point, which lies inside of a sphere or cylinder. The points are tested in chunks of CHUNK_SIZE, which bounds the number of candidate pairs held at once."""
+    inside = np.zeros(len(points), dtype=bool)
+    for start in range(0, len(points), CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        inside[chunk] = hidden_chunk(points[chunk], atoms, shapes)
+    return inside
+
+
+def hidden_chunk(points: np.ndarray, atoms: np.ndarray, shapes: dict) -> np.ndarray:
+    """Tests a chunk of points, see hidden."""
+    radii, first, second = shapes["radii"], shapes["first"], shapes["second"]
+    inside = np.zeros(len(points), dtype=bool)
+    query, sphere = neighbor_pairs(points, atoms, radii.max())
+    distance = np.sum((points[query] - atoms[sphere]) ** 2, axis=1)
+    inside[query[distance < (radii[sphere] - EPSILON) ** 2]] = True
+    if len(first) == 0:
+        return inside
+    axes = atoms[second] - atoms[first]
+    lengths = np.linalg.norm(axes, axis=1)
+    centers = atoms[first] + axes / 2
+    query, bond = neighbor_pairs(
+        points, centers, lengths.max() / 2 + shapes["bond_radius"]
+    )
+    relative = points[query] - atoms[first[bond]]
+    t = np.einsum("ij,ij->i", relative, axes[bond]) / lengths[bond] ** 2
+    radial = relative - axes[bond] * t[:, None]
+    within = (
+        (t > 0)
+        & (t < 1)
+        & (
+            np.einsum("ij,ij->i", radial, radial)
+            < (shapes["bond_radius"] - EPSILON) ** 2
+        )
+    )
+    inside[query[within]] = True
+    return inside
+
+
+def visible_points(
+    atoms: np.ndarray, shapes: dict, count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Samples count visible points, see sample_points and hidden. Rejected points are replaced in further rounds."""
+    rng = np.random.default_rng()
+    points, atom = [], []
+    found, batch = 0, count
+    for _ in range(MAX_ROUNDS):
+        candidates, owners = sample_points(atoms, shapes, batch, rng)
+        visible = ~hidden(candidates, atoms, shapes)
+        points.append(candidates[visible])
+        atom.append(owners[visible])
+        found += visible.sum()
+        if found >= count:
+            break
+        # Draw enough candidates for the missing points at the observed rate of visible points
+        rate = max(visible.mean(), 0.01)
+        batch = int(np.ceil((count - found) / rate * 1.1))
+    else:
+        log.warning(f"Sampled only {found} of {count} visible points.")
+    return np.concatenate(points)[:count], np.concatenate(atom)[:count]
+
+
+def bounds(atoms: np.ndarray, radii: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the corners of the bounding box of the atom spheres. The bonds lie within the spheres of their atoms."""
+    return (atoms - radii[:, None]).min(axis=0), (atoms + radii[:, None]).max(axis=0)
+
+
+def write_point_clouds(
+    pdb_file: str,
+    targets: dict[str, str],
+    SAMPLE_POINTS: int = 262144,
+    colors: list[str] = None,
+    point_indices: dict[str, str] = None,
+) -> dict[str, float]:
+    """
+    Samples the point clouds of a structure for sphere, ball, stick and cartoon modes. The points are only sampled once per style and colored for each mode. They are centered and scaled like the meshes in sample_pointcloud.sample_pcd.
+
+    Args:
+        pdb_file (str): Path to the PDB file.
+        targets (dict[str, str]): Maps the path of each ASCII point cloud to its processing mode, see supports.
+        SAMPLE_POINTS (int): Number of points to sample. Defaults to 262144.
+        colors (list[str]): Colors of coil, helix and strand for the ss coloring. Defaults to None.
+        point_indices (dict[str, str]): Maps the path of an ASCII point cloud to the path of its point index, see recolor.write_point_index. Defaults to None.
+
+    Returns:
+        dict[str, float]: Scale of each written point cloud.
+    """
+    atoms, atom_residue, residues, properties = recolor.read_pdb(pdb_file)
+    if len(atoms) == 0:
+        raise ValueError(f"{pdb_file} contains no atoms.")
+    atoms = atoms.astype(np.float64)
+    cube_center = trimesh.load(CUBE_NO_LINES, process=False).vertices.mean(axis=0)
+    point_indices = point_indices or {}
+    scales = {}
+    for style in STYLES + (CARTOON,):
+        outputs = {
+            output: processing
+            for output, processing in targets.items()
+            if processing.split("_")[0] == style
+        }
+        if len(outputs) == 0:
+            continue
+        if style == CARTOON:
+            points, residue, lower, upper = sample_cartoon.cartoon_points(
+                atoms, atom_residue, residues, properties["name"], SAMPLE_POINTS
+            )
+        else:
+            shapes = primitives(atoms, properties["element"], style)
+            points, atom = visible_points(atoms, shapes, SAMPLE_POINTS)
+            lower, upper = bounds(atoms, shapes["radii"])
+            residue = atom_residue[atom]
+        # Scale to the cube of the VRNetzer, but do not shrink
+        scale = max(10000 / (upper - lower).max() * 0.95, 1)
+        points = (points - (lower + upper) / 2) * scale + cube_center
+        for output, processing in outputs.items():
+            table = recolor.residue_colors(residues, recolor.scheme(processing), colors)
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            np.savetxt(
+                output,
+                np.hstack([points, table[residue] / 255]),
+                fmt="%.6f",
+                delimiter=" ",
+            )
+            if output in point_indices:
+                recolor.save_index(
+                    point_indices[output],
+                    residue,
+                    processing=np.array(processing),
+                    scale=np.array(scale),
+                    **residues,
+                )
+            scales[output] = scale
+    return scales
@@ -0,0 +1,203 @@
+# Point clouds of the cartoon modes without ChimeraX.
+# A Catmull-Rom spline is laid through the CA atoms of each chain and a cross-section is swept along it: a round tube for coils, a flat oval for helices and a flat rectangle ending in an arrow for strands. The ribbon is oriented by the carbonyl oxygens like in ChimeraX. The swept surface is only built in memory and sampled directly.
+import numpy as np
+
+from . import recolor
+from .util import sample_triangles
+
+SUBDIVISIONS = 10  # Spline points per residue
+RING = 16  # Points of each cross-section
+WIDTH = 2.0  # Width (Å) of helices and strands, like in ChimeraX
+THICKNESS = 0.4  # Thickness (Å) of helices and strands
+COIL_RADIUS = 0.2  # Radius (Å) of the coil tube
+ARROW_SCALE = 1.5  # Width of the arrow heads of strands relative to their width
+# Distance (Å) of consecutive CA atoms above which the chain is broken
+MAX_CA_DISTANCE = 4.2
+
+
+def backbone(
+    atoms: np.ndarray, atom_residue: np.ndarray, names: np.ndarray, count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the coordinates of the CA and O atoms of each residue. Missing atoms are NaN."""
+    ca = np.full((count, 3), np.nan)
+    oxygen = np.full((count, 3), np.nan)
+    for name, target in (("CA", ca), ("O", oxygen)):
+        selected = names == name
+        target[atom_residue[selected]] = atoms[selected]
+    return ca, oxygen
+
+
+def segments(residues: dict[str, np.ndarray], ca: np.ndarray) -> list[np.ndarray]:
+    """Splits the residues with a CA atom into continuous pieces of the chains."""
+    index = np.flatnonzero(~np.isnan(ca[:, 0]))
+    if len(index) == 0:
+        return []
+    broken = (
+        (residues["chain"][index[1:]] != residues["chain"][index[:-1]])
+        | (residues["number"][index[1:]] - residues["number"][index[:-1]] != 1)
+        | (np.linalg.norm(ca[index[1:]] - ca[index[:-1]], axis=1) > MAX_CA_DISTANCE)
+    )
+    pieces = np.split(index, np.flatnonzero(broken) + 1)
+    return [piece for piece in pieces if len(piece) > 1]
+
+
+def spline(points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Interpolates a Catmull-Rom spline through the points with SUBDIVISIONS points per interval.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The points of the spline and their parameter, which is the (fractional) index of the interpolated point.
+    """
+    # The ends are extrapolated, so the spline passes through the first and the last point
+    padded = np.vstack([2 * points[0] - points[1], points, 2 * points[-1] - points[-2]])
+    t = np.arange((len(points) - 1) * SUBDIVISIONS + 1) / SUBDIVISIONS
+    i = np.minimum(t.astype(np.int64), len(points) - 2)
+    s = (t - i)[:, None]
+    p0, p1, p2, p3 = padded[i], padded[i + 1], padded[i + 2], padded[i + 3]
+    curve = 0.5 * (
+        2 * p1
+        + (p2 - p0) * s
+        + (2 * p0 - 5 * p1 + 4 * p2 - p3) * s**2
+        + (3 * p1 - p0 - 3 * p2 + p3) * s**3
+    )
+    return curve, t
+
+
+def frames(
+    curve: np.ndarray, t: np.ndarray, guides: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the width and thickness direction of the ribbon at each point of the spline. The width follows the guide vectors (CA to O) of the residues, which are interpolated along the spline.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Width and thickness direction of each point.
+    """
+    # The carbonyl groups of strands alternate, so each guide is flipped to agree with its predecessor
+    signs = np.sign(np.einsum("ij,ij->i", guides[1:], guides[:-1]))
+    signs[signs == 0] = 1
+    guides = guides * np.concatenate([[1], np.cumprod(signs)])[:, None]
+    i = np.minimum(t.astype(np.int64), len(guides) - 2)
+    s = (t - i)[:, None]
+    guide = guides[i] * (1 - s) + guides[i + 1] * s
+    tangent = np.gradient(curve, axis=0)
+    tangent /= np.linalg.norm(tangent, axis=1, keepdims=True)
+    width = guide - tangent * np.einsum("ij,ij->i", guide, tangent)[:, None]
+    length = np.linalg.norm(width, axis=1)
+    # Without a usable guide any direction perpendicular to the tangent will do
+    degenerate = length < 1e-6
+    helper = np.where(
+        np.abs(tangent[:, [0]]) < 0.9, np.array([1.0, 0, 0]), np.array([0, 1.0, 0])
+    )
+    width[degenerate] = np.cross(tangent[degenerate], helper[degenerate])
+    width /= np.linalg.norm(width, axis=1, keepdims=True)
+    return width, np.cross(tangent, width)
+
+
+def cross_sections(ss: np.ndarray, t: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the ring of each point of the spline in the coordinates of its frame.
+
+    Args:
+        ss (np.ndarray): Secondary structure of the residues of the piece, see recolor.secondary_structure.
+        t (np.ndarray): Parameter of each point of the spline, see spline.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Offsets along the width and the thickness direction of shape (points, RING).
+    """
+    owner = np.rint(t).astype(np.int64)
+    kind = ss[owner]
+    angle = 2 * np.pi * np.arange(RING) / RING
+    ellipse = np.stack([np.cos(angle), np.sin(angle)])
+    # A circle stretched onto a square
+    rectangle = ellipse / np.abs(ellipse).max(axis=0)
+    half_width = np.full(len(t), COIL_RADIUS)
+    half_thickness = np.full(len(t), COIL_RADIUS)
+    flat = kind != recolor.COIL
+    half_width[flat] = WIDTH / 2
+    half_thickness[flat] = THICKNESS / 2
+    # The last residue of each strand is an arrow head, which narrows to its end
+    last = (ss == recolor.STRAND) & (np.append(ss[1:], recolor.COIL) != recolor.STRAND)
+    head = last[owner]
+    progress = np.clip(t[head] - owner[head] + 0.5, 0, 1)
+    half_width[head] *= ARROW_SCALE * (1 - progress) + 0.1
+    shape = np.where((kind == recolor.STRAND)[:, None, None], rectangle, ellipse)
+    return (
+        shape[:, 0] * half_width[:, None],
+        shape[:, 1] * half_thickness[:, None],
+    )
+
+
+def cartoon_mesh(
+    atoms: np.ndarray,
+    atom_residue: np.ndarray,
+    residues: dict[str, np.ndarray],
+    names: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds the swept surface of the cartoon of a structure.
+
+    Args:
+        atoms (np.ndarray): Coordinates of the atoms.
+        atom_residue (np.ndarray): Residue of each atom.
+        residues (dict[str, np.ndarray]): Residue fields, see recolor.read_pdb.
+        names (np.ndarray): Name of each atom.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Vertices, triangles and the residue of each vertex.
+    """
+    ca, oxygen = backbone(atoms, atom_residue, names, len(residues["number"]))
+    vertices, triangles, vertex_residue = [], [], []
+    offset = 0
+    for piece in segments(residues, ca):
+        curve, t = spline(ca[piece])
+        guides = np.nan_to_num(oxygen[piece] - ca[piece])
+        width, thickness = frames(curve, t, guides)
+        x, y = cross_sections(residues["ss"][piece], t)
+        ring = (
+            curve[:, None]
+            + x[..., None] * width[:, None]
+            + y[..., None] * thickness[:, None]
+        )
+        vertices.append(ring.reshape(-1, 3))
+        vertex_residue.append(np.repeat(piece[np.rint(t).astype(np.int64)], RING))
+        # Two triangles between each pair of neighboring points of consecutive rings
+        j, k = np.meshgrid(np.arange(len(curve) - 1), np.arange(RING), indexing="ij")
+        a = j * RING + k
+        b = j * RING + (k + 1) % RING
+        c = b + RING
+        d = a + RING
+        quads = np.stack([a, b, c, d], axis=-1).reshape(-1, 4) + offset
+        triangles.append(quads[:, [0, 1, 2]])
+        triangles.append(quads[:, [0, 2, 3]])
+        offset += len(ring) * RING
+    if len(vertices) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64), np.zeros(0)
+    return (
+        np.concatenate(vertices),
+        np.concatenate(triangles),
+        np.concatenate(vertex_residue),
+    )
+
+
+def cartoon_points(
+    atoms: np.ndarray,
+    atom_residue: np.ndarray,
+    residues: dict[str, np.ndarray],
+    names: np.ndarray,
+    count: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Samples points on the cartoon of a structure, see cartoon_mesh.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The points, the residue of each point and the corners of the bounding box of the cartoon.
+    """
+    vertices, triangles, vertex_residue = cartoon_mesh(
+        atoms, atom_residue, residues, names
+    )
+    if len(triangles) == 0:
+        raise ValueError("The structure has no backbone for a cartoon.")
+    source, weights = sample_triangles(vertices, triangles, count)
+    points = sum(weights[:, k, None] * vertices[triangles[source, k]] for k in range(3))
+    residue = vertex_residue[triangles[source, weights.argmax(axis=1)]]
+    return points, residue, vertices.min(axis=0), vertices.max(axis=0)
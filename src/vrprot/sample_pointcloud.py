@@ -3,34 +3,139 @@ import glob
 import ntpath
 import os
 
+import numpy as np
 import open3d as o3d
 
+from . import multifraction, recolor
 from .classes import Logger
-from .util import FILE_DIR
+from .util import CUBE_NO_LINES, sample_triangles
 import traceback
 
-CUBE_NO_LINES = os.path.join(FILE_DIR, "static", "3d_objects", "Cube_no_lines.ply")
 log = Logger("SamplePointCloud")
 
 
+def sample_points(
+    mesh: o3d.geometry.TriangleMesh, number_of_points: int
+) -> tuple[o3d.geometry.PointCloud, np.ndarray]:
+    """
+    Samples points uniformly on the surface of a mesh like TriangleMesh.sample_points_uniformly, but keeps track of where each point came from, see sample_triangles.
+
+    Args:
+        mesh (o3d.geometry.TriangleMesh): Mesh to sample.
+        number_of_points (int): Number of points to sample.
+
+    Returns:
+        tuple[o3d.geometry.PointCloud, np.ndarray]: The point cloud and for each point the vertex of its source triangle, which is closest to it.
+    """
+    vertices = np.asarray(mesh.vertices)
+    triangles = np.asarray(mesh.triangles)
+    source, weights = sample_triangles(vertices, triangles, number_of_points)
+
+    def interpolate(values: np.ndarray) -> np.ndarray:
+        return sum(weights[:, k, None] * values[triangles[source, k]] for k in range(3))
+
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(interpolate(vertices))
+    if mesh.has_vertex_colors():
+        pcd.colors = o3d.utility.Vector3dVector(
+            interpolate(np.asarray(mesh.vertex_colors))
+        )
+    if mesh.has_vertex_normals():
+        normals = interpolate(np.asarray(mesh.vertex_normals))
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        pcd.normals = o3d.utility.Vector3dVector(
+            np.divide(normals, lengths, out=normals, where=lengths > 0)
+        )
+    closest = triangles[source, weights.argmax(axis=1)]
+    return pcd, closest
+
+
+def mesh_from_arrays(
+    vertices: np.ndarray, faces: np.ndarray, colors: np.ndarray = None
+) -> o3d.geometry.TriangleMesh:
+    """
+    Creates a mesh from arrays, e.g. the ones of a trimesh mesh, so a mesh can be sampled without writing it to a PLY file first.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh.
+        faces (np.ndarray): Vertex indices of the triangles.
+        colors (np.ndarray): RGB(A) color of each vertex with values from 0 to 255. Defaults to None.
+
+    Returns:
+        o3d.geometry.TriangleMesh: The mesh.
+    """
+    mesh = o3d.geometry.TriangleMesh()
+    mesh.vertices = o3d.utility.Vector3dVector(np.asarray(vertices, dtype=np.float64))
+    mesh.triangles = o3d.utility.Vector3iVector(np.asarray(faces, dtype=np.int32))
+    if colors is not None:
+        mesh.vertex_colors = o3d.utility.Vector3dVector(
+            np.asarray(colors[:, :3], dtype=np.float64) / 255
+        )
+    return mesh
+
+
 def sample_pcd(
     ply_file,
     output,
     SAMPLE_POINTS=262144,
     cube_no_line=None,
     debug=False,
+    residue_index=None,
+    point_index=None,
 ):
-    if cube_no_line is None:
-        cube_no_line = CUBE_NO_LINES
+    """
+    Samples the point cloud of a PLY file, see sample_mesh.
+
+    Args:
+        ply_file (str): Path to the mesh.
+        output (str): Path of the ASCII point cloud.
+        SAMPLE_POINTS (int): Number of points to sample. Defaults to 262144.
+        residue_index (str): Residue index of the mesh, see recolor.write_residue_index. Defaults to None.
+        point_index (str): If given together with residue_index, the residue of each point is stored at this path, see recolor.write_point_index. Defaults to None.
+
+    Returns:
+        float: The scale which was applied to the mesh.
+    """
     # get protein name & read mesh as .ply format
     try:
         mesh = o3d.io.read_triangle_mesh(ply_file)
-        mesh.compute_vertex_normals()
     except Exception as e:
         traceback.print_exc()
         log.error(f"Error while reading mesh: {e}")
         return
     log.debug(f"Processing structure:{ply_file}")
+    if residue_index is not None:
+        residue_index = recolor.read_residue_index(residue_index)
+    return sample_mesh(
+        mesh, output, SAMPLE_POINTS, cube_no_line, debug, residue_index, point_index
+    )
+
+
+def sample_mesh(
+    mesh: o3d.geometry.TriangleMesh,
+    output: str,
+    SAMPLE_POINTS: int = 262144,
+    cube_no_line: str = None,
+    debug: bool = False,
+    residue_index: dict[str, np.ndarray] = None,
+    point_index: str = None,
+) -> float:
+    """
+    Samples the point cloud of a mesh, which is centered and scaled to fit into the cube of the VRNetzer.
+
+    Args:
+        mesh (o3d.geometry.TriangleMesh): The mesh, e.g. from mesh_from_arrays.
+        output (str): Path of the ASCII point cloud.
+        SAMPLE_POINTS (int): Number of points to sample. Defaults to 262144.
+        residue_index (dict[str, np.ndarray]): Residue index of the mesh, see recolor.map_residues. Defaults to None.
+        point_index (str): If given together with residue_index, the residue of each point is stored at this path, see recolor.write_point_index. Defaults to None.
+
+    Returns:
+        float: The scale which was applied to the mesh.
+    """
+    if cube_no_line is None:
+        cube_no_line = CUBE_NO_LINES
+    mesh.compute_vertex_normals()
 
     # load cube with no lines (for merging)
     cube_no_line = o3d.io.read_triangle_mesh(cube_no_line)
@@ -74,8 +179,12 @@ def sample_pcd(
     mesh_combined = cube_no_line + mesh
     if debug:
         o3d.visualization.draw_geometries([mesh_combined])
-    # sample points from merged mesh
-    pcd = mesh.sample_points_uniformly(number_of_points=SAMPLE_POINTS)
+    # sample points from merged mesh. The residues of the points are only known, if their source triangles are tracked by sample_points
+    track = residue_index is not None and point_index is not None
+    if track:
+        pcd, closest = sample_points(mesh, SAMPLE_POINTS)
+    else:
+        pcd = mesh.sample_points_uniformly(number_of_points=SAMPLE_POINTS)
     if debug:
         down = mesh.sample_points_uniformly(number_of_points=5000)
         down.paint_uniform_color([0, 0, 0])
@@ -86,6 +195,9 @@ def sample_pcd(
     save_location, _ = ntpath.split(output)
     os.makedirs(save_location, exist_ok=True)
     o3d.io.write_point_cloud(output, pcd)
+    if track:
+        # Point i becomes pixel i of the color maps, see pcd_to_png
+        recolor.write_point_index(residue_index, closest, point_index, scale)
     # # Debug to view structure with cube.
     if debug:
         o3d.visualization.draw_geometries([pcd])
@@ -98,8 +210,12 @@ def run_for_batch():
 
     all_files = glob.glob("PLY_files/*.ply")
     for file in all_files:
-        file_name = file.split("/")[-1]
-        protein = file_name.split("-")[1]
+        file_name = os.path.basename(file)
+        parsed = multifraction.parse_structure(file_name)
+        if parsed is None:
+            log.debug(f"Skipping {file_name}.")
+            continue
+        protein, _ = parsed
         log.debug(f"protein:{protein}, file name:{file_name}")
         file_name = file_name.replace("ply", "xyzrgb")
         log.debug(f"{file_name}")
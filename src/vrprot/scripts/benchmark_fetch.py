@@ -0,0 +1,113 @@
+# Benchmark of the concurrent fetcher against a local stand-in for the AlphaFold server.
+# To run this script, use the following command from the src directory:
+# python -m vrprot.scripts.benchmark_fetch <directory with AF-*.pdb files> --latency 0.2 --connections 1 8 32
+import argparse
+import functools
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from vrprot import fetcher
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """Serves files from a directory and delays each response to emulate the round trip to a remote server."""
+
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(directory: str, latency: float) -> ThreadingHTTPServer:
+    handler = functools.partial(SlowHandler, directory=directory)
+    SlowHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def proteins_from_dir(directory: str, version: str, repeat: int) -> list[str]:
+    """Collects the UniProtIDs of all structures in the directory. The list is repeated to get a larger batch."""
+    pattern = re.compile(rf"AF-(\w+)-F1-model_{version}\.pdb$")
+    proteins = []
+    for file in os.listdir(directory):
+        match = pattern.match(file)
+        if match:
+            proteins.append(match.group(1))
+    return proteins * repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "directory",
+        help="Directory containing AF-<UniProtID>-F1-model_<version>.pdb files.",
+    )
+    parser.add_argument("--version", "-v", default="v4", help="AlphaFold DB version.")
+    parser.add_argument(
+        "--latency",
+        "-l",
+        type=float,
+        default=0.2,
+        help="Artificial latency of each response in seconds.",
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        type=int,
+        default=5,
+        help="How often each structure is requested.",
+    )
+    parser.add_argument(
+        "--rate_limit",
+        "-rl",
+        type=float,
+        default=0,
+        help="Requests per second sent to the server. 0 disables the limit.",
+    )
+    parser.add_argument(
+        "--connections",
+        "-c",
+        type=int,
+        nargs="+",
+        default=[1, 8, 32],
+        help="Concurrency limits to compare.",
+    )
+    args = parser.parse_args()
+
+    proteins = proteins_from_dir(args.directory, args.version, args.repeat)
+    server = start_server(args.directory, args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    print(f"Fetching {len(proteins)} structures from {base_url}")
+    try:
+        for connections in args.connections:
+            target = tempfile.mkdtemp()
+            start = time.perf_counter()
+            results = fetcher.fetch_structures(
+                proteins,
+                target,
+                db_version=args.version,
+                max_connections=connections,
+                mirrors=fetcher.MirrorSet([base_url], args.rate_limit),
+            )
+            duration = time.perf_counter() - start
+            fetched = sum(status.success for status in results.values())
+            print(
+                f"connections={connections:>4}: {duration:7.2f}s, {fetched}/{len(set(proteins))} fetched"
+            )
+            shutil.rmtree(target)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
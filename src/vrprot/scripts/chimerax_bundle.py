@@ -1,10 +1,20 @@
 # Author: Till Pascal Oblau
 import argparse
+import json
 import os
 import sys
 
 from chimerax.core.commands import run
 
+# Marks the messages for vrprot, as the ChimeraX log is written to stdout as well
+MESSAGE_PREFIX = "@vrprot "
+
+
+def send(message: dict) -> None:
+    """Writes a message as JSON line to the original stdout, which is not captured by the ChimeraX log."""
+    sys.__stdout__.write(MESSAGE_PREFIX + json.dumps(message) + "\n")
+    sys.__stdout__.flush()
+
 
 class Bundle:
     """
@@ -28,6 +38,9 @@ class Bundle:
         self.pipeline = ["N/A"]
         self.path = path
         self.only_images = only_images
+        # Commands and output directories of each coloring mode, see apply_processing
+        self.modes = []
+        self.outputs = {}
 
     def debug(self, string):
         run(self.session, f"echo {string}")
@@ -42,21 +55,31 @@ class Bundle:
 
     def run_pipeline(self, structure, tmp_name):
         """
-        Function to executed the pipeline and save the file as glb
-        """
-        out_name = structure.replace("pdb", "glb")
-        tmp_name = tmp_name.replace("pdb", "glb")
-        tmp_save_loc = f"{self.target}/tmp_{tmp_name}"
-        save_loc = f"{self.target}/{tmp_name}"
-        pipeline = self.pipeline.copy()
-        if self.images:
-            pipeline = pipeline[:-2] + self.take_screenshot(out_name) + pipeline[-2:]
-        if not self.only_images:
-            pipeline[-2] = f"save {tmp_save_loc}"
+        Function to executed the pipeline and save the file as glb. The structure is opened once and one glb file is saved for each coloring mode.
+        """
+        # Compressed structures (.pdb.gz) result in the same .glb file
+        out_name = structure.replace(".gz", "").replace("pdb", "glb")
+        tmp_name = tmp_name.replace(".gz", "").replace("pdb", "glb")
+        pipeline = [self.pipeline[0]]
+        for output in self.modes:
+            pipeline += output["commands"]
+            if output["images"]:
+                pipeline += self.take_screenshot(out_name, output["images"])
+            if not self.only_images:
+                pipeline.append(f"save {output['target']}/tmp_{tmp_name}")
+        pipeline.append("close")
+        self.last_output = None
+        self.outputs = {}
         for command in pipeline:
             run(self.session, f"echo {command}")
             run(self.session, command)
-        os.rename(tmp_save_loc, save_loc)
+        if self.only_images:
+            return
+        for output in self.modes:
+            save_loc = f"{output['target']}/{tmp_name}"
+            os.rename(f"{output['target']}/tmp_{tmp_name}", save_loc)
+            self.outputs[output["mode"]] = save_loc
+        self.last_output = self.outputs[self.modes[0]["mode"]]
 
     ## display modes
     def change_display_to(self, mode: str):
@@ -222,21 +245,39 @@ class Bundle:
         self.change_display_to(mode)
         self.mfpl_coloring()
 
-    def take_screenshot(self, structure):
+    def take_screenshot(self, structure, images=None):
         """
         Takes a screenshot of the current scene and saves it to the specified path.
         """
+        if images is None:
+            images = self.images
         out_name = structure.replace(".glb", ".png")
-        if os.path.isfile(f"{self.images}/{out_name}"):
+        if os.path.isfile(f"{images}/{out_name}"):
             return []
         unselect = "~select"
         view = "view"
 
-        save = f"save {self.images}/{out_name} width 512 height 512 supersample 3 transparentBackground true"
+        save = f"save {images}/{out_name} width 512 height 512 supersample 3 transparentBackground true"
         select = f"select"
         return [unselect, view, save, select]
 
-    def apply_processing(self, mode, colors):
+    def apply_processing(self, mode, colors, target=None, images=None):
+        """
+        Adds a coloring mode. If it is called for several modes, each structure is still opened only once and one glb file is saved per mode.
+
+        Args:
+            mode (str): Coloring mode like "cartoons_ss_coloring".
+            colors (list): Colors of the secondary structures.
+            target (str, optional): Directory of the glb files of this mode. Defaults to the target of the bundle.
+            images (str, optional): Directory of the images of this mode. Defaults to the images directory of the bundle.
+        """
+        if target is None:
+            target = self.target
+        if images is None:
+            images = self.images
+        processing = mode
+        # Each mode sets the display and colors of the whole structure, so its commands can follow the ones of the previous mode
+        self.pipeline = ["N/A"]
         cases = {
             "ss": self.mode_ss_coloring,
             "rainbow": self.mode_rainbow_coloring,
@@ -272,23 +313,43 @@ class Bundle:
                 # if mode was ["stick", "sphere", "ball"] atoms is the new mode and style is one out of ["stick", "sphere", "ball"]
                 self.change_style_to(style)
 
-        if self.images is not None:
+        if images is not None:
             run(self.session, "lighting soft")
             run(self.session, "lighting shadows false")
 
-        if self.only_images:
-            self.pipeline += ["echo NA", "close"]
-            return
-        else:
-            self.pipeline += ["save", "close"]
+        self.modes.append(
+            {
+                "mode": processing,
+                "target": target,
+                "images": images,
+                "commands": self.pipeline[1:],
+            }
+        )
 
     def run(self, file_names, tmp_names=None):
+        """
+        Processes each structure and reports its completion with a message, see send. A structure which fails is reported as failed and the remaining structures are processed anyway.
+        """
         if tmp_names is None:
             tmp_names = file_names
         for structure, tmp_name in zip(file_names, tmp_names):
             run(self.session, f"echo {structure}")
             self.open_file(os.path.join(self.path, structure))
-            self.run_pipeline(structure, tmp_name)
+            try:
+                self.run_pipeline(structure, tmp_name)
+            except Exception as e:
+                # Make sure that the next structure starts in an empty session
+                run(self.session, "close")
+                send({"file": structure, "status": "failed", "error": str(e)})
+                continue
+            send(
+                {
+                    "file": structure,
+                    "status": "done",
+                    "glb": self.last_output,
+                    "outputs": self.outputs,
+                }
+            )
         # Close ChimeraX
 
 
@@ -304,14 +365,14 @@ def main():
     parser.add_argument(
         "-d",
         "--dest",
-        help="Path to the directory where the glbs will be saved.",
+        help="Path to the directory where the glbs will be saved. Comma separated with one directory per mode, if several modes are given.",
         required=True,
         type=str,
     )
     parser.add_argument(
         "-i",
         "--images",
-        help="Path to the directory where the images will be saved.",
+        help="Path to the directory where the images will be saved. Comma separated with one directory per mode, if several modes are given.",
         required=False,
         default=None,
         type=str,
@@ -319,7 +380,7 @@ def main():
     parser.add_argument(
         "-m",
         "--mode",
-        help="Mode to use for coloring the protein.",
+        help="Mode to use for coloring the protein. Several modes can be given comma separated.",
         required=True,
         type=str,
     )
@@ -348,8 +409,12 @@ def main():
     )
     args = parser.parse_args()
     file_names = args.filenames.split(",")
-    bundle = Bundle(session, args.source, args.dest, args.images, args.only_images)
-    bundle.apply_processing(args.mode, args.colors)
+    modes = args.mode.split(",")
+    targets = args.dest.split(",")
+    images = args.images.split(",") if args.images else [None] * len(modes)
+    bundle = Bundle(session, args.source, targets[0], images[0], args.only_images)
+    for mode, target, image_dir in zip(modes, targets, images):
+        bundle.apply_processing(mode, args.colors, target, image_dir)
     bundle.run(file_names)
     run(session, "exit")
 
@@ -0,0 +1,71 @@
+# Long-lived ChimeraX worker, which is started by vrprot.chimerax_pool.
+# The worker reads one job per line from stdin, processes the structure with the chimerax_bundle, which answers with one message per job.
+# To run this script manually, use the following command:
+# chimerax --offscreen --script "chimerax_worker.py"
+# and send jobs like {"source": "<pdb dir>", "target": "<glb dir>", "file": "<file name>", "mode": "cartoons_ss_coloring"}
+# To render several coloring modes from one load of the structure, mode, target and images can be lists with one entry per mode.
+import json
+import os
+import sys
+
+SCRIPTS = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(SCRIPTS)
+import chimerax_bundle
+from chimerax_bundle import send
+
+from chimerax.core.commands import run
+
+
+def get_bundle(bundles: dict, job: dict) -> chimerax_bundle.Bundle:
+    """Returns the bundle for the source, target and processing of the job. Bundles are reused, so the processing pipeline is only set up once."""
+    key = json.dumps(
+        [
+            job["source"],
+            job["target"],
+            job["mode"],
+            job.get("colors"),
+            job.get("images"),
+            job.get("only_images", False),
+        ]
+    )
+    if key not in bundles:
+        modes, targets, images = job["mode"], job["target"], job.get("images")
+        if isinstance(modes, str):
+            modes, targets, images = [modes], [targets], [images]
+        elif images is None:
+            images = [None] * len(modes)
+        bundle = chimerax_bundle.Bundle(
+            session,
+            job["source"],
+            targets[0],
+            images[0],
+            job.get("only_images", False),
+        )
+        for mode, target, image_dir in zip(modes, targets, images):
+            bundle.apply_processing(mode, job.get("colors"), target, image_dir)
+        bundles[key] = bundle
+    return bundles[key]
+
+
+def main():
+    bundles = {}
+    send({"status": "ready", "pid": os.getpid()})
+    for line in sys.__stdin__:
+        line = line.strip()
+        if not line:
+            continue
+        job = json.loads(line)
+        if job.get("command") == "exit":
+            break
+        try:
+            bundle = get_bundle(bundles, job)
+        except Exception as e:
+            send({"file": job["file"], "status": "failed", "error": str(e)})
+            continue
+        # The bundle reports the completion of the structure
+        bundle.run([job["file"]])
+    run(session, "exit")
+
+
+if __name__ == "ChimeraX_sandbox_1":
+    main()
@@ -3,16 +3,16 @@
 # chimerax --script '"combine_structures.py" "<directory where the pdbs files are located>" "<directory where the combined structures should be saved>"'
 
 import ast
-import glob
 import os
-import shutil
 import sys
 import argparse
-import re
 
 SCRIPTS = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(SCRIPTS)
+# multifraction only depends on the standard library and can be imported inside ChimeraX
+sys.path.append(os.path.dirname(SCRIPTS))
 import chimerax_bundle
+import multifraction
 
 from chimerax.core.commands import run
 
@@ -35,30 +35,16 @@ def main(
         subprocess (bool): If the script is called inside the chimerax command line, this will be set to False. This will prevent the script from exiting the ChimeraX session.
     """
     os.makedirs(target, exist_ok=True)
-    pattern = re.compile("|".join(proteins))
-    all_files = [
-        file for file in glob.glob(f"{directory}/*.pdb") if pattern.search(file)
-    ]
     bundle = chimerax_bundle.Bundle(session, directory, target)
     bundle.apply_processing(processing, color)
     prefix = "mf"
-    while len(all_files) > 1:
-        file = all_files.pop()
-        first_structure = os.path.basename(file)
-        ver = re.findall(r"_v(\d+)\.pdb", first_structure)[0]
-        protein = re.findall(r"AF-(\w+)-", first_structure)[0]
-        pattern = re.compile(protein)
-        fractions = [f for f in all_files if pattern.search(f)]
-
-        # Single fraction
-        if len(fractions) == 1:
-            continue
-
-        output = f"{target}/{prefix}_AF-{protein}-F1-model_v{ver}.glb"
-        # Output already exists and overwrite is False. Remove all files from the processing list
+    for protein, fractions in multifraction.multi_fractions(
+        directory, proteins
+    ).items():
+        _, _, ver = multifraction.parse_fraction(fractions[0])
+        output = f"{target}/{prefix}_AF-{protein}-F1-model_{ver}.glb"
+        # Output already exists and overwrite is False.
         if os.path.exists(output) and not overwrite:
-            for file in fractions:
-                all_files.remove(file)
             continue
 
         # Run bundle command on all files
@@ -66,21 +52,23 @@ def main(
         tmp_names = ["tmp_" + file for file in files]
         bundle.run(files, tmp_names)
 
+        # Compressed fractions (.pdb.gz) result in the same .glb file
+        glb_files = [
+            f"{target}/{file.replace('.gz', '').replace('pdb', 'glb')}"
+            for file in tmp_names
+        ]
+
         # Open and save file for first structure
-        for file in tmp_names:
-            run(session, f'open {target}/{file.replace("pdb","glb")}')
+        for file in glb_files:
+            run(session, f"open {file}")
         run(session, f"save {output}")
 
         # Remove all other files for this structure
-        for file in tmp_names:
-            os.remove(f"{target}/{file.replace('pdb','glb')}")
+        for file in glb_files:
+            os.remove(file)
 
-        # Close session and remove processed files from all_files
+        # Close session
         run(session, "close")
-        for file in fractions:
-            all_files.remove(file)
-            # os.makedirs(f"{directory}/{first_structure}", exist_ok=True)
-            # shutil.move(file, f"{directory}/{first_structure}/{filename}")
     if subprocess:
         run(session, "exit")
 
@@ -0,0 +1,210 @@
+# Molecular surfaces without ChimeraX.
+# The atoms are splatted as Gaussian blobs into a voxel grid and the iso surface of this density is extracted with surface nets. The resulting meshes are exported as GLB files, so they are processed further like the ones of ChimeraX.
+import os
+
+import numpy as np
+import trimesh
+
+from . import recolor
+from .classes import Logger
+
+log = Logger("Surface")
+SPACING = 0.8  # Edge length (Å) of the voxels
+MAX_VOXELS = 2**25  # The spacing is increased for structures which need more voxels
+BLOBBINESS = 1.5  # Decay of the blobs. Higher values follow the atom spheres closer.
+CUTOFF = 2  # Distance in atom radii up to which an atom contributes to the density
+LEVEL = 1  # Density of the surface. A single atom has this density at its radius.
+CHUNK_ELEMENTS = 1024 * 1024  # Number of voxel contributions computed at once
+# Van der Waals radii (Å) of the common elements
+RADII = {"H": 1.1, "C": 1.7, "N": 1.55, "O": 1.52, "S": 1.8, "P": 1.8, "SE": 1.9}
+DEFAULT_RADIUS = 1.7
+
+
+def supports(processing: str) -> bool:
+    """Returns True if the processing mode can be computed without ChimeraX, i.e. a surface mode with one of the colorings of recolor.SCHEMES."""
+    parts = processing.split("_")
+    return parts[0] == "surface" and len(parts) > 1 and parts[1] in recolor.SCHEMES
+
+
+def density(
+    atoms: np.ndarray, radii: np.ndarray, spacing: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the Gaussian density of the atoms on a voxel grid. Each atom contributes exp(BLOBBINESS * (1 - d² / r²)) to the voxels within CUTOFF radii.
+
+    Args:
+        atoms (np.ndarray): Coordinates of the atoms of shape (n, 3).
+        radii (np.ndarray): Radius of each atom.
+        spacing (float): Edge length of the voxels.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The density, the atom with the largest contribution to each voxel (-1 for empty voxels) and the position of the first voxel.
+    """
+    reach = radii.max() * CUTOFF
+    # One empty voxel at each border, so the surface is closed
+    origin = atoms.min(axis=0) - reach - spacing
+    shape = np.ceil((atoms.max(axis=0) + reach + spacing - origin) / spacing)
+    shape = shape.astype(np.int64) + 1
+    steps = int(np.ceil(reach / spacing))
+    offsets = np.stack(
+        np.meshgrid(*[np.arange(-steps, steps + 1)] * 3, indexing="ij"), axis=-1
+    ).reshape(-1, 3)
+    offsets = offsets[np.linalg.norm(offsets, axis=1) <= steps + 1]
+    strides = np.array([shape[1] * shape[2], shape[2], 1])
+    grid = np.zeros(shape.prod(), dtype=np.float32)
+    # The contribution (as float32 bits, which sort like the floats for positive values) and the atom are combined into a single key, so a maximum finds the largest contributor
+    owner = np.zeros(shape.prod(), dtype=np.int64)
+    centers = np.rint((atoms - origin) / spacing).astype(np.int64)
+    step = max(1, CHUNK_ELEMENTS // len(offsets))
+    for start in range(0, len(atoms), step):
+        voxels = centers[start : start + step, None] + offsets
+        distances = np.sum(
+            (voxels * spacing + origin - atoms[start : start + step, None]) ** 2,
+            axis=-1,
+        )
+        distances /= radii[start : start + step, None] ** 2
+        near = distances <= CUTOFF**2
+        values = np.exp(BLOBBINESS * (1 - distances[near])).astype(np.float32)
+        flat = (voxels @ strides)[near]
+        np.add.at(grid, flat, values)
+        atom = np.broadcast_to(
+            np.arange(start, start + len(voxels))[:, None], near.shape
+        )[near]
+        np.maximum.at(
+            owner, flat, (values.view(np.int32).astype(np.int64) << 32) | atom
+        )
+    owner = np.where(owner > 0, owner & 0xFFFFFFFF, -1)
+    return grid.reshape(shape), owner.reshape(shape), origin
+
+
+def surface_nets(volume: np.ndarray, level: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extracts the iso surface of a volume with surface nets. Each voxel cell, which is crossed by the surface, gets one vertex at the mean of the crossings of its edges and each crossed edge of the grid becomes a quad of the four cells around it.
+
+    Args:
+        volume (np.ndarray): Values on the grid. The values at the borders have to be below the level.
+        level (float): Value of the iso surface.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Vertices in grid coordinates and triangles with their normals pointing to lower values.
+    """
+    inside = volume > level
+    cells = np.array(volume.shape) - 1
+    cell_strides = np.array([cells[1] * cells[2], cells[2], 1])
+    crossings = []
+    for axis in range(3):
+        low = [slice(None)] * 3
+        high = [slice(None)] * 3
+        low[axis], high[axis] = slice(None, -1), slice(1, None)
+        edges = np.argwhere(inside[tuple(low)] != inside[tuple(high)])
+        lower = volume[tuple(edges.T)]
+        upper = volume[tuple((edges + np.eye(3, dtype=np.int64)[axis]).T)]
+        points = edges.astype(np.float32)
+        points[:, axis] += (level - lower) / (upper - lower)
+        crossings.append((axis, edges, points, inside[tuple(edges.T)]))
+
+    # Each crossed edge lies on the border of up to four cells
+    members, positions = [], []
+    for axis, edges, points, _ in crossings:
+        others = [(axis + 1) % 3, (axis + 2) % 3]
+        for shift in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+            cell = edges.copy()
+            cell[:, others] -= shift
+            valid = np.all((cell >= 0) & (cell < cells), axis=1)
+            members.append(cell[valid] @ cell_strides)
+            positions.append(points[valid])
+    members = np.concatenate(members)
+    positions = np.concatenate(positions)
+    active, vertex = np.unique(members, return_inverse=True)
+    counts = np.bincount(vertex, minlength=len(active))
+    vertices = np.stack(
+        [
+            np.bincount(vertex, positions[:, k], minlength=len(active)) / counts
+            for k in range(3)
+        ],
+        axis=1,
+    )
+
+    faces = []
+    for axis, edges, _, lower_inside in crossings:
+        others = [(axis + 1) % 3, (axis + 2) % 3]
+        # The four cells around the edge, counterclockwise seen from the axis
+        quad = []
+        for shift in [(1, 1), (0, 1), (0, 0), (1, 0)]:
+            cell = edges.copy()
+            cell[:, others] -= shift
+            quad.append(cell)
+        valid = np.all(
+            [np.all((cell >= 0) & (cell < cells), axis=1) for cell in quad], axis=0
+        )
+        quad = np.stack(
+            [np.searchsorted(active, cell[valid] @ cell_strides) for cell in quad],
+            axis=1,
+        )
+        # The surface faces away from the inside
+        outward = lower_inside[valid]
+        quad[~outward] = quad[~outward, ::-1]
+        faces.append(quad[:, [0, 1, 2]])
+        faces.append(quad[:, [0, 2, 3]])
+    return vertices, np.concatenate(faces)
+
+
+def molecular_surface(
+    atoms: np.ndarray, elements: np.ndarray, spacing: float = SPACING
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds the Gaussian surface of a structure.
+
+    Args:
+        atoms (np.ndarray): Coordinates of the atoms.
+        elements (np.ndarray): Element of each atom.
+        spacing (float): Edge length of the voxels. Defaults to SPACING.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Vertices, triangles and the nearest atom of each vertex.
+    """
+    radii = np.array(
+        [RADII.get(element.upper(), DEFAULT_RADIUS) for element in elements],
+        dtype=np.float32,
+    )
+    extent = (
+        atoms.max(axis=0) - atoms.min(axis=0) + 2 * (radii.max() * CUTOFF + spacing)
+    )
+    voxels = np.prod(extent / spacing)
+    if voxels > MAX_VOXELS:
+        spacing *= (voxels / MAX_VOXELS) ** (1 / 3)
+        log.debug(f"Increased the voxel spacing to {spacing:.2f} Å.")
+    volume, owner, origin = density(atoms, radii, spacing)
+    vertices, faces = surface_nets(volume, LEVEL)
+    closest = owner[tuple(np.rint(vertices).astype(np.int64).T)]
+    return vertices * spacing + origin, faces, closest
+
+
+def write_surface_glbs(
+    pdb_file: str, targets: dict[str, str], colors: list[str] = None
+) -> None:
+    """
+    Computes the surface of a structure once and exports it as GLB file for each processing mode.
+
+    Args:
+        pdb_file (str): Path to the PDB file.
+        targets (dict[str, str]): Maps the path of each GLB file to its processing mode, see supports.
+        colors (list[str]): Colors of coil, helix and strand for the ss coloring. Defaults to None.
+    """
+    atoms, atom_residue, residues, properties = recolor.read_pdb(pdb_file)
+    if len(atoms) == 0:
+        raise ValueError(f"{pdb_file} contains no atoms.")
+    vertices, faces, closest = molecular_surface(atoms, properties["element"])
+    residue = atom_residue[closest]
+    for glb_file, processing in targets.items():
+        table = recolor.residue_colors(residues, recolor.scheme(processing), colors)
+        mesh = trimesh.Trimesh(
+            vertices, faces, vertex_colors=table[residue], process=False
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(glb_file)), exist_ok=True)
+        # Written under a temporary name like the GLB files of ChimeraX
+        tmp_file = os.path.join(
+            os.path.dirname(glb_file), "tmp_" + os.path.basename(glb_file)
+        )
+        mesh.export(tmp_file, file_type="glb")
+        os.replace(tmp_file, glb_file)
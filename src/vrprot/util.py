@@ -1,37 +1,302 @@
 import glob
+import gzip
+import hashlib
+import json
 import ntpath
 import os
 import platform
+import queue
 import shutil
 import subprocess as sp
+import tempfile
 import time
-import re
+import threading
+import numpy as np
 import requests
 import trimesh
 import pyglet
-from tqdm import tqdm
-from .classes import AlphaFoldVersion, FileTypes, Logger
-from .exceptions import ChimeraXException, StructureNotFoundError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import glb, multifraction, recolor
+from .classes import AlphaFoldVersion, FetchStatus, FileTypes, Logger
+from .exceptions import (
+    ChimeraXException,
+    InvalidStructureError,
+    StructureNotFoundError,
+)
 
 wd = os.path.dirname(".")  # for final executable
 # wd = os.path.dirname(__file__)  # for development
 WD = os.path.abspath(wd)  # for development
 FILE_DIR = os.path.dirname(__file__)
 SCRIPTS = os.path.join(FILE_DIR, "scripts")
+CUBE_NO_LINES = os.path.join(FILE_DIR, "static", "3d_objects", "Cube_no_lines.ply")
 log = Logger("util")
+ALPHAFOLD_URL = "https://alphafold.ebi.ac.uk/files/"
+RCSB_URL = "https://files.rcsb.org/download/"
+REQUEST_TIMEOUT = (10, 60)  # Seconds to wait for the connection and for each read
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5  # Retries wait 0.5s, 1s, 2s, 4s, ... between attempts
+RETRY_STATUS = (429, 500, 502, 503, 504)
+POOL_SIZE = 10
+CHUNK_SIZE = 64 * 1024
+METADATA_EXT = ".meta.json"  # Sidecar next to each fetched file, see write_metadata
+# Permissions of new files, as open() creates them. mkstemp only grants access to the owner
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+FILE_MODE = 0o666 & ~UMASK
+# Marks the messages of the ChimeraX scripts on stdout, see scripts/chimerax_bundle.py
+MESSAGE_PREFIX = "@vrprot "
+STARTUP_TIMEOUT = 120  # Seconds ChimeraX may take to start in addition to the timeout of the first structure
+PDB_RECORDS = (
+    b"HEADER",
+    b"TITLE",
+    b"REMARK",
+    b"CRYST1",
+    b"MODEL",
+    b"ATOM",
+    b"HETATM",
+    b"SEQRES",
+    b"EXPDTA",
+    b"COMPND",
+    b"SOURCE",
+    b"KEYWDS",
+    b"AUTHOR",
+    b"REVDAT",
+    b"JRNL",
+    b"DBREF",
+)
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """
+    Returns the HTTP session which is shared by all downloads. Connections are kept alive and reused, so the TCP and TLS handshakes are only paid once per connection instead of once per file.
+    Failed connections, read timeouts and responses with a status in RETRY_STATUS are retried with an exponential backoff. A Retry-After header sent by the server is respected.
+
+    Args:
+        pool_size (int): Number of connections kept open for each host. Should be at least the number of concurrent downloads. If a larger pool is requested than the current one, the session is remounted with the larger pool.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None or pool_size > _session_pool_size:
+            session = _session or requests.Session()
+            retries = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUS,
+                allowed_methods=["GET", "HEAD"],
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=POOL_SIZE,
+                pool_maxsize=pool_size,
+                max_retries=retries,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+            _session_pool_size = pool_size
+    return _session
+
+
+def validate_pdb(head: bytes) -> None:
+    """
+    Checks whether the beginning of a response is a PDB file. This prevents error pages from being stored as structures.
+
+    Args:
+        head (bytes): First bytes of the response.
+
+    Raises:
+        InvalidStructureError: If the content is empty or does not start with a PDB record.
+    """
+    head = head.lstrip()
+    if len(head) == 0:
+        raise InvalidStructureError("The response is empty.")
+    if not head.startswith(PDB_RECORDS):
+        raise InvalidStructureError(
+            f"The response does not start with a PDB record: {head[:20]}"
+        )
+
+
+def stream_to_file(
+    response: requests.Response, path: str, compress: bool = False
+) -> tuple[int, str]:
+    """
+    Streams the body of a response chunk wise to a file, see write_pdb.
+
+    Args:
+        response (requests.Response): Response which was requested with stream=True.
+        path (str): Path of the resulting file.
+        compress (bool): If True, the data is gzip compressed on the fly. Defaults to False.
+
+    Returns:
+        tuple[int, str]: Number of (uncompressed) bytes which were written and their sha256 hex digest.
+    """
+    return write_pdb(response.iter_content(CHUNK_SIZE), path, compress)
+
+
+def write_pdb(chunks, path: str, compress: bool = False) -> tuple[int, str]:
+    """
+    Writes the content of a PDB file chunk wise to a file. The data is written to a temporary file in the same directory, which is synced to disk and atomically renamed to the target path afterwards. Thus, the target file either does not exist or is complete, even if the process is killed while writing.
+
+    Args:
+        chunks (Iterable[bytes]): Content of the PDB file.
+        path (str): Path of the resulting file.
+        compress (bool): If True, the data is gzip compressed on the fly. Defaults to False.
+
+    Raises:
+        InvalidStructureError: If the content is not a PDB file or does not contain any atoms. The temporary file is removed in this case.
+
+    Returns:
+        tuple[int, str]: Number of (uncompressed) bytes which were written and their sha256 hex digest.
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".part")
+    size = 0
+    sha256 = hashlib.sha256()
+    head = b""
+    validated = False
+    has_atoms = False
+    tail = b""
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            out = raw
+            if compress:
+                out = gzip.GzipFile(filename=name[:-3], mode="wb", fileobj=raw)
+            for chunk in chunks:
+                if not validated:
+                    head += chunk
+                    if len(head.lstrip()) >= len(b"HEADER"):
+                        validate_pdb(head)
+                        validated = True
+                if not has_atoms:
+                    # Keep the end of the last chunk to find records which are split between two chunks
+                    window = tail + chunk
+                    has_atoms = b"\nATOM" in window or b"\nHETATM" in window
+                    tail = chunk[-len(b"\nHETATM") :]
+                out.write(chunk)
+                sha256.update(chunk)
+                size += len(chunk)
+            if not validated:
+                validate_pdb(head)
+            if not has_atoms:
+                raise InvalidStructureError("The response does not contain any atoms.")
+            if compress:
+                out.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.chmod(tmp_file, FILE_MODE)
+        os.replace(tmp_file, path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return size, sha256.hexdigest()
+
+
+def metadata_file(path: str) -> str:
+    """Returns the path of the metadata sidecar of a fetched file."""
+    return path + METADATA_EXT
+
+
+def remove_fetched(path: str) -> None:
+    """Removes a fetched file together with its metadata sidecar, if they exist."""
+    for file in (path, metadata_file(path)):
+        if os.path.isfile(file):
+            os.remove(file)
+
+
+def read_metadata(path: str) -> dict or None:
+    """
+    Reads the metadata sidecar of a fetched file.
+
+    Returns:
+        dict or None: The metadata (url, etag, last_modified, size, sha256, checked) or None if the file or its sidecar does not exist or the sidecar is unreadable.
+    """
+    if not os.path.isfile(path) or not os.path.isfile(metadata_file(path)):
+        return None
+    try:
+        with open(metadata_file(path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_metadata(path: str, metadata: dict) -> None:
+    """Atomically writes the metadata sidecar of a fetched file."""
+    tmp_file = metadata_file(path) + ".part"
+    with open(tmp_file, "w") as f:
+        json.dump(metadata, f)
+    os.replace(tmp_file, metadata_file(path))
+
+
+def file_digest(path: str) -> tuple[int, str]:
+    """Returns the size and sha256 hex digest of the (uncompressed) content of a file."""
+    sha256 = hashlib.sha256()
+    size = 0
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            size += len(chunk)
+    return size, sha256.hexdigest()
 
 
-def fetch_pdb_from_rcsb(uniprot_id: str, save_location: str) -> None:
+def conditional_headers(path: str) -> dict:
+    """
+    Creates the headers for a conditional request of an already fetched file. The headers are only created if the local file is still intact, i.e. size and sha256 match the metadata sidecar. Otherwise, the file has to be fetched again unconditionally.
+
+    Args:
+        path (str): Path of the fetched file.
+
+    Returns:
+        dict: If-None-Match and/or If-Modified-Since headers. Empty if the file is not cached.
+    """
+    metadata = read_metadata(path)
+    if metadata is None:
+        return {}
+    try:
+        size, sha256 = file_digest(path)
+    except (OSError, EOFError, gzip.BadGzipFile):
+        return {}
+    if size != metadata.get("size") or sha256 != metadata.get("sha256"):
+        log.warning(f"Cached file {path} does not match its metadata.")
+        return {}
+    headers = {}
+    if metadata.get("etag"):
+        headers["If-None-Match"] = metadata["etag"]
+    if metadata.get("last_modified"):
+        headers["If-Modified-Since"] = metadata["last_modified"]
+    return headers
+
+
+def fetch_pdb_from_rcsb(
+    uniprot_id: str,
+    save_location: str,
+    base_url: str = RCSB_URL,
+    compress: bool = False,
+    revalidate: bool = False,
+) -> FetchStatus:
     file_name = uniprot_id + ".pdb"
-    url = "https://files.rcsb.org/download/" + file_name
-    return fetch_pdb(uniprot_id, url, save_location, file_name)
+    url = base_url + file_name
+    return fetch_pdb(uniprot_id, url, save_location, file_name, compress, revalidate)
 
 
 def fetch_pdb_from_alphafold(
     uniprot_id: str,
     save_location: str,
     db_version: AlphaFoldVersion = AlphaFoldVersion.v1.value,
-) -> bool:
+    base_url: str = ALPHAFOLD_URL,
+    compress: bool = False,
+    revalidate: bool = False,
+) -> FetchStatus:
     """
     Fetches .pdb File from the AlphaFold Server. This function uses the request module from python standard library to directly download pdb files from the AlphaFold server.
 
@@ -43,38 +308,98 @@ def fetch_pdb_from_alphafold(
         uniprot_id (string): UniProtID of the requested protein.
         save_location (string): Path to the directory where the .pdb file should be saved.
         db_version (string): Version of the database.
+        base_url (string): Base URL of the server to fetch from. Defaults to the AlphaFold DB.
+        compress (bool): If True, the file is stored gzip compressed as .pdb.gz. Defaults to False.
+        revalidate (bool): If True, an already fetched file is revalidated with a conditional request and only downloaded again, if it changed on the server. Defaults to False.
 
     Returns:
-        success (bool) : tells whether the fetching was successful or not.
+        FetchStatus: Tells whether the fetching was successful or not.
     """
     log.debug(f"AlphaFoldDB version: {db_version}.")
     file_name = f"AF-{uniprot_id}-F1-model_{db_version}.pdb"  # Resulting file name which will be downloaded from the alphafold DB
-    url = "https://alphafold.ebi.ac.uk/files/" + file_name  # Url to request
-    return fetch_pdb(uniprot_id, url, save_location, file_name)
+    url = base_url + file_name  # Url to request
+    return fetch_pdb(uniprot_id, url, save_location, file_name, compress, revalidate)
 
 
-def fetch_pdb(uniprot_id: str, url: str, save_location: str, file_name: str) -> bool:
+def fetch_pdb(
+    uniprot_id: str,
+    url: str,
+    save_location: str,
+    file_name: str,
+    compress: bool = False,
+    revalidate: bool = False,
+) -> FetchStatus:
+    """
+    Downloads a single structure with the shared session (see get_session) and streams it to disk, if the response is a valid PDB file (see stream_to_file).
+    For each fetched file, a metadata sidecar containing the ETag, Last-Modified, size and sha256 is stored. With revalidate, these are used to send a conditional request, so an unchanged structure costs a 304 response instead of a full transfer.
+
+    Args:
+        uniprot_id (string): UniProtID of the requested protein.
+        url (string): Url from which the structure is downloaded.
+        save_location (string): Path to the directory where the .pdb file should be saved.
+        file_name (string): Name of the resulting file.
+        compress (bool): If True, the file is stored gzip compressed and ".gz" is appended to the file name. Defaults to False.
+        revalidate (bool): If True, an already fetched file is revalidated with a conditional request. Defaults to False.
 
-    success = True
+    Returns:
+        FetchStatus: fetched, not_modified, not_found or failed.
+    """
+    if compress:
+        file_name += ".gz"
+    path = os.path.join(save_location, file_name)
+    headers = conditional_headers(path) if revalidate else {}
+    status = FetchStatus.fetched
     try:
         # try to fetch the structure from the given url
-        r = requests.get(url, allow_redirects=True)  # opens url
-        if r.status_code == 404:
-            # If the file it not available, an exception will be raised
-            raise StructureNotFoundError(
-                "StructureNotFoundError: There is no structure on the server with this UniProtID."
+        with get_session().get(
+            url,
+            headers=headers,
+            allow_redirects=True,
+            timeout=REQUEST_TIMEOUT,
+            stream=True,
+        ) as r:
+            if r.status_code == 304 and headers:
+                metadata = read_metadata(path)
+                metadata["checked"] = time.time()
+                write_metadata(path, metadata)
+                log.debug(f"{uniprot_id} did not change on the server.")
+                return FetchStatus.not_modified
+            if r.status_code == 404:
+                # If the file it not available, an exception will be raised
+                raise StructureNotFoundError(
+                    "StructureNotFoundError: There is no structure on the server with this UniProtID."
+                )
+            r.raise_for_status()
+            # downloads the pdb file and saves it in the pdbs directory
+            os.makedirs(save_location, exist_ok=True)
+            size, sha256 = stream_to_file(r, path, compress)
+            write_metadata(
+                path,
+                {
+                    "url": url,
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                    "size": size,
+                    "sha256": sha256,
+                    "checked": time.time(),
+                },
             )
-        # downloads the pdb file and saves it in the pdbs directory
-        os.makedirs(save_location, exist_ok=True)
-        open(f"{save_location}/{file_name}", "wb").write(r.content)
         log.debug(
             f"Successfully fetched {uniprot_id} from URL {url}. Saved in {save_location}."
         )
     except StructureNotFoundError as e:
         log.error(f"StructureNotFoundError:{e}")
         log.warning(f"Failed to fetch {uniprot_id} from URL: {url}")
-        success = False
-    return success
+        status = FetchStatus.not_found
+    except InvalidStructureError as e:
+        log.error(f"InvalidStructureError:{e}")
+        log.warning(f"Failed to fetch {uniprot_id} from URL: {url}")
+        status = FetchStatus.failed
+    except requests.RequestException as e:
+        log.error(f"Request failed after {MAX_RETRIES} retries: {e}")
+        log.warning(f"Failed to fetch {uniprot_id} from URL: {url}")
+        status = FetchStatus.failed
+    return status
 
 
 def search_for_chimerax() -> str:
@@ -110,21 +435,33 @@ def run_chimerax_coloring_script(
     chimearx: str,
     pdb_dir: str,
     proteins: list[str],
-    save_location: str,
-    processing: str,
+    save_location: str or list[str],
+    processing: str or list[str],
     colors: list or None,
-    images_dir: str = "",
+    images_dir: str or list[str] = "",
     images: bool = False,
     gui: bool = False,
     only_images: bool = False,
-) -> None:
+    on_done: callable = None,
+    timeout: float = None,
+    memory_limit: int = None,
+) -> bool:
     """
     This will use the give ChimeraX installation to process the .pdb files.It will color the secondary structures in the given colors.
     The offscreen render does only work under linux.
 
     Args:
         protein (string): UniProtID of the protein which will be processed
+        save_location (str or list[str]): Directory of the .glb files. One directory per mode, if several modes are given.
+        processing (str or list[str]): Coloring mode. If several modes are given, each structure is opened once and one .glb file is saved per mode.
         colors (list, optional): List containing three colors. The first is the color of coil. The second will be the color of the helix. And the last color is the color of the strands. Defaults to ["red", "green", "blue"] i.e. coils will be red, helix will be green and stands will be blue.
+        images_dir (str or list[str], optional): Directory of the images. One directory per mode, if several modes are given.
+        on_done (callable, optional): Called with the file name and whether it succeeded as soon as ChimeraX reports that a structure is processed.
+        timeout (float, optional): Seconds ChimeraX may spend on a single structure, see call_ChimeraX_bundle.
+        memory_limit (int, optional): Maximal memory of ChimeraX in bytes, see call_ChimeraX_bundle.
+
+    Returns:
+        bool: True if ChimeraX exited normally, False if it crashed or was killed.
     """
     # Define script to call.
     bundle = os.path.join(SCRIPTS, "chimerax_bundle.py")
@@ -134,17 +471,25 @@ def run_chimerax_coloring_script(
         _, file = ntpath.split(file)
         file_string += f"{file},"
     file_string = file_string[:-1]
-    images_dir = os.path.abspath(images_dir)
-    os.makedirs(save_location, exist_ok=True)
-    os.makedirs(images_dir, exist_ok=True)
+    if isinstance(processing, str):
+        processing, save_location, images_dir = (
+            [processing],
+            [save_location],
+            [images_dir],
+        )
+    images_dir = [os.path.abspath(path) for path in images_dir]
+    for path in save_location + images_dir:
+        os.makedirs(path, exist_ok=True)
     if platform.system() == "Windows":
         bundle = bundle
         pdb_dir = pdb_dir.split("\\")
         pdb_dir = "/".join(pdb_dir)
-        save_location = save_location.split("\\")
-        save_location = "/".join(save_location)
-        images_dir = images_dir.split("\\")
-        images_dir = "/".join(images_dir)
+        save_location = ["/".join(path.split("\\")) for path in save_location]
+        images_dir = ["/".join(path.split("\\")) for path in images_dir]
+    # Several modes are passed comma separated
+    processing = ",".join(processing)
+    save_location = ",".join(save_location)
+    images_dir = ",".join(images_dir)
     arg = [
         bundle,  # Path to chimeraX bundle.
         "-s",
@@ -170,7 +515,7 @@ def run_chimerax_coloring_script(
         gui = True
     try:
         # Call chimeraX to process the desired object.
-        call_ChimeraX_bundle(chimearx, arg, gui)
+        return call_ChimeraX_bundle(chimearx, arg, gui, on_done, timeout, memory_limit)
         # Clean tmp files
     except FileNotFoundError:
         # raise an expection if chimeraX could not be found
@@ -180,17 +525,17 @@ def run_chimerax_coloring_script(
         exit()
 
 
-def call_ChimeraX_bundle(chimerax: str, args: list, gui: bool = True) -> None:
+def chimerax_command(chimerax: str, args: list, gui: bool = True) -> list or str:
     """
-    Function to call chimeraX and run chimeraX Python script with the mode applied.
+    Creates the command to run a Python script inside ChimeraX. On Linux, ChimeraX renders off screen if gui is False. On other systems, ChimeraX is started without GUI instead.
 
     Args:
-        script (string): chimeraX python script/bundle which should be called
-        working_Directory (string): Define the working directory to which chimeraX should direct to (run(session,"cd "+arg[1]))
-        file_name (string): target file which will be processed
-        mode (string): Tells which pipline is used during chimeraX processing
-        (ss = secondary structures, aa = aminoacids, ch = chain). Only ss is implemented at that moment.
-        script_arg (list, strings): all arguments needed by the function used in the chimeraX Python script/bundle (size is dynamic). All Arguments are strings.
+        chimerax (str): Path to the ChimeraX executable.
+        args (list): Path to the script followed by its arguments.
+        gui (bool): If True, ChimeraX is started with its GUI. Defaults to True.
+
+    Returns:
+        list or str: The command, which can be passed to subprocess.Popen.
     """
     # prepare Arguments for script execution
     if platform.system() == "Linux":
@@ -235,10 +580,115 @@ def call_ChimeraX_bundle(chimerax: str, args: list, gui: bool = True) -> None:
                 "--script",
                 ("%s " * len(args)) % (tuple(args)),
             ]
+    return command
+
+
+def parse_message(line: str) -> dict or None:
+    """Parses a message of the ChimeraX scripts. Returns None for any other output, like the ChimeraX log."""
+    if not line.startswith(MESSAGE_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(MESSAGE_PREFIX) :])
+    except ValueError:
+        log.warning(f"Invalid message from ChimeraX: {line.strip()}")
+        return None
+
+
+def limit_memory(process: sp.Popen, memory_limit: int = None) -> None:
+    """
+    Limits the address space (RLIMIT_AS) of a running subprocess. A process which exceeds the limit fails to allocate memory instead of exhausting the memory of the machine. The address space includes reserved but unused mappings, so it is much larger than the resident memory, especially for ChimeraX with its Qt libraries. The limit is applied with prlimit after the process is started, as the preexec_fn of subprocess.Popen is not safe while other threads are running. Thus, it is only supported on Linux.
+
+    Args:
+        process (subprocess.Popen): The subprocess.
+        memory_limit (int): Maximal address space in bytes. Nothing is limited if None.
+    """
+    if memory_limit is None:
+        return
+    try:
+        import resource
+
+        resource.prlimit(process.pid, resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except (ImportError, AttributeError):
+        log.warning("Limiting the memory of ChimeraX is only supported on Linux.")
+    except OSError as e:
+        log.warning(f"Could not limit the memory of ChimeraX: {e}")
+
+
+def watch_messages(
+    process: sp.Popen, timeout: float = None, startup_timeout: float = STARTUP_TIMEOUT
+):
+    """
+    Reads the messages of a ChimeraX process, see parse_message. Acts as a watchdog: If no message arrives within timeout seconds after the caller asked for the next one, the process is killed. The first message may take startup_timeout seconds longer.
+
+    Args:
+        process (subprocess.Popen): ChimeraX process, whose stdout is a text pipe.
+        timeout (float): Seconds to wait for each message. Waits forever if None. Defaults to None.
+        startup_timeout (float): Additional seconds to wait for the first message. Defaults to 120.
+
+    Raises:
+        TimeoutError: If the process was killed, because no message arrived in time.
+
+    Yields:
+        dict: The messages of the process, until the process closes its stdout.
+    """
+    messages = queue.Queue()
+
+    def read():
+        for line in process.stdout:
+            message = parse_message(line)
+            if message is not None:
+                messages.put(message)
+        messages.put(None)
+
+    threading.Thread(target=read, daemon=True).start()
+    wait = None if timeout is None else timeout + startup_timeout
+    while True:
+        try:
+            message = messages.get(timeout=wait)
+        except queue.Empty:
+            process.kill()
+            process.wait()
+            raise TimeoutError(f"ChimeraX did not respond within {wait:.0f}s.")
+        if message is None:
+            return
+        yield message
+        wait = timeout
+
+
+def call_ChimeraX_bundle(
+    chimerax: str,
+    args: list,
+    gui: bool = True,
+    on_done: callable = None,
+    timeout: float = None,
+    memory_limit: int = None,
+) -> bool:
+    """
+    Function to call chimeraX and run chimeraX Python script with the mode applied.
+
+    Args:
+        script (string): chimeraX python script/bundle which should be called
+        working_Directory (string): Define the working directory to which chimeraX should direct to (run(session,"cd "+arg[1]))
+        file_name (string): target file which will be processed
+        mode (string): Tells which pipline is used during chimeraX processing
+        (ss = secondary structures, aa = aminoacids, ch = chain). Only ss is implemented at that moment.
+        script_arg (list, strings): all arguments needed by the function used in the chimeraX Python script/bundle (size is dynamic). All Arguments are strings.
+        on_done (callable): Called with the file name and whether it succeeded for each completion message of the bundle.
+        timeout (float): If ChimeraX spends more than timeout seconds on a single structure, it is killed. Defaults to None.
+        memory_limit (int): Maximal memory of ChimeraX in bytes. Defaults to None.
+
+    Returns:
+        bool: True if ChimeraX exited normally, False if it crashed or was killed.
+    """
+    command = chimerax_command(chimerax, args, gui)
     try:
-        process = sp.Popen(command, stdout=sp.DEVNULL, stdin=sp.PIPE)
-        # wait until chimeraX is finished with processing
-        process.wait()
+        process = sp.Popen(
+            command,
+            stdout=sp.PIPE,
+            stdin=sp.PIPE,
+            text=True,
+        )
+        limit_memory(process, memory_limit)
     except Exception as e:
         # raise an expecting if chimeraX could not be found
         log.error(
@@ -247,25 +697,102 @@ def call_ChimeraX_bundle(chimerax: str, args: list, gui: bool = True) -> None:
             + "\nIf not please correct it."
         )
         raise Exception
+    # Route the completion messages of the bundle until chimeraX is finished with processing
+    try:
+        for message in watch_messages(process, timeout):
+            if "file" not in message:
+                continue
+            if message["status"] != "done":
+                log.error(
+                    f"ChimeraX could not process {message['file']}: {message.get('error')}"
+                )
+            if on_done is not None:
+                on_done(message["file"], message["status"] == "done")
+    except TimeoutError as e:
+        log.error(f"{e} Killed it.")
+        return False
+    return process.wait() == 0
+
+
+def sample_triangles(
+    vertices: np.ndarray, triangles: np.ndarray, number_of_points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Draws uniformly distributed positions on the surface of a triangle mesh. The triangles are drawn with a probability proportional to their area and each point is placed at a random barycentric position within its triangle.
 
+    Args:
+        vertices (np.ndarray): Vertices of the mesh.
+        triangles (np.ndarray): Vertex indices of the triangles.
+        number_of_points (int): Number of points to sample.
 
-def convert_glb_to_ply(glb_file: str, ply_file: str, debug: bool = False) -> None:
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The source triangle and the barycentric weights of its corners for each point.
+    """
+    corners = [vertices[triangles[:, k]] for k in range(3)]
+    areas = np.linalg.norm(
+        np.cross(corners[1] - corners[0], corners[2] - corners[0]), axis=1
+    )
+    rng = np.random.default_rng()
+    source = rng.choice(len(triangles), number_of_points, p=areas / areas.sum())
+    # Points with u + v > 1 are mirrored back into the triangle
+    u, v = rng.random((2, number_of_points))
+    outside = u + v > 1
+    u[outside], v[outside] = 1 - u[outside], 1 - v[outside]
+    return source, np.stack([1 - u - v, u, v], axis=1)
+
+
+def load_glb(glb_file: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Loads the mesh of a glb file. All meshes of the scene are merged. The file is read with glb.read_glb. Files it does not support are loaded with trimesh.
+
+    Args:
+        glb_file (str): Path to the glb file.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Vertices, triangles and the RGBA color of each vertex.
+    """
+    try:
+        vertices, faces, colors, _ = glb.read_glb(glb_file)
+        return vertices, faces, colors
+    except ValueError as e:
+        log.debug(f"Loading {glb_file} with trimesh: {e}")
+    mesh = trimesh.load(glb_file, force="mesh")
+    visual = mesh.visual
+    if visual.kind == "texture":
+        visual = visual.to_color()
+    return mesh.vertices, mesh.faces, visual.vertex_colors
+
+
+def convert_glb_to_ply(
+    glb_file: str,
+    ply_file: str,
+    debug: bool = False,
+    pdb_file: str = None,
+    processing: str = None,
+) -> None:
     """
     This function converts a glb file to a ply file.
 
     Args:
         glb_file (string): Path to the glb file.
+        pdb_file (string, optional): PDB file from which the glb file was rendered. If given, the residue index of the ply file is written next to it, see recolor.write_residue_index.
+        processing (string, optional): Processing mode of the glb file, which is stored in the residue index.
     """
     try:
         save_location, _ = ntpath.split(glb_file)
         os.makedirs(save_location, exist_ok=True)
         log.debug(f"Loading the glb file: {glb_file}")
-        mesh = trimesh.load(glb_file, force="mesh")
+        vertices, faces, colors = load_glb(glb_file)
+        mesh = trimesh.Trimesh(vertices, faces, vertex_colors=colors, process=False)
         trimesh.exchange.export.export_mesh(mesh, ply_file, "ply")
     except Exception as e:
         log.error(f"Could not convert {glb_file} to {ply_file}")
         log.error(e)
         return False
+    if pdb_file is not None:
+        recolor.write_residue_index(
+            mesh.vertices, pdb_file, recolor.residue_index_file(ply_file), processing
+        )
     return True
 
 
@@ -275,62 +802,6 @@ def remove_dirs(directory):
         shutil.rmtree(directory)
 
 
-def combine_fractions(
-    directory: str,
-    target: str,
-    coloring_mode: str,
-    chimerax: str = None,
-    gui: bool = True,
-    overwrite: bool = False,
-    proteins: list = None,
-):
-    """Combines multi fraction protein structure to a single structure and exports it as glb file."""
-    if chimerax is None:
-        chimerax = search_for_chimerax()
-    script = os.path.join(SCRIPTS, "combine_structures.py")
-    proteins = ",".join(proteins)
-    if platform.system() == "Windows":
-        directory = directory.split("\\")
-        directory = "/".join(directory)
-        target = target.split("\\")
-        target = "/".join(target)
-        args = [
-            script,
-            directory,
-            target,
-            "-sp",
-            "-mode",
-            coloring_mode,
-            "-p",
-            proteins,
-        ]
-        chimerax_arguments = [chimerax]
-        if not gui:
-            chimerax_arguments.append("--nogui")
-        if overwrite:
-            args.append("-ow")
-        chimerax_arguments.append("--script")
-        command = (
-            "%s " % " ".join(chimerax_arguments)
-            + ' "'
-            + ("%s " * len(args)) % (tuple(args))
-            + '"'
-        )
-    else:
-        command = [chimerax]
-        if not gui:
-            command.append("--nogui")
-        command += [
-            "--script",
-            f"{script} {directory} {target} -sp -mode {coloring_mode} -p {proteins}",
-        ]
-        if overwrite:
-            command[-1] += " -ow"
-
-    process = sp.Popen(command, stdout=sp.DEVNULL, stdin=sp.PIPE)
-    process.wait()
-
-
 def free_space(
     DIRS: dict[FileTypes, str],
     new: int,
@@ -354,7 +825,11 @@ def free_space(
         if ft == "output":
             continue
         if os.path.isdir(_dir):
-            files = [os.path.join(_dir, f) for f in os.listdir(_dir)]
+            files = [
+                os.path.join(_dir, f)
+                for f in os.listdir(_dir)
+                if not f.endswith(METADATA_EXT)
+            ]
             if space - len(files) < new:
                 files = {f: time.ctime(os.path.getmtime(f)) for f in files}
                 files = sorted(files.items(), key=lambda x: x[1], reverse=True)
@@ -378,30 +853,12 @@ def remove_cached_files(tmp: dict[FileTypes, str], space: int, new: int):
         return
     for ft, files in tmp.items():
         for file in files:
-            os.remove(file)
+            remove_fetched(file)
 
 
-def find_fractions(directory: str):
-    all_files = glob.glob(f"{directory}/*.pdb")
-    multi_fraction_structures = []
+def find_fractions(directory: str) -> list[str]:
+    """Returns the UniProtIDs of all multi fraction structures in the directory, see multifraction.multi_fractions."""
     log.info("Searching for multi fraction structures.")
-    max_len = len(all_files)
-    with tqdm(range(max_len)) as progress_bar:
-        while len(all_files) > 1:
-            file = all_files.pop()
-            progress = (max_len - len(all_files)) - progress_bar.n
-            progress_bar.update(progress)
-
-            first_structure = os.path.basename(file)
-            protein = re.findall(r"AF-(\w+)-", first_structure)[0]
-            pattern = re.compile(protein)
-            fractions = [f for f in all_files if pattern.search(f)]
-            if len(fractions) <= 1:
-                continue
-
-            multi_fraction_structures.append(protein)
-            for fraction in fractions:
-                if fraction in all_files:
-                    all_files.remove(fraction)
-        progress_bar.update(1)
+    multi_fraction_structures = list(multifraction.multi_fractions(directory))
+    log.info(f"Found {len(multi_fraction_structures)} multi fraction structures.")
     return multi_fraction_structures
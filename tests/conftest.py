@@ -0,0 +1,7 @@
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+sys.path.insert(0, SRC)
+# AlphaFold DB structures which are shipped with the repository
+PDB_DIR = os.path.join(SRC, "processing_files", "pdbs")
@@ -0,0 +1,45 @@
+from vrprot import chimerax_pool
+from vrprot.alphafold_db_parser import AlphafoldDBParser, closes_chimerax_pool
+
+
+class FakePool:
+    """Stands in for chimerax_pool.ChimeraXPool, so no ChimeraX is started."""
+
+    instances = []
+
+    def __init__(self, chimerax, size=1, gui=False, timeout=None, memory_limit=None):
+        self.chimerax = chimerax
+        self.size = size
+        self.gui = gui
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.closed = 0
+        FakePool.instances.append(self)
+
+    def close(self):
+        self.closed += 1
+
+
+def test_pool_is_kept_for_the_whole_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(chimerax_pool, "ChimeraXPool", FakePool)
+    FakePool.instances = []
+    parser = AlphafoldDBParser(
+        WD=str(tmp_path), overview_file=str(tmp_path / "overview.csv")
+    )
+    pools = []
+
+    def stage(proteins, **kwargs):
+        pools.append(parser.get_chimerax_pool())
+
+    @closes_chimerax_pool
+    def entry(self):
+        self.batch([stage], ["A", "B", "C"], 1)
+        self.batch([stage], ["D"], 1)
+        assert self._chimerax_pool is not None
+
+    entry(parser)
+    assert len(pools) == 4
+    assert len(FakePool.instances) == 1
+    assert all(pool is FakePool.instances[0] for pool in pools)
+    assert FakePool.instances[0].closed == 1
+    assert parser._chimerax_pool is None
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import PDB_DIR
+from vrprot import combine, recolor
+
+STRUCTURE = os.path.join(PDB_DIR, "AF-O53113-F1-model_v4.pdb")
+
+
+@pytest.mark.parametrize("width", [4, 5])
+def test_hy36_round_trip(width):
+    block = 26 * 36 ** (width - 1)
+    limit = 10**width + 2 * block
+    values = [0, 1, 10**width - 1, 10**width, 10**width + 1]
+    values += [10**width + block - 1, 10**width + block, limit - 1]
+    values += list(np.random.default_rng(3).integers(0, limit, 1000))
+    for value in values:
+        encoded = combine.hy36_encode(int(value), width)
+        assert len(encoded) == width
+        assert recolor.hy36_decode(encoded) == value
+
+
+def test_hy36_format():
+    assert combine.hy36_encode(9999, 4) == "9999"
+    assert combine.hy36_encode(10000, 4) == "A000"
+    assert combine.hy36_encode(100000, 5) == "A0000"
+    assert combine.hy36_encode(10000 + 26 * 36**3, 4) == "a000"
+
+
+def write_fraction(
+    path: str, first: int, last: int, rotation: np.ndarray, translation: np.ndarray
+) -> None:
+    """Writes the residues first to last of the structure, numbered from 1 and moved rigidly, like a fraction of AlphaFold DB."""
+    with open(STRUCTURE) as f, open(path, "w") as out:
+        for line in f:
+            if not line.startswith("ATOM  "):
+                continue
+            number = int(line[22:26])
+            if not first <= number <= last:
+                continue
+            xyz = np.array([line[30:38], line[38:46], line[46:54]], dtype=float)
+            xyz = rotation @ xyz + translation
+            out.write(
+                line[:22]
+                + "%4d" % (number - first + 1)
+                + line[26:30]
+                + "%8.3f%8.3f%8.3f" % tuple(xyz)
+                + line[54:]
+            )
+        out.write("END\n")
+
+
+def test_stitch_fractions(tmp_path):
+    angle = np.radians(40)
+    rotation = np.array(
+        [
+            [np.cos(angle), -np.sin(angle), 0],
+            [np.sin(angle), np.cos(angle), 0],
+            [0, 0, 1],
+        ]
+    )
+    fractions = [str(tmp_path / "F1.pdb"), str(tmp_path / "F2.pdb")]
+    write_fraction(fractions[0], 1, 400, np.eye(3), np.zeros(3))
+    write_fraction(fractions[1], 201, 703, rotation, np.array([30.0, -12.0, 7.0]))
+    output = str(tmp_path / "stitched.pdb")
+    combine.stitch_fractions(fractions, output)
+
+    coords, atom_residue, residues, atoms = recolor.read_pdb(STRUCTURE)
+    stitched = recolor.read_pdb(output)
+    assert list(stitched[2]["number"]) == list(range(1, 704))
+    assert len(stitched[0]) == len(coords)
+    assert list(stitched[3]["name"]) == list(atoms["name"])
+    ca = atoms["name"] == "CA"
+    rmsd = np.sqrt(np.mean(np.sum((stitched[0][ca] - coords[ca]) ** 2, axis=1)))
+    assert rmsd < 0.01
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import trimesh
+
+from vrprot import glb
+
+
+def corners(vertices: np.ndarray, triangles: np.ndarray, colors: np.ndarray):
+    """Sorted rows of the position and color of each corner of each triangle, which do not depend on the vertex order."""
+    rows = np.hstack(
+        [
+            vertices[triangles].reshape(-1, 3).astype(np.float64),
+            colors[triangles].reshape(-1, 4),
+        ]
+    )
+    # Sorted by the rounded positions, as the transformations are applied in single precision
+    return rows[np.lexsort(np.round(rows, 3).T[::-1])]
+
+
+@pytest.fixture
+def glb_file(tmp_path):
+    scene = trimesh.Scene()
+    sphere = trimesh.creation.icosphere(subdivisions=2, radius=2)
+    sphere.visual.vertex_colors = np.tile([200, 30, 30, 255], (len(sphere.vertices), 1))
+    box = trimesh.creation.box(extents=(1, 2, 3))
+    box.visual.vertex_colors = np.tile([20, 90, 220, 255], (len(box.vertices), 1))
+    rotation = trimesh.transformations.rotation_matrix(0.7, (1, 1, 0))
+    rotation[:3, 3] = (5, -1, 2)
+    scene.add_geometry(sphere, node_name="sphere")
+    scene.add_geometry(box, node_name="box", transform=rotation)
+    scene.add_geometry(
+        box, node_name="box_copy", transform=trimesh.transformations.scale_matrix(2)
+    )
+    path = tmp_path / "scene.glb"
+    scene.export(str(path))
+    return str(path)
+
+
+def test_read_glb(glb_file):
+    vertices, triangles, colors, normals = glb.read_glb(glb_file)
+    expected = trimesh.load(glb_file, force="mesh")
+    assert len(triangles) == len(expected.faces)
+    assert len(vertices) == len(expected.vertices)
+    assert np.allclose(
+        corners(vertices, triangles, colors),
+        corners(expected.vertices, expected.faces, expected.visual.vertex_colors),
+        atol=1e-5,
+    )
+    if normals is not None:
+        assert np.allclose(np.linalg.norm(normals, axis=1), 1, atol=1e-5)
+
+
+def test_merge_vertices():
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 0, 0], [0, 1, 0]])
+    colors = np.array([[255, 0, 0, 255]] * 4 + [[0, 255, 0, 255]], dtype=np.uint8)
+    triangles = np.array([[0, 1, 2], [0, 3, 4]])
+    normals = np.eye(3)[[0, 1, 2, 0, 1]].astype(np.float32)
+    merged, remapped, merged_colors, merged_normals = glb.merge_vertices(
+        vertices.astype(np.float32), triangles, colors, normals
+    )
+    # The second vertex at (0, 1, 0) has another color and is kept
+    assert len(merged) == 4
+    assert remapped.tolist() == [[0, 1, 2], [0, 1, 3]]
+    assert np.array_equal(merged_colors, colors[[0, 1, 2, 4]])
+    assert np.array_equal(merged_normals, normals[[0, 1, 2, 4]])
+
+
+def test_truncated(glb_file, tmp_path):
+    with open(glb_file, "rb") as f:
+        data = f.read()
+    truncated = tmp_path / "truncated.glb"
+    truncated.write_bytes(data[: len(data) // 2])
+    with pytest.raises(ValueError):
+        glb.read_glb(str(truncated))
+    not_glb = tmp_path / "not.glb"
+    not_glb.write_bytes(b"solid mesh\nendsolid mesh\n")
+    with pytest.raises(ValueError):
+        glb.read_glb(str(not_glb))
@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import PDB_DIR
+from vrprot import multifraction, recolor
+
+COIL, HELIX, STRAND = recolor.COIL, recolor.HELIX, recolor.STRAND
+
+
+def assign(ca: np.ndarray) -> np.ndarray:
+    return recolor.secondary_structure(
+        [tuple(c) for c in ca], np.array(["A"] * len(ca)), np.arange(1, len(ca) + 1)
+    )
+
+
+def ideal_helix(count: int) -> np.ndarray:
+    """CA trace of a right-handed alpha helix: 100 degrees and 1.5 Å per residue on a radius of 2.3 Å."""
+    turn = np.radians(100) * np.arange(count)
+    return np.stack([2.3 * np.cos(turn), 2.3 * np.sin(turn), 1.5 * np.arange(count)], 1)
+
+
+def ideal_strand(count: int, y: float = 0, reverse: bool = False) -> np.ndarray:
+    """CA trace of a pleated strand along x with 3.3 Å per residue."""
+    x = 3.3 * np.arange(count)
+    z = 0.9 * (np.arange(count) % 2)
+    strand = np.stack([x, np.full(count, y), z], 1)
+    return strand[::-1] if reverse else strand
+
+
+def test_helix():
+    ss = assign(ideal_helix(20))
+    # The first residue has no predecessor for the P-SEA criteria
+    assert np.all(ss[1:-1] == HELIX)
+
+
+def test_paired_strands():
+    turn = np.array([[28.0, 1.2, 0], [28.0, 3.6, 0]])
+    hairpin = np.vstack([ideal_strand(8), turn, ideal_strand(8, 4.8, reverse=True)])
+    ss = assign(hairpin)
+    assert np.count_nonzero(ss[:8] == STRAND) >= 5
+    assert np.count_nonzero(ss[10:] == STRAND) >= 5
+    assert np.all(ss != HELIX)
+
+
+def test_unpaired_strand_is_coil():
+    assert np.all(assign(ideal_strand(10)) == COIL)
+
+
+def test_chain_breaks_are_coil():
+    ca = ideal_helix(20)
+    ss = recolor.secondary_structure(
+        [tuple(c) for c in ca],
+        np.array(["A"] * 10 + ["B"] * 10),
+        np.concatenate([np.arange(1, 11), np.arange(1, 11)]),
+    )
+    # Each chain keeps a helix, but none spans the break
+    assert ss[9] != HELIX or ss[10] != HELIX
+    assert np.count_nonzero(ss == HELIX) >= 10
+
+
+def test_alphafold_structure():
+    residues = recolor.read_pdb(os.path.join(PDB_DIR, "AF-O06917-F1-model_v4.pdb"))[2]
+    ss = residues["ss"]
+    # A helical bundle
+    assert np.count_nonzero(ss == HELIX) > 0.7 * len(ss)
+    assert np.count_nonzero(ss == STRAND) == 0
+
+
+def test_records_take_precedence(tmp_path):
+    lines = []
+    for k, (x, y, z) in enumerate(ideal_helix(12)):
+        lines.append(
+            "ATOM  %5d  CA  ALA A%4d    %8.3f%8.3f%8.3f  1.00 90.00           C"
+            % (k + 1, k + 1, x, y, z)
+        )
+    sheet = "SHEET    1   A 2 ALA A   3  ALA A   6  0"
+    pdb_file = tmp_path / "records.pdb"
+    pdb_file.write_text("\n".join([sheet] + lines + ["END"]) + "\n")
+    ss = recolor.read_pdb(str(pdb_file))[2]["ss"]
+    assert list(np.flatnonzero(ss == STRAND)) == [2, 3, 4, 5]
+    assert np.all(np.delete(ss, [2, 3, 4, 5]) == COIL)
+
+
+@pytest.mark.parametrize(
+    "file_name, expected",
+    [
+        ("AF-P54009-F1-model_v4.pdb", ("P54009", "v4")),
+        ("mf_AF-P54009-F1-model_v4.glb", ("P54009", "v4")),
+        ("/data/my_run/AF-Q8W3K0-F1-model_v3.residues.npz", ("Q8W3K0", "v3")),
+        ("my_protein.ply", None),
+        ("AF-P54009.pdb", None),
+    ],
+)
+def test_parse_structure(file_name, expected):
+    assert multifraction.parse_structure(file_name) == expected
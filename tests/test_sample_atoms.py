@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import PDB_DIR
+from vrprot import recolor, sample_atoms
+
+
+def brute_force(queries: np.ndarray, points: np.ndarray, cutoff: float) -> set:
+    distance = np.linalg.norm(queries[:, None] - points[None], axis=-1)
+    return set(zip(*np.nonzero(distance < cutoff)))
+
+
+@pytest.mark.parametrize("cutoff", [0.5, 2.0, 3.7])
+def test_neighbor_pairs(cutoff):
+    rng = np.random.default_rng(7)
+    points = rng.uniform(-10, 10, (400, 3))
+    # Queries reach beyond the points on all sides
+    queries = rng.uniform(-14, 14, (300, 3))
+    query_index, point_index = sample_atoms.neighbor_pairs(queries, points, cutoff)
+    candidates = list(zip(query_index, point_index))
+    # Each candidate is reported once
+    assert len(set(candidates)) == len(candidates)
+    distance = np.linalg.norm(queries[query_index] - points[point_index], axis=1)
+    close = {pair for pair, d in zip(candidates, distance) if d < cutoff}
+    assert close == brute_force(queries, points, cutoff)
+
+
+def test_bonds():
+    coords, _, _, atoms = recolor.read_pdb(
+        os.path.join(PDB_DIR, "AF-P54009-F4-model_v4.pdb")
+    )
+    first, second = sample_atoms.bonds(coords, atoms["element"])
+    radii = np.array(
+        [
+            sample_atoms.COVALENT_RADII.get(
+                e.upper(), sample_atoms.DEFAULT_COVALENT_RADIUS
+            )
+            for e in atoms["element"]
+        ]
+    )
+    distance = np.linalg.norm(coords[:, None] - coords[None], axis=-1)
+    bonded = distance <= radii[:, None] + radii[None] + sample_atoms.BOND_TOLERANCE
+    expected = set(zip(*np.nonzero(np.triu(bonded, 1))))
+    assert set(zip(first, second)) == expected
+    # A protein has about one bond per atom
+    assert 0.9 * len(coords) < len(expected) < 1.2 * len(coords)
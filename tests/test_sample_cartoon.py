@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import PDB_DIR
+from vrprot import recolor, sample_cartoon
+
+
+@pytest.fixture(scope="module")
+def structure():
+    coords, atom_residue, residues, atoms = recolor.read_pdb(
+        os.path.join(PDB_DIR, "AF-P54009-F4-model_v4.pdb")
+    )
+    return coords, atom_residue, residues, atoms["name"]
+
+
+def ca_of(structure) -> np.ndarray:
+    coords, atom_residue, residues, names = structure
+    ca = np.full((len(residues["number"]), 3), np.nan)
+    ca[atom_residue[names == "CA"]] = coords[names == "CA"]
+    return ca
+
+
+def test_cartoon_mesh(structure):
+    vertices, triangles, vertex_residue = sample_cartoon.cartoon_mesh(*structure)
+    residue_count = len(structure[2]["number"])
+    assert len(vertices) == len(vertex_residue)
+    assert triangles.min() >= 0 and triangles.max() < len(vertices)
+    assert np.all(np.isfinite(vertices))
+    # Every residue is part of the cartoon
+    assert set(np.unique(vertex_residue)) == set(range(residue_count))
+    # The cartoon is swept along the CA atoms
+    distance = np.linalg.norm(vertices - ca_of(structure)[vertex_residue], axis=1)
+    assert np.all(distance < 4)
+
+
+def test_cartoon_points(structure):
+    points, residue, low, high = sample_cartoon.cartoon_points(*structure, 5000)
+    assert points.shape == (5000, 3)
+    assert residue.shape == (5000,)
+    assert np.all((points >= low - 1e-6) & (points <= high + 1e-6))
+    distance = np.linalg.norm(points - ca_of(structure)[residue], axis=1)
+    assert np.all(distance < 4)
+
+
+def test_chain_break(structure):
+    coords, atom_residue, residues, names = structure
+    # Move the second half away, so the backbone is split in two segments
+    moved = coords.copy()
+    half = len(residues["number"]) // 2
+    moved[atom_residue >= half] += 50
+    vertices, triangles, vertex_residue = sample_cartoon.cartoon_mesh(
+        moved, atom_residue, residues, names
+    )
+    first = vertex_residue[triangles] < half
+    # No triangle bridges the break
+    assert np.all(first.all(axis=1) | ~first.any(axis=1))
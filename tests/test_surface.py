@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+
+from conftest import PDB_DIR
+from vrprot import recolor, surface
+
+
+def sphere(radius: float, size: int = 32) -> tuple[np.ndarray, np.ndarray]:
+    center = np.full(3, (size - 1) / 2)
+    grid = np.stack(np.indices((size,) * 3), axis=-1)
+    volume = radius - np.linalg.norm(grid - center, axis=-1)
+    return volume, center
+
+
+def edges(triangles: np.ndarray) -> np.ndarray:
+    return np.concatenate(
+        [triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]]
+    )
+
+
+def signed_volume(vertices: np.ndarray, triangles: np.ndarray) -> float:
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    return np.einsum("ij,ij->i", a, np.cross(b, c)).sum() / 6
+
+
+def test_sphere():
+    volume, center = sphere(10)
+    vertices, triangles = surface.surface_nets(volume, 0)
+    distance = np.linalg.norm(vertices - center, axis=1)
+    assert np.all(np.abs(distance - 10) < 0.5)
+    # Closed and consistently oriented: each directed edge appears once and its reverse once
+    directed = edges(triangles)
+    assert len(np.unique(directed, axis=0)) == len(directed)
+    assert len(np.unique(np.sort(directed, axis=1), axis=0)) == len(directed) // 2
+    # The normals point outwards, to the lower values
+    enclosed = signed_volume(vertices - center, triangles)
+    assert abs(enclosed - 4 / 3 * np.pi * 10**3) < 0.05 * enclosed
+
+
+def test_molecular_surface():
+    coords, _, _, atoms = recolor.read_pdb(
+        os.path.join(PDB_DIR, "AF-P54009-F4-model_v4.pdb")
+    )
+    vertices, faces, closest = surface.molecular_surface(coords, atoms["element"])
+    assert len(faces) > 0
+    assert np.all(np.isfinite(vertices))
+    assert faces.min() >= 0 and faces.max() < len(vertices)
+    assert closest.min() >= 0 and closest.max() < len(coords)
+    # The surface lies a few Ångström around the atoms it is closest to
+    distance = np.linalg.norm(vertices - coords[closest], axis=1)
+    assert np.all(distance < 2 * surface.DEFAULT_RADIUS * surface.CUTOFF)
+    assert np.median(distance) > 1